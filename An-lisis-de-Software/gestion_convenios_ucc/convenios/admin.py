@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Convenio, Informe, ActividadConvenio
+from .models import Convenio, Informe, ActividadConvenio, ArchivoAlmacenado, TextoInforme
 
 
 @admin.register(Convenio)
@@ -29,4 +29,29 @@ class ActividadConvenioAdmin(admin.ModelAdmin):
     search_fields = ['titulo', 'descripcion']
     list_editable = ['completada']
     date_hierarchy = 'fecha_inicio'
-    ordering = ['-fecha_creacion']
\ No newline at end of file
+    ordering = ['-fecha_creacion']
+
+
+@admin.register(ArchivoAlmacenado)
+class ArchivoAlmacenadoAdmin(admin.ModelAdmin):
+    # Las referencias las mantienen las señales: sólo lectura
+    list_display = ['sha256', 'nombre', 'tamano', 'referencias', 'fecha_creacion']
+    list_filter = ['fecha_creacion']
+    search_fields = ['sha256', 'nombre']
+    readonly_fields = ['sha256', 'nombre', 'tamano', 'referencias', 'fecha_creacion']
+    ordering = ['-fecha_creacion']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(TextoInforme)
+class TextoInformeAdmin(admin.ModelAdmin):
+    # Lo escribe la extracción en segundo plano: sólo lectura
+    list_display = ['informe', 'estado', 'sha256', 'fecha_extraccion']
+    list_filter = ['estado']
+    list_select_related = ['informe__convenio']
+    readonly_fields = ['informe', 'sha256', 'estado', 'texto', 'error', 'fecha_extraccion']
+
+    def has_add_permission(self, request):
+        return False
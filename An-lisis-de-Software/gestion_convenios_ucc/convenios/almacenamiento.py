@@ -0,0 +1,247 @@
+"""
+Almacenamiento deduplicado de los documentos de convenios e informes.
+
+``AlmacenamientoDeduplicado`` calcula el SHA-256 del archivo mientras lo
+copia por bloques a un temporal y lo guarda una sola vez en
+``documentos/<2 primeros>/<sha256><extensión>``: el mismo PDF firmado subido
+como convenio y como varios informes ocupa disco una vez. Cada contenido
+tiene una fila ``ArchivoAlmacenado`` con el número de filas de ``Convenio`` e
+``Informe`` que lo usan; las señales de ``convenios.signals`` lo ajustan con
+``F()`` al guardar y borrar (también en el borrado en cascada de
+``eliminar_convenio``) y borran el archivo cuando la transacción confirma que
+nadie lo usa.
+
+Entre ``_save`` y la señal que suma la referencia hay una ventana en la que el
+contenido existe sin referencias: si otra fila suelta en ese momento la última,
+la recolección borraría un archivo que se está volviendo a usar. Por eso
+``_save`` renueva ``ultimo_uso`` antes de comprobar si el archivo existe, y
+``eliminar_sin_referencias`` sólo borra lo que lleva ``ALMACENAMIENTO_GRACIA``
+segundos sin subirse (o la antigüedad que pida el comando), borrando fila y
+archivo en la misma transacción.
+
+``manage.py deduplicar_archivos`` pasa al almacén los archivos subidos antes,
+recuenta las referencias desde las tablas, elimina los huérfanos y muestra
+el espacio ahorrado y recuperado.
+"""
+import functools
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest, Now
+from django.utils import timezone
+
+DIRECTORIO = 'documentos'
+BLOQUE = 64 * 1024
+
+
+def gracia():
+    return getattr(settings, 'ALMACENAMIENTO_GRACIA', 300)
+
+
+def es_deduplicado(nombre):
+    return bool(nombre) and nombre.startswith(f'{DIRECTORIO}/')
+
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """Guarda cada contenido distinto una vez, con su SHA-256 como nombre"""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo lo decide el contenido en _save
+        return name
+
+    def _save(self, name, content):
+        from .models import ArchivoAlmacenado
+
+        temporales = self.path(os.path.join(DIRECTORIO, 'tmp'))
+        os.makedirs(temporales, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=temporales)
+        resumen = hashlib.sha256()
+        tamano = 0
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloque in content.chunks(BLOQUE):
+                    resumen.update(bloque)
+                    destino.write(bloque)
+                    tamano += len(bloque)
+            sha256 = resumen.hexdigest()
+            extension = os.path.splitext(name)[1].lower()
+            nombre = f'{DIRECTORIO}/{sha256[:2]}/{sha256}{extension}'
+            ruta = self.path(nombre)
+            with transaction.atomic():
+                # Primero la fila: espera a una recolección en curso y la aparta de las siguientes.
+                # Las referencias las suman las señales al guardar la fila que lo usa
+                renovadas = ArchivoAlmacenado.objects.filter(sha256=sha256).update(ultimo_uso=Now())
+                if not renovadas:
+                    ArchivoAlmacenado.objects.get_or_create(
+                        sha256=sha256, defaults={'nombre': nombre, 'tamano': tamano},
+                    )
+                if os.path.exists(ruta):
+                    os.remove(temporal)
+                else:
+                    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(temporal, self.file_permissions_mode)
+                    os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return nombre
+
+
+@functools.cache
+def almacenamiento_documentos():
+    """Storage de los ``FileField`` de documentos (callable para no fijarlo en las migraciones)"""
+    return AlmacenamientoDeduplicado()
+
+
+def campos_con_documentos():
+    """(modelo, campo) de cada ``FileField`` que usa el almacenamiento deduplicado"""
+    from .models import Convenio, Informe
+
+    return [(Convenio, 'archivo_convenio'), (Informe, 'archivo_informe')]
+
+
+def sumar_referencia(nombre):
+    from .models import ArchivoAlmacenado
+
+    if es_deduplicado(nombre):
+        ArchivoAlmacenado.objects.filter(nombre=nombre).update(referencias=F('referencias') + 1)
+
+
+def restar_referencia(nombre):
+    """Descuenta una referencia y, al confirmar la transacción, borra el archivo si ya nadie lo usa"""
+    from .models import ArchivoAlmacenado
+
+    if not es_deduplicado(nombre):
+        return
+    ArchivoAlmacenado.objects.filter(nombre=nombre).update(referencias=Greatest(F('referencias') - 1, Value(0)))
+    transaction.on_commit(partial(_recoger, [nombre]))
+
+
+@dataclass
+class ResultadoLimpieza:
+    eliminados: int = 0
+    bytes_recuperados: int = 0
+    nombres: list = field(default_factory=list)
+
+
+def eliminar_sin_referencias(nombres=None, simular=False, antes_de=None):
+    """Borra los contenidos sin referencias (de ``nombres`` o todos) sin usar desde ``antes_de``, y sus archivos"""
+    from .models import ArchivoAlmacenado
+
+    almacenamiento = almacenamiento_documentos()
+    resultado = ResultadoLimpieza()
+    candidatos = ArchivoAlmacenado.objects.filter(referencias=0)
+    if nombres is not None:
+        candidatos = candidatos.filter(nombre__in=nombres)
+    if antes_de is not None:
+        candidatos = candidatos.filter(ultimo_uso__lt=antes_de)
+    for sha256, nombre, tamano in candidatos.values_list('sha256', 'nombre', 'tamano'):
+        if not simular:
+            # Se borra la fila sólo si sigue sin referencias ni subidas recientes, y
+            # el archivo antes de confirmar: un _save concurrente espera a ambos
+            with transaction.atomic():
+                borrar = ArchivoAlmacenado.objects.filter(sha256=sha256, referencias=0)
+                if antes_de is not None:
+                    borrar = borrar.filter(ultimo_uso__lt=antes_de)
+                borradas, _ = borrar.delete()
+                if not borradas:
+                    continue
+                almacenamiento.delete(nombre)
+        resultado.eliminados += 1
+        resultado.bytes_recuperados += tamano
+        resultado.nombres.append(nombre)
+    return resultado
+
+
+def _recoger(nombres):
+    eliminar_sin_referencias(nombres, antes_de=timezone.now() - timedelta(seconds=gracia()))
+
+
+def recontar_referencias():
+    """Recalcula ``referencias`` desde las tablas; devuelve cuántas filas cambiaron"""
+    from .models import ArchivoAlmacenado
+
+    conteo = {}
+    for modelo, campo in campos_con_documentos():
+        filas = (
+            modelo.objects.filter(**{f'{campo}__startswith': f'{DIRECTORIO}/'})
+            .order_by().values_list(campo).annotate(total=Count('pk'))
+        )
+        for nombre, total in filas:
+            conteo[nombre] = conteo.get(nombre, 0) + total
+
+    cambiados = []
+    for archivo in ArchivoAlmacenado.objects.only('sha256', 'nombre', 'referencias'):
+        referencias = conteo.get(archivo.nombre, 0)
+        if archivo.referencias != referencias:
+            archivo.referencias = referencias
+            cambiados.append(archivo)
+    ArchivoAlmacenado.objects.bulk_update(cambiados, ['referencias'], batch_size=500)
+    return len(cambiados)
+
+
+def migrar_existentes(simular=False):
+    """Pasa al almacén deduplicado los archivos guardados con rutas anteriores"""
+    almacenamiento = almacenamiento_documentos()
+    migrados = bytes_migrados = 0
+    for modelo, campo in campos_con_documentos():
+        pendientes = modelo.objects.exclude(**{f'{campo}__startswith': f'{DIRECTORIO}/'}).exclude(
+            Q(**{campo: ''}) | Q(**{f'{campo}__isnull': True}),
+        )
+        for pk, anterior in pendientes.values_list('pk', campo).iterator():
+            if not almacenamiento.exists(anterior):
+                continue
+            migrados += 1
+            bytes_migrados += almacenamiento.size(anterior)
+            if simular:
+                continue
+            with almacenamiento.open(anterior, 'rb') as original:
+                nombre = almacenamiento.save(anterior, original)
+            # update() no emite señales: las referencias se recuentan al final
+            modelo.objects.filter(pk=pk).update(**{campo: nombre})
+            # Otra fila podría seguir usando la ruta anterior
+            if not any(otro.objects.filter(**{c: anterior}).exists() for otro, c in campos_con_documentos()):
+                almacenamiento.delete(anterior)
+    return migrados, bytes_migrados
+
+
+@dataclass
+class ReporteAlmacenamiento:
+    contenidos: int
+    referencias: int
+    bytes_en_disco: int
+    bytes_logicos: int
+
+    @property
+    def bytes_ahorrados(self):
+        return self.bytes_logicos - self.bytes_en_disco
+
+
+def reporte():
+    """Tamaño que ocuparían las copias frente al que ocupa cada contenido una vez"""
+    from .models import ArchivoAlmacenado
+
+    totales = ArchivoAlmacenado.objects.aggregate(
+        total_contenidos=Count('sha256'),
+        total_referencias=Sum('referencias', default=0),
+        total_en_disco=Sum('tamano', default=0),
+        total_logico=Sum(F('tamano') * F('referencias'), default=0),
+    )
+    return ReporteAlmacenamiento(
+        contenidos=totales['total_contenidos'],
+        referencias=totales['total_referencias'],
+        bytes_en_disco=totales['total_en_disco'],
+        bytes_logicos=totales['total_logico'],
+    )
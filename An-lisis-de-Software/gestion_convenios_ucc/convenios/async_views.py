@@ -0,0 +1,61 @@
+"""
+Variantes asíncronas del dashboard y del listado de convenios.
+
+Lanzan a la vez las consultas que no dependen entre sí (ver
+``convenios.concurrencia``) y renderizan una sola vez con los resultados ya
+evaluados. Se sirven bajo ASGI (``gestion_convenios_ucc.asgi``); bajo WSGI
+también funcionan, pero cada petición paga la creación de un event loop.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from . import contadores
+from .concurrencia import en_paralelo
+from .models import Convenio
+from .paginacion import paginar_por_cursor
+from .stats import EstadisticasDashboard
+from .views import (
+    ORDEN_CONVENIOS,
+    actividades_recientes,
+    contexto_dashboard,
+    contexto_lista_convenios,
+    convenios_por_vencer_detalle,
+    filtrar_convenios,
+)
+from gestion_convenios_ucc.routers import solo_lectura
+
+
+@solo_lectura
+async def dashboard(request):
+    """Dashboard con las estadísticas y los listados consultados en paralelo"""
+    convenios, informes, supervisores, actividades, por_vencer = await en_paralelo(
+        partial(contadores.obtener, 'convenios'),
+        partial(contadores.obtener, 'informes'),
+        partial(contadores.obtener, 'supervisores'),
+        actividades_recientes,
+        convenios_por_vencer_detalle,
+    )
+    estadisticas = EstadisticasDashboard(convenios, informes, supervisores)
+    
+    context = contexto_dashboard(estadisticas, actividades, por_vencer)
+    
+    return await sync_to_async(render)(request, 'convenios/dashboard.html', context)
+
+
+@solo_lectura
+@login_required
+async def lista_convenios(request):
+    """Listado de convenios con la página y las tarjetas consultadas en paralelo"""
+    convenios, filtros = filtrar_convenios(Convenio.objects.select_related('supervisor'), request.GET)
+    
+    pagina, estadisticas = await en_paralelo(
+        partial(paginar_por_cursor, convenios, request, orden=ORDEN_CONVENIOS),
+        partial(contadores.obtener, 'convenios'),
+    )
+    
+    context = contexto_lista_convenios(pagina, filtros, estadisticas)
+    
+    return await sync_to_async(render)(request, 'convenios/lista_convenios.html', context)
@@ -3,7 +3,6 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.utils import timezone
 from usuarios.models import PerfilUsuario
 
 
@@ -21,14 +20,7 @@ def login_view(request):
             user = authenticate(request, username=username, password=password)
             if user is not None:
                 login(request, user)
-                
-                # Actualizar último acceso en el perfil
-                try:
-                    perfil = user.perfilusuario
-                    perfil.ultimo_acceso = timezone.now()
-                    perfil.save()
-                except PerfilUsuario.DoesNotExist:
-                    pass
+                # El último acceso lo registra usuarios.actividad.UltimoAccesoMiddleware
                 
                 # Configurar sesión persistente si "Recordarme" está marcado
                 if remember_me:
@@ -0,0 +1,238 @@
+"""
+Medición de todas las vistas de ``convenios``, ``usuarios`` y ``supervisores``.
+
+``vistas_a_medir`` recorre las rutas con nombre de las tres aplicaciones y
+completa sus parámetros con objetos de la base (el convenio con más informes,
+el supervisor con más convenios, el perfil del usuario que navega), así que
+una ruta nueva se mide sin tocar este módulo. ``medir`` pide cada URL con el
+cliente de pruebas de Django (GET, como un navegador, salvo las rutas de
+``POR_POST``) y obtiene por vista la
+mediana y el percentil 95 de la latencia, las consultas y el tiempo de SQL
+que anota ``ConsultasSQLMiddleware`` y el pico de memoria de Python, que se
+mide con ``tracemalloc`` en una petición aparte para no inflar las latencias.
+
+Los resultados se guardan en JSON (``guardar``) junto al commit y el tamaño
+de las tablas, y ``comparar`` los enfrenta con los de otra ejecución.
+"""
+import json
+import logging
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from supervisores.models import Supervisor
+from usuarios.models import Notificacion, PerfilUsuario
+
+from .models import Convenio, Informe
+
+APLICACIONES = ('convenios', 'usuarios', 'supervisores')
+
+# Rutas que no tiene sentido pedir en bucle, con el motivo que se informa
+OMITIDAS = {
+    'usuarios:flujo_notificaciones': 'flujo SSE que no termina',
+}
+
+# Rutas que sólo aceptan POST y se pueden repetir sin cambiar el resultado
+POR_POST = frozenset({'usuarios:marcar_notificacion_leida', 'usuarios:marcar_todas_leidas'})
+
+
+@dataclass
+class MedicionVista:
+    vista: str
+    url: str
+    estado: int = 0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    media_ms: float = 0.0
+    consultas: int = 0
+    sql_ms: float = 0.0
+    consultas_repetidas: int = 0
+    memoria_pico_kb: float = 0.0
+
+
+@dataclass
+class ResultadoBenchmark:
+    commit: str
+    fecha: str
+    repeticiones: int
+    tablas: dict
+    vistas: list = field(default_factory=list)
+    omitidas: dict = field(default_factory=dict)
+
+
+def percentil(valores, fraccion):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fraccion))]
+
+
+def commit_actual():
+    try:
+        salida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=settings.BASE_DIR,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    return salida.stdout.strip()
+
+
+def muestras(usuario):
+    """Valores para los parámetros de las rutas, tomados de la base"""
+    convenio = (
+        Convenio.objects.annotate(total=Count('informes')).order_by('-total', 'pk').values_list('pk', flat=True).first()
+    )
+    supervisor = (
+        Supervisor.objects.annotate(total=Count('convenios_asignados')).order_by('-total', 'pk')
+        .values_list('pk', flat=True).first()
+    )
+    perfil = PerfilUsuario.objects.filter(user=usuario).values_list('pk', flat=True).first()
+    return {
+        'convenio_id': convenio,
+        'informe_id': Informe.objects.filter(convenio_id=convenio).values_list('pk', flat=True).first(),
+        'supervisor_id': supervisor,
+        'usuario_id': usuario.pk,
+        'perfil_id': perfil,
+        'archivo': 'foto-40.webp',
+        'notificacion_id': Notificacion.objects.filter(usuario=usuario).values_list('pk', flat=True).first(),
+    }
+
+
+def vistas_a_medir(valores):
+    """``(vistas, omitidas)``: pares ``(nombre, url)`` y motivos de las rutas que no se piden"""
+    vistas, omitidas = [], {}
+    for aplicacion in APLICACIONES:
+        modulo = import_module(f'{aplicacion}.urls')
+        for patron in modulo.urlpatterns:
+            if not patron.name:
+                continue
+            nombre = f'{modulo.app_name}:{patron.name}'
+            if nombre in OMITIDAS:
+                omitidas[nombre] = OMITIDAS[nombre]
+                continue
+            parametros = {clave: valores.get(clave) for clave in patron.pattern.converters}
+            faltan = [clave for clave, valor in parametros.items() if valor is None]
+            if faltan:
+                omitidas[nombre] = f'sin datos para {", ".join(faltan)}'
+                continue
+            vistas.append((nombre, reverse(nombre, kwargs=parametros)))
+    return vistas, omitidas
+
+
+def _pedir(cliente, url, sin_cache, metodo='get'):
+    if sin_cache:
+        cache.clear()
+    inicio = time.perf_counter()
+    respuesta = getattr(cliente, metodo)(url)
+    duracion = time.perf_counter() - inicio
+    # Consumir el cuerpo de las respuestas en streaming (descargas, exportaciones)
+    if respuesta.streaming:
+        for _ in respuesta.streaming_content:
+            pass
+        duracion = time.perf_counter() - inicio
+    respuesta.close()
+    return respuesta, duracion
+
+
+def medir_vista(cliente, nombre, url, repeticiones, sin_cache=False):
+    medicion = MedicionVista(vista=nombre, url=url)
+    metodo = 'post' if nombre in POR_POST else 'get'
+    # Calentamiento: plantillas compiladas, caché y conexiones ya abiertas
+    _pedir(cliente, url, sin_cache, metodo)
+
+    tiempos = []
+    for _ in range(repeticiones):
+        respuesta, duracion = _pedir(cliente, url, sin_cache, metodo)
+        tiempos.append(duracion)
+    medicion.estado = respuesta.status_code
+    medicion.p50_ms = round(statistics.median(tiempos) * 1000, 2)
+    medicion.p95_ms = round(percentil(tiempos, 0.95) * 1000, 2)
+    medicion.media_ms = round(statistics.fmean(tiempos) * 1000, 2)
+    sql = getattr(respuesta.wsgi_request, 'medicion_sql', None)
+    if sql is not None:
+        medicion.consultas = sql.consultas
+        medicion.sql_ms = round(sql.tiempo_sql * 1000, 2)
+        medicion.consultas_repetidas = max(sql.formas.values(), default=0)
+
+    tracemalloc.start()
+    try:
+        _pedir(cliente, url, sin_cache, metodo)
+        medicion.memoria_pico_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return medicion
+
+
+def medir(usuario, repeticiones=20, filtro=None, sin_cache=False, al_medir=None):
+    """Mide las vistas (las que contienen ``filtro`` en su nombre) navegando como ``usuario``"""
+    valores = muestras(usuario)
+    vistas, omitidas = vistas_a_medir(valores)
+    resultado = ResultadoBenchmark(
+        commit=commit_actual(),
+        fecha=timezone.now().isoformat(timespec='seconds'),
+        repeticiones=repeticiones,
+        tablas={
+            modelo._meta.label: modelo.objects.count()
+            for modelo in (Convenio, Informe, Supervisor, Notificacion)
+        },
+        omitidas=omitidas,
+    )
+    # Los avisos de presupuesto y las trazas de los 500 se repetirían en cada
+    # petición: el informe ya refleja las consultas y el estado de cada vista
+    registros = [logging.getLogger(nombre) for nombre in ('gestion_convenios_ucc.instrumentacion', 'django.request')]
+    niveles = [registro.level for registro in registros]
+    for registro in registros:
+        registro.setLevel(logging.CRITICAL)
+    try:
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            SQL_INSTRUMENTACION_ACTIVA=True,
+            METRICAS_ACTIVAS=False,
+        ):
+            cliente = Client(raise_request_exception=False)
+            cliente.force_login(usuario)
+            for nombre, url in vistas:
+                if filtro and filtro not in nombre:
+                    continue
+                medicion = medir_vista(cliente, nombre, url, repeticiones, sin_cache)
+                resultado.vistas.append(medicion)
+                if al_medir:
+                    al_medir(medicion)
+            cliente.logout()
+    finally:
+        for registro, nivel in zip(registros, niveles):
+            registro.setLevel(nivel)
+    return resultado
+
+
+def guardar(resultado, ruta):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(asdict(resultado), archivo, ensure_ascii=False, indent=2)
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def comparar(resultado, anterior):
+    """``(vista, p50 anterior, p50 actual, consultas anteriores, consultas actuales)`` de las vistas comunes"""
+    previas = {vista['vista']: vista for vista in anterior.get('vistas', [])}
+    return [
+        (
+            medicion.vista, previas[medicion.vista]['p50_ms'], medicion.p50_ms,
+            previas[medicion.vista]['consultas'], medicion.consultas,
+        )
+        for medicion in resultado.vistas
+        if medicion.vista in previas
+    ]
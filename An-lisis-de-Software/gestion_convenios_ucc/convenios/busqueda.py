@@ -0,0 +1,291 @@
+"""
+Búsqueda de texto completo sobre convenios.
+
+El índice guarda, por convenio, la empresa/entidad, la descripción, los
+nombres del supervisor y de los supervisores asignados, y los títulos y el
+comienzo del texto de los archivos de sus informes (ver
+``convenios/extraccion.py``): de cada informe se indexan como mucho
+``BUSQUEDA_MAX_CARACTERES_INFORME`` caracteres, cortados en la consulta, para
+que reindexar un convenio no cargue todo lo extraído. En SQLite es una tabla
+virtual FTS5 y en PostgreSQL una columna ``tsvector`` con índice GIN (ver la
+migración ``0003_indice_busqueda``).
+Las señales de ``convenios.signals`` lo mantienen al día fila a fila;
+``manage.py rebuild_search_index`` lo reconstruye completo.
+"""
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Substr
+from django.utils.module_loading import import_string
+
+from .models import Convenio, Informe
+
+TABLA_INDICE = 'convenios_busqueda'
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def max_caracteres_informe():
+    return getattr(settings, 'BUSQUEDA_MAX_CARACTERES_INFORME', 20_000)
+
+
+def _tokens(texto):
+    return _TOKEN.findall(texto or '')
+
+
+def _nombre(nombre, apellido, usuario):
+    return f'{nombre} {apellido}'.strip() or usuario or ''
+
+
+def documentos(convenio_ids, alias='default'):
+    """Construye los textos a indexar de cada convenio con tres consultas"""
+    supervisores = defaultdict(list)
+    informes = defaultdict(list)
+    docs = {}
+
+    convenios = Convenio.objects.using(alias).filter(id__in=convenio_ids).values_list(
+        'id', 'empresa_entidad', 'descripcion',
+        'supervisor__first_name', 'supervisor__last_name', 'supervisor__username',
+    )
+    for convenio_id, empresa, descripcion, nombre, apellido, usuario in convenios:
+        docs[convenio_id] = [empresa, descripcion]
+        supervisores[convenio_id].append(_nombre(nombre, apellido, usuario))
+
+    from supervisores.models import Supervisor
+
+    asignados = Supervisor.convenios_asignados.through.objects.using(alias).filter(convenio_id__in=docs).values_list(
+        'convenio_id', 'supervisor__user__first_name', 'supervisor__user__last_name', 'supervisor__user__username',
+    )
+    for convenio_id, nombre, apellido, usuario in asignados:
+        supervisores[convenio_id].append(_nombre(nombre, apellido, usuario))
+
+    # El texto extraído vive en otra tabla: se trae recortado con el mismo LEFT JOIN
+    textos = Informe.objects.using(alias).filter(convenio_id__in=docs).values_list(
+        'convenio_id', 'titulo', Substr('texto_extraido__texto', 1, max_caracteres_informe()),
+    )
+    for convenio_id, titulo, texto in textos:
+        informes[convenio_id].append(titulo)
+        if texto:
+            informes[convenio_id].append(texto)
+
+    return {
+        convenio_id: (
+            empresa,
+            descripcion,
+            ' '.join(nombre for nombre in supervisores[convenio_id] if nombre),
+            ' '.join(informes[convenio_id]),
+        )
+        for convenio_id, (empresa, descripcion) in docs.items()
+    }
+
+
+class BackendBusqueda:
+    """Interfaz común de los motores de búsqueda"""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def connection(self):
+        return connections[self.alias]
+
+    def indexar(self, convenio_ids):
+        """Vuelve a indexar los convenios indicados (los inexistentes se eliminan)"""
+        raise NotImplementedError
+
+    def eliminar(self, convenio_ids):
+        raise NotImplementedError
+
+    def vaciar(self):
+        raise NotImplementedError
+
+    def buscar(self, texto, limite=50):
+        """Ids de convenios que coinciden con ``texto`` ordenados por relevancia"""
+        raise NotImplementedError
+
+    def filtrar(self, queryset, texto):
+        """Restringe ``queryset`` a los convenios que coinciden, sin cambiar su orden"""
+        raise NotImplementedError
+
+    def reconstruir(self, lote=1000):
+        """Reindexa todos los convenios en lotes; devuelve cuántos se indexaron"""
+        self.vaciar()
+        total = 0
+        ultimo_id = 0
+        while True:
+            ids = list(
+                Convenio.objects.using(self.alias).filter(id__gt=ultimo_id)
+                .order_by('id').values_list('id', flat=True)[:lote]
+            )
+            if not ids:
+                return total
+            self.indexar(ids)
+            total += len(ids)
+            ultimo_id = ids[-1]
+
+
+class BackendSQLiteFTS5(BackendBusqueda):
+    # Pesos de bm25 por columna: empresa, descripción, supervisores, informes
+    PESOS = (10.0, 2.0, 5.0, 1.0)
+
+    @staticmethod
+    def consulta(texto):
+        """Convierte el texto del usuario en una consulta FTS5 de prefijos unidos por AND"""
+        return ' '.join(f'"{token}"*' for token in _tokens(texto))
+
+    def eliminar(self, convenio_ids):
+        ids = list(convenio_ids)
+        if not ids:
+            return
+        marcadores = ', '.join(['%s'] * len(ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_INDICE} WHERE rowid IN ({marcadores})', ids)
+
+    def indexar(self, convenio_ids):
+        ids = list(convenio_ids)
+        docs = documentos(ids, self.alias)
+        self.eliminar(ids)
+        if not docs:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLA_INDICE} (rowid, empresa_entidad, descripcion, supervisores, informes) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [(convenio_id, *doc) for convenio_id, doc in docs.items()],
+            )
+
+    def vaciar(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_INDICE}')
+
+    def buscar(self, texto, limite=50):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return []
+        pesos = ', '.join(str(peso) for peso in self.PESOS)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLA_INDICE} WHERE {TABLA_INDICE} MATCH %s '
+                f'ORDER BY bm25({TABLA_INDICE}, {pesos}) LIMIT %s',
+                [consulta, limite],
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def filtrar(self, queryset, texto):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return queryset
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {TABLA_INDICE} WHERE {TABLA_INDICE} MATCH %s', [consulta])
+        )
+
+
+class BackendPostgres(BackendBusqueda):
+    CONFIGURACION = 'spanish'
+
+    @staticmethod
+    def consulta(texto):
+        """Convierte el texto del usuario en un ``tsquery`` de prefijos unidos por AND"""
+        return ' & '.join(f'{token}:*' for token in _tokens(texto))
+
+    def eliminar(self, convenio_ids):
+        ids = list(convenio_ids)
+        if not ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_INDICE} WHERE convenio_id = ANY(%s)', [ids])
+
+    def indexar(self, convenio_ids):
+        ids = list(convenio_ids)
+        docs = documentos(ids, self.alias)
+        self.eliminar(set(ids) - set(docs))
+        if not docs:
+            return
+        config = self.CONFIGURACION
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLA_INDICE} (convenio_id, documento) VALUES (%s, '
+                f"setweight(to_tsvector('{config}', %s), 'A') || "
+                f"setweight(to_tsvector('{config}', %s), 'C') || "
+                f"setweight(to_tsvector('simple', %s), 'B') || "
+                f"setweight(to_tsvector('{config}', %s), 'D')) "
+                f'ON CONFLICT (convenio_id) DO UPDATE SET documento = EXCLUDED.documento',
+                [(convenio_id, *doc) for convenio_id, doc in docs.items()],
+            )
+
+    def vaciar(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {TABLA_INDICE}')
+
+    def buscar(self, texto, limite=50):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return []
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT convenio_id FROM {TABLA_INDICE}, to_tsquery('{self.CONFIGURACION}', %s) q "
+                f'WHERE documento @@ q ORDER BY ts_rank(documento, q) DESC LIMIT %s',
+                [consulta, limite],
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def filtrar(self, queryset, texto):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return queryset
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT convenio_id FROM {TABLA_INDICE} WHERE documento @@ to_tsquery('{self.CONFIGURACION}', %s)",
+                [consulta],
+            )
+        )
+
+
+class BackendIcontains(BackendBusqueda):
+    """Búsqueda sin índice para motores sin soporte de texto completo"""
+
+    def indexar(self, convenio_ids):
+        pass
+
+    def eliminar(self, convenio_ids):
+        pass
+
+    def vaciar(self):
+        pass
+
+    def _condicion(self, texto):
+        condicion = Q()
+        for token in _tokens(texto):
+            condicion &= (
+                Q(empresa_entidad__icontains=token) |
+                Q(descripcion__icontains=token) |
+                Q(supervisor__first_name__icontains=token) |
+                Q(supervisor__last_name__icontains=token)
+            )
+        return condicion
+
+    def buscar(self, texto, limite=50):
+        return list(self.filtrar(Convenio.objects.all(), texto).values_list('id', flat=True)[:limite])
+
+    def filtrar(self, queryset, texto):
+        return queryset.filter(self._condicion(texto))
+
+
+BACKENDS_POR_MOTOR = {
+    'sqlite': BackendSQLiteFTS5,
+    'postgresql': BackendPostgres,
+}
+
+
+def obtener_backend(alias=None):
+    """Motor configurado en ``BUSQUEDA_BACKEND`` o el propio de la base de datos"""
+    alias = alias or router.db_for_write(Convenio)
+    ruta = getattr(settings, 'BUSQUEDA_BACKEND', None)
+    if ruta:
+        return import_string(ruta)(alias)
+    clase = BACKENDS_POR_MOTOR.get(connections[alias].vendor, BackendIcontains)
+    return clase(alias)
@@ -0,0 +1,39 @@
+"""
+Ejecución concurrente de consultas independientes desde vistas asíncronas.
+
+El ORM asíncrono de Django (``acount``, ``aaggregate``, iteración ``async for``)
+delega en ``sync_to_async`` con ``thread_sensitive=True``: todas las consultas
+de una petición pasan por el mismo hilo y se ejecutan una tras otra aunque se
+lancen juntas con ``asyncio.gather``. Aquí cada función corre en un hilo del
+ejecutor con su propia conexión, de modo que el tiempo total se acerca al de
+la consulta más lenta. La ganancia requiere varios núcleos o una base de
+datos en red; con SQLite en un solo núcleo domina el costo de cambiar de hilo.
+
+Las funciones deben devolver datos ya evaluados (listas, dataclasses), nunca
+querysets perezosos que se consultarían después al renderizar.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+def _cerrar_conexiones_vencidas():
+    # Lo mismo que hace Django al terminar una petición: respeta CONN_MAX_AGE
+    for conexion in connections.all(initialized_only=True):
+        conexion.close_if_unusable_or_obsolete()
+
+
+def _en_hilo_propio(funcion):
+    def ejecutar():
+        try:
+            return funcion()
+        finally:
+            _cerrar_conexiones_vencidas()
+
+    return sync_to_async(ejecutar, thread_sensitive=False)
+
+
+async def en_paralelo(*funciones):
+    """Ejecuta las funciones sin argumentos a la vez y devuelve sus resultados en orden"""
+    return await asyncio.gather(*(_en_hilo_propio(funcion)() for funcion in funciones))
@@ -0,0 +1,121 @@
+"""
+Caché de los contadores del dashboard sobre el framework de caché de Django.
+
+Cada grupo de métricas (una consulta de agregación de ``stats``) se guarda
+bajo su propia clave. Las señales de ``convenios.signals`` eliminan sólo las
+claves de la tabla modificada; ``CONTADORES_CACHE_TTL`` acota el tiempo que un
+valor puede sobrevivir si alguna escritura no pasa por las señales
+(por ejemplo ``QuerySet.update``), en cuyo caso se debe llamar a ``invalidar``.
+
+La invalidación sólo llega a todos los procesos si la caché es compartida,
+como la de archivos del perfil de producción. Con la ``LocMemCache`` de
+desarrollo cada proceso tiene la suya: una escritura (o ``invalidar`` desde un
+comando de gestión) sólo la limpia en el proceso que la hace, y los demás
+pueden mostrar el valor anterior hasta ``CONTADORES_CACHE_TTL``.
+
+Los valores se recalculan siempre sobre la primaria (``routers.en_primaria``):
+una réplica atrasada dejaría en la caché, para todos, el dato que la señal
+acaba de invalidar.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from gestion_convenios_ucc.routers import en_primaria
+
+from .stats import (
+    EstadisticasDashboard,
+    estadisticas_convenios,
+    estadisticas_informes,
+    estadisticas_supervisores,
+    estadisticas_usuarios,
+)
+
+PREFIJO_CLAVE = 'contadores'
+
+GRUPOS = {
+    'convenios': estadisticas_convenios,
+    'informes': estadisticas_informes,
+    'supervisores': estadisticas_supervisores,
+    'usuarios': estadisticas_usuarios,
+}
+
+_lock = threading.Lock()
+_aciertos = dict.fromkeys(GRUPOS, 0)
+_fallos = dict.fromkeys(GRUPOS, 0)
+
+
+def _clave(grupo):
+    return f'{PREFIJO_CLAVE}:{grupo}'
+
+
+def _ttl():
+    return getattr(settings, 'CONTADORES_CACHE_TTL', 300)
+
+
+def _registrar(grupo, acierto):
+    with _lock:
+        if acierto:
+            _aciertos[grupo] += 1
+        else:
+            _fallos[grupo] += 1
+
+
+def _calcular(grupo):
+    with en_primaria():
+        return GRUPOS[grupo]()
+
+
+def obtener(grupo):
+    """Devuelve las estadísticas de un grupo desde la caché o las recalcula"""
+    valor = cache.get(_clave(grupo))
+    if valor is not None:
+        _registrar(grupo, acierto=True)
+        return valor
+
+    _registrar(grupo, acierto=False)
+    valor = _calcular(grupo)
+    cache.set(_clave(grupo), valor, _ttl())
+    return valor
+
+
+def dashboard():
+    """Estadísticas del dashboard con una sola lectura de caché para los tres grupos"""
+    grupos = ('convenios', 'informes', 'supervisores')
+    encontrados = cache.get_many([_clave(grupo) for grupo in grupos])
+
+    valores = {}
+    for grupo in grupos:
+        valor = encontrados.get(_clave(grupo))
+        if valor is None:
+            _registrar(grupo, acierto=False)
+            valor = _calcular(grupo)
+            cache.set(_clave(grupo), valor, _ttl())
+        else:
+            _registrar(grupo, acierto=True)
+        valores[grupo] = valor
+
+    return EstadisticasDashboard(**valores)
+
+
+def invalidar(*grupos):
+    """Elimina de la caché los grupos indicados (todos si no se indica ninguno)"""
+    cache.delete_many([_clave(grupo) for grupo in (grupos or GRUPOS)])
+
+
+def estadisticas_cache():
+    """Aciertos y fallos por grupo acumulados en este proceso"""
+    with _lock:
+        return {
+            grupo: {'aciertos': _aciertos[grupo], 'fallos': _fallos[grupo]}
+            for grupo in GRUPOS
+        }
+
+
+def reiniciar_estadisticas_cache():
+    """Pone a cero los contadores de aciertos y fallos"""
+    with _lock:
+        for grupo in GRUPOS:
+            _aciertos[grupo] = 0
+            _fallos[grupo] = 0
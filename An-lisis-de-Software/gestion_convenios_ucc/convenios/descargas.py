@@ -0,0 +1,210 @@
+"""
+Descarga protegida de los archivos de convenios e informes.
+
+Los archivos bajo ``MEDIA_ROOT`` no se publican: las vistas comprueban que
+el usuario pueda verlos y responden con ``FileResponse``, que los lee por
+bloques sin cargarlos en memoria. Se atienden peticiones ``Range`` de un solo
+intervalo (``206``), lo que permite reanudar descargas y que el visor de PDF
+del navegador pida sólo las páginas que muestra, y ``ETag``/``Last-Modified``
+para responder ``304`` a las revalidaciones.
+
+Con ``ARCHIVOS_DESCARGA_DELEGADA`` el worker sólo autoriza y el servidor
+frontal envía el archivo, con su propio soporte de Range y caché:
+
+- ``'x-sendfile'`` (Apache mod_xsendfile, lighttpd): ruta absoluta en disco.
+- ``'x-accel-redirect'`` (nginx): ruta bajo ``ARCHIVOS_PREFIJO_INTERNO``,
+  que debe declararse como ubicación interna apuntando a ``MEDIA_ROOT``::
+
+      location /archivos-protegidos/ {
+          internal;
+          alias /ruta/a/media/;
+      }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+BLOQUE_LECTURA = 64 * 1024
+CACHE_INMUTABLE = 365 * 24 * 60 * 60
+
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def es_administrador(usuario):
+    if usuario.is_superuser or usuario.is_staff:
+        return True
+    perfil = getattr(usuario, 'perfilusuario', None)
+    return perfil is not None and perfil.rol == 'admin'
+
+
+def puede_ver_convenio(usuario, convenio):
+    """Administradores, el supervisor del convenio y los supervisores asignados"""
+    if es_administrador(usuario) or convenio.supervisor_id == usuario.pk:
+        return True
+    return convenio.supervisores_asignados.filter(user_id=usuario.pk).exists()
+
+
+def puede_ver_informe(usuario, informe):
+    """Quien entregó el informe o quien puede ver su convenio"""
+    return informe.supervisor_id == usuario.pk or puede_ver_convenio(usuario, informe.convenio)
+
+
+def calcular_etag(tamano, modificado):
+    # Como nginx: tamaño y fecha de modificación, sin leer el archivo
+    return f'"{int(modificado * 1_000_000):x}-{tamano:x}"'
+
+
+def interpretar_rango(cabecera, tamano):
+    """
+    Devuelve ``(inicio, fin)`` inclusivos, ``None`` si la cabecera se ignora
+    (ausente, con varios intervalos o mal formada) o ``False`` si el intervalo
+    no se puede satisfacer.
+    """
+    coincidencia = _RANGO.match((cabecera or '').replace(' ', ''))
+    if coincidencia is None:
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        if not fin:
+            return None
+        # bytes=-N: los últimos N bytes
+        sufijo = int(fin)
+        if sufijo == 0 or tamano == 0:
+            return False
+        return max(tamano - sufijo, 0), tamano - 1
+    inicio = int(inicio)
+    if fin and int(fin) < inicio:
+        return None
+    if inicio >= tamano:
+        return False
+    return inicio, min(int(fin), tamano - 1) if fin else tamano - 1
+
+
+def _rango_vigente(request, etag, modificado):
+    """If-Range: el rango sólo vale si el archivo no cambió desde que se pidió"""
+    condicion = request.headers.get('If-Range')
+    if not condicion:
+        return True
+    if condicion.startswith('"'):
+        return condicion == etag
+    fecha = parse_http_date_safe(condicion)
+    return fecha is not None and int(modificado) <= fecha
+
+
+class Segmento:
+    """Archivo abierto que sólo deja leer ``longitud`` bytes desde la posición actual"""
+
+    def __init__(self, archivo, longitud):
+        self.archivo = archivo
+        self.restante = longitud
+
+    def read(self, tamano=-1):
+        if self.restante <= 0:
+            return b''
+        if tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.archivo.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def _delegada(nombre_archivo, ruta, tipo, disposicion):
+    modo = getattr(settings, 'ARCHIVOS_DESCARGA_DELEGADA', None)
+    if not modo or ruta is None:
+        return None
+    respuesta = HttpResponse(content_type=tipo)
+    respuesta['Content-Disposition'] = disposicion
+    if modo == 'x-sendfile':
+        respuesta['X-Sendfile'] = ruta
+    elif modo == 'x-accel-redirect':
+        prefijo = getattr(settings, 'ARCHIVOS_PREFIJO_INTERNO', '/archivos-protegidos/')
+        respuesta['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + quote(nombre_archivo)
+    else:
+        raise ValueError(f'ARCHIVOS_DESCARGA_DELEGADA desconocido: {modo!r}')
+    return respuesta
+
+
+def respuesta_archivo(request, campo, descargar=False, nombre=None):
+    """
+    Sirve el archivo de un ``FileField`` con Range, ETag y Last-Modified.
+    ``nombre`` (sin extensión) reemplaza al del almacenamiento, que para los
+    documentos deduplicados es su SHA-256.
+    """
+    if not campo:
+        raise Http404('No hay archivo asociado.')
+    return servir_archivo(request, campo.storage, campo.name, descargar=descargar, nombre=nombre)
+
+
+def servir_archivo(request, almacenamiento, nombre_archivo, descargar=False, nombre=None, inmutable=False):
+    """
+    Sirve ``nombre_archivo`` de ``almacenamiento``. Con ``inmutable`` (el
+    nombre cambia si cambia el contenido) el navegador lo guarda un año sin
+    revalidar.
+    """
+    try:
+        ruta = almacenamiento.path(nombre_archivo)
+    except NotImplementedError:  # almacenamiento remoto: no hay ruta local
+        ruta = None
+    try:
+        tamano = almacenamiento.size(nombre_archivo)
+        modificado = almacenamiento.get_modified_time(nombre_archivo).timestamp()
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404('El archivo no está disponible.')
+
+    if nombre:
+        nombre += os.path.splitext(nombre_archivo)[1]
+    else:
+        nombre = os.path.basename(nombre_archivo)
+    tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+    disposicion = content_disposition_header(descargar, nombre)
+
+    delegada = _delegada(nombre_archivo, ruta, tipo, disposicion)
+    if delegada is not None:
+        return delegada
+
+    etag = calcular_etag(tamano, modificado)
+    base = HttpResponse()
+    base['ETag'] = etag
+    base['Last-Modified'] = http_date(modificado)
+    if inmutable:
+        patch_cache_control(base, private=True, max_age=CACHE_INMUTABLE, immutable=True)
+    else:
+        # Protegido: ningún caché compartido lo guarda y el navegador revalida con el ETag
+        patch_cache_control(base, private=True, no_cache=True)
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(modificado), response=base)
+    if condicional is not base:
+        return condicional
+
+    rango = None
+    if request.headers.get('Range') and _rango_vigente(request, etag, modificado):
+        rango = interpretar_rango(request.headers['Range'], tamano)
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{tamano}'
+        return respuesta
+
+    archivo = almacenamiento.open(nombre_archivo, 'rb')
+    if rango:
+        inicio, fin = rango
+        archivo.seek(inicio)
+        respuesta = FileResponse(Segmento(archivo, fin - inicio + 1), status=206, content_type=tipo)
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        respuesta['Content-Length'] = str(fin - inicio + 1)
+    else:
+        respuesta = FileResponse(archivo, content_type=tipo)
+        respuesta['Content-Length'] = str(tamano)
+    respuesta.block_size = BLOQUE_LECTURA
+    respuesta['Content-Disposition'] = disposicion
+    respuesta['Accept-Ranges'] = 'bytes'
+    for cabecera in ('ETag', 'Last-Modified', 'Cache-Control'):
+        respuesta[cabecera] = base[cabecera]
+    return respuesta
@@ -0,0 +1,70 @@
+"""
+Transición por lotes de los estados de vigencia de los convenios.
+
+``activo``, ``por_vencer`` y ``vencido`` dependen sólo de la fecha de
+vencimiento; el resto de estados (revisión, jurídico, firma...) son del flujo
+de aprobación y no se tocan. Cada transición es un ``UPDATE`` por lotes de
+ids acotados, condicionado al estado de origen, por lo que ejecutar el
+proceso varias veces seguidas no produce cambios adicionales.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import contadores
+from .models import Convenio, DIAS_AVISO_VENCIMIENTO
+
+ESTADOS_VIGENCIA = ('activo', 'por_vencer', 'vencido')
+
+
+def transiciones(hoy):
+    """Estado de destino y condición de fecha que lo define"""
+    limite = hoy + timedelta(days=DIAS_AVISO_VENCIMIENTO)
+    return [
+        ('vencido', Q(fecha_vencimiento__lt=hoy)),
+        ('por_vencer', Q(fecha_vencimiento__gte=hoy, fecha_vencimiento__lte=limite)),
+        ('activo', Q(fecha_vencimiento__gt=limite)),
+    ]
+
+
+def pendientes_de_transicion(destino, condicion):
+    origenes = [estado for estado in ESTADOS_VIGENCIA if estado != destino]
+    return Convenio.objects.filter(condicion, estado__in=origenes)
+
+
+def actualizar_estados(hoy=None, lote=1000, simular=False):
+    """
+    Mueve los convenios al estado que corresponde a su fecha de vencimiento.
+
+    Devuelve un diccionario ``{estado_destino: filas_cambiadas}``. Con
+    ``simular`` sólo cuenta las filas que cambiarían.
+    """
+    hoy = hoy or timezone.now().date()
+    cambios = {}
+
+    for destino, condicion in transiciones(hoy):
+        pendientes = pendientes_de_transicion(destino, condicion)
+        if simular:
+            cambios[destino] = pendientes.count()
+            continue
+
+        total = 0
+        while True:
+            # Una transacción corta por lote para no retener el bloqueo de escritura
+            with transaction.atomic():
+                ids = list(pendientes.order_by('pk').values_list('pk', flat=True)[:lote])
+                if not ids:
+                    break
+                total += pendientes.filter(pk__in=ids).update(
+                    estado=destino,
+                    fecha_actualizacion=timezone.now(),
+                )
+        cambios[destino] = total
+
+    # ``update`` no dispara señales: los contadores cacheados se invalidan aquí
+    if not simular and any(cambios.values()):
+        contadores.invalidar('convenios')
+
+    return cambios
@@ -0,0 +1,132 @@
+"""
+Exportación del listado de convenios a CSV y XLSX con memoria constante.
+
+Las filas se leen con ``values_list(...).iterator(chunk_size=...)`` y los días
+para vencer se calculan en SQL, así que nunca se instancian modelos ni se
+carga el resultado completo. El CSV se envía fila a fila con
+``StreamingHttpResponse``; el XLSX se escribe con openpyxl en modo
+``write_only`` sobre un archivo temporal y se sirve con ``FileResponse``.
+
+Los textos libres (la empresa, que también llega por la importación, y el
+nombre del supervisor) pueden empezar por ``=``, ``+``, ``-`` o ``@``: Excel y
+LibreOffice los ejecutarían como fórmulas al abrir el archivo. ``escapar`` les
+antepone ``'`` y en el XLSX se escriben además como celdas de texto.
+"""
+import csv
+import tempfile
+
+from django.conf import settings
+from django.db.models import DateField, F, Value
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Convenio
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+except ImportError:  # pragma: no cover - dependencia opcional
+    Workbook = None
+
+ENCABEZADOS = [
+    'ID', 'Empresa/Entidad', 'Tipo', 'Estado', 'Fecha de Inicio',
+    'Fecha de Vencimiento', 'Días para Vencer', 'Supervisor', 'Fecha de Creación',
+]
+
+TIPOS = dict(Convenio.TIPO_CHOICES)
+ESTADOS = dict(Convenio.ESTADO_CHOICES)
+
+# Comienzos con los que una hoja de cálculo interpreta la celda como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def xlsx_disponible():
+    return Workbook is not None
+
+
+def escapar(valor):
+    """Antepone ``'`` a los textos que una hoja de cálculo tomaría por fórmulas"""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return f"'{valor}"
+    return valor
+
+
+def _tamano_lote():
+    return getattr(settings, 'EXPORTACION_TAMANO_LOTE', 2000)
+
+
+def filas(convenios):
+    """Genera las filas a exportar sin cargar el queryset en memoria"""
+    hoy = timezone.now().date()
+    valores = convenios.annotate(
+        dias_restantes=F('fecha_vencimiento') - Value(hoy, output_field=DateField()),
+    ).order_by('-fecha_creacion', '-id').values_list(
+        'id', 'empresa_entidad', 'tipo', 'estado', 'fecha_inicio', 'fecha_vencimiento',
+        'dias_restantes', 'supervisor__first_name', 'supervisor__last_name',
+        'supervisor__username', 'fecha_creacion',
+    )
+
+    for (convenio_id, empresa, tipo, estado, inicio, vencimiento, dias_restantes,
+         nombre, apellido, usuario, creacion) in valores.iterator(chunk_size=_tamano_lote()):
+        yield [
+            convenio_id,
+            escapar(empresa),
+            TIPOS.get(tipo, tipo),
+            ESTADOS.get(estado, estado),
+            inicio,
+            vencimiento,
+            dias_restantes.days,
+            escapar(f'{nombre} {apellido}'.strip() or usuario or ''),
+            timezone.localtime(creacion).replace(tzinfo=None),
+        ]
+
+
+class _Eco:
+    """Pseudo-archivo cuyo ``write`` devuelve lo escrito, para ``csv.writer``"""
+
+    def write(self, valor):
+        return valor
+
+
+def _nombre_archivo(extension):
+    return f'convenios_{timezone.localtime():%Y%m%d_%H%M}.{extension}'
+
+
+def respuesta_csv(convenios):
+    escritor = csv.writer(_Eco())
+
+    def contenido():
+        # BOM para que Excel reconozca el UTF-8
+        yield '\ufeff'
+        yield escritor.writerow(ENCABEZADOS)
+        for fila in filas(convenios):
+            yield escritor.writerow(fila)
+
+    respuesta = StreamingHttpResponse(contenido(), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{_nombre_archivo("csv")}"'
+    return respuesta
+
+
+def _celda_texto(hoja, valor):
+    # openpyxl guarda como fórmula cualquier texto que empiece por '='
+    celda = WriteOnlyCell(hoja, valor)
+    celda.data_type = 's'
+    return celda
+
+
+def respuesta_xlsx(convenios):
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Convenios')
+    hoja.append(ENCABEZADOS)
+    for fila in filas(convenios):
+        hoja.append([_celda_texto(hoja, valor) if isinstance(valor, str) else valor for valor in fila])
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=_nombre_archivo('xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -0,0 +1,179 @@
+"""
+Texto de los archivos de informes para la búsqueda.
+
+Al subir o cambiar el archivo de un informe (señales de ``convenios.signals``)
+se encarga a un pool de procesos extraer su texto plano con
+``convenios.textos``; la petición no espera. El texto se guarda en
+``TextoInforme``, una tabla aparte que los listados nunca leen, y el convenio
+se vuelve a indexar para que la búsqueda lo encuentre por el contenido de sus
+informes.
+
+Cada texto guarda el SHA-256 del contenido del que salió. Para los documentos
+deduplicados es su propio nombre, así que saber si un archivo cambió no
+cuesta ni leerlo; para los anteriores lo calcula el proceso que extrae.
+``manage.py extraer_texto_informes`` recorre todos los informes y sólo
+extrae los que cambiaron.
+"""
+import functools
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+
+from gestion_convenios_ucc.segundo_plano import PoolProcesos, ejecutar_todos
+
+from . import textos
+from .almacenamiento import almacenamiento_documentos, es_deduplicado
+from .busqueda import obtener_backend
+from .models import Informe, TextoInforme
+
+logger = logging.getLogger(__name__)
+
+
+def procesos():
+    return getattr(settings, 'EXTRACCION_PROCESOS', 2)
+
+
+pool = PoolProcesos(procesos)
+
+
+def maximo_caracteres():
+    return getattr(settings, 'EXTRACCION_MAX_CARACTERES', 500_000)
+
+
+def sha256_conocido(nombre):
+    """SHA-256 de un documento deduplicado sin leerlo: es su nombre"""
+    if es_deduplicado(nombre):
+        return os.path.splitext(os.path.basename(nombre))[0]
+    return None
+
+
+def tarea(nombre, anterior=None):
+    """Argumentos de ``textos.extraer`` para el archivo ``nombre``"""
+    return almacenamiento_documentos().path(nombre), sha256_conocido(nombre), anterior, maximo_caracteres()
+
+
+def guardar(resultados):
+    """
+    Guarda los ``(informe_id, nombre, (sha256, estado, texto))`` cuyo informe
+    sigue teniendo ese archivo y reindexa sus convenios. Devuelve cuántos
+    textos se guardaron.
+    """
+    resultados = [resultado for resultado in resultados if resultado[2][1] is not None]
+    if not resultados:
+        return 0
+    vigentes = {
+        informe_id: (nombre, convenio_id)
+        for informe_id, nombre, convenio_id in Informe.objects.filter(
+            pk__in=[informe_id for informe_id, _, _ in resultados],
+        ).values_list('pk', 'archivo_informe', 'convenio_id')
+    }
+    filas = [
+        TextoInforme(
+            informe_id=informe_id,
+            sha256=sha256,
+            estado=estado,
+            texto=texto if estado != textos.ERROR else '',
+            error=texto if estado == textos.ERROR else '',
+        )
+        for informe_id, nombre, (sha256, estado, texto) in resultados
+        if vigentes.get(informe_id, (None,))[0] == nombre
+    ]
+    with transaction.atomic():
+        TextoInforme.objects.bulk_create(
+            filas, update_conflicts=True, unique_fields=['informe'],
+            update_fields=['sha256', 'estado', 'texto', 'error', 'fecha_extraccion'],
+        )
+        obtener_backend().indexar({vigentes[fila.informe_id][1] for fila in filas})
+    return len(filas)
+
+
+def _fallo(informe_id):
+    logger.exception('No se pudo extraer el texto del informe %s', informe_id)
+
+
+def programar(informe_id, nombre):
+    """Extrae el texto en segundo plano (o aquí mismo con ``EXTRACCION_PROCESOS = 0``)"""
+    anterior = TextoInforme.objects.filter(informe_id=informe_id).values_list('sha256', flat=True).first()
+    argumentos = tarea(nombre, anterior)
+    if argumentos[1] is not None and argumentos[1] == anterior:
+        return None
+    if not os.path.exists(argumentos[0]):
+        logger.info('El archivo del informe %s no existe: %s', informe_id, nombre)
+        return None
+    return pool.programar(
+        textos.extraer, argumentos,
+        lambda extraido: guardar([(informe_id, nombre, extraido)]),
+        functools.partial(_fallo, informe_id),
+    )
+
+
+@dataclass
+class ResultadoExtraccion:
+    informes: int = 0
+    extraidos: int = 0
+    sin_cambios: int = 0
+    sin_soporte: int = 0
+    errores: int = 0
+    bytes_leidos: int = 0
+    duracion: float = 0.0
+
+
+def extraer_pendientes(trabajadores=None, forzar=False, lote=100):
+    """
+    Extrae en paralelo el texto de los informes cuyo archivo cambió desde la
+    última extracción (o de todos con ``forzar``), guardando por lotes.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoExtraccion()
+    trabajadores = procesos() if trabajadores is None else trabajadores
+    informes = (
+        Informe.objects.exclude(archivo_informe='').order_by('pk')
+        .values_list('pk', 'archivo_informe', 'texto_extraido__sha256')
+    )
+
+    pendientes = []
+    for informe_id, nombre, anterior in informes.iterator():
+        resultado.informes += 1
+        if forzar:
+            anterior = None
+        elif anterior is not None and sha256_conocido(nombre) == anterior:
+            resultado.sin_cambios += 1
+            continue
+        argumentos = tarea(nombre, anterior)
+        try:
+            resultado.bytes_leidos += os.path.getsize(argumentos[0])
+        except OSError:
+            logger.warning('El archivo del informe %s no existe: %s', informe_id, nombre)
+            resultado.errores += 1
+            continue
+        pendientes.append(((informe_id, nombre), argumentos))
+
+    terminados = []
+
+    def recibir(informe, extraido):
+        estado = extraido[1]
+        if estado is None:
+            resultado.sin_cambios += 1
+        elif estado == textos.EXTRAIDO:
+            resultado.extraidos += 1
+        elif estado == textos.SIN_SOPORTE:
+            resultado.sin_soporte += 1
+        else:
+            resultado.errores += 1
+        terminados.append((*informe, extraido))
+        if len(terminados) >= lote:
+            guardar(terminados)
+            terminados.clear()
+
+    def fallido(informe):
+        _fallo(informe[0])
+        resultado.errores += 1
+
+    ejecutar_todos(textos.extraer, pendientes, trabajadores, recibir, fallido)
+    guardar(terminados)
+    resultado.duracion = time.perf_counter() - inicio
+    return resultado
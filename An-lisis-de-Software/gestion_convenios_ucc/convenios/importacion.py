@@ -0,0 +1,202 @@
+"""
+Importación masiva de convenios desde CSV.
+
+El archivo se lee fila a fila con ``csv.DictReader``, de modo que el consumo
+de memoria depende del tamaño de lote y no del archivo. Cada lote se valida
+contra ``TIPO_CHOICES``/``ESTADO_CHOICES``, resuelve los supervisores por
+nombre de usuario con una sola consulta (los ya vistos quedan en un
+diccionario) y se inserta con ``bulk_create`` dentro de su propia transacción.
+Las filas inválidas no detienen la importación: se acumulan en el informe de
+errores con su número de línea.
+
+Como ``bulk_create`` no emite ``post_save``, el índice de búsqueda y los
+contadores se actualizan aquí explícitamente.
+"""
+import csv
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import contadores
+from .busqueda import obtener_backend
+from .models import Convenio
+
+COLUMNAS_OBLIGATORIAS = ('empresa_entidad', 'tipo', 'fecha_inicio', 'fecha_vencimiento')
+COLUMNAS_OPCIONALES = ('estado', 'supervisor', 'descripcion')
+
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+
+# Errores que se muestran en la vista de carga; el resto sólo se cuenta
+ERRORES_A_MOSTRAR = 50
+
+_MAX_EMPRESA = Convenio._meta.get_field('empresa_entidad').max_length
+
+
+def _opciones(choices):
+    """Acepta tanto la clave como la etiqueta visible, sin distinguir mayúsculas"""
+    opciones = {}
+    for clave, etiqueta in choices:
+        opciones[clave.lower()] = clave
+        opciones[etiqueta.lower()] = clave
+    return opciones
+
+
+TIPOS = _opciones(Convenio.TIPO_CHOICES)
+ESTADOS = _opciones(Convenio.ESTADO_CHOICES)
+
+
+class ErrorImportacion(ValueError):
+    pass
+
+
+@dataclass
+class ErrorFila:
+    fila: int
+    mensaje: str
+
+
+@dataclass
+class ResultadoImportacion:
+    procesadas: int = 0
+    creadas: int = 0
+    lotes: int = 0
+    errores: list = field(default_factory=list)
+    duracion: float = 0.0
+
+    @property
+    def con_error(self):
+        return len(self.errores)
+
+    @property
+    def filas_por_segundo(self):
+        return self.procesadas / self.duracion if self.duracion else 0.0
+
+
+def _fecha(valor, columna):
+    valor = (valor or '').strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ErrorImportacion(f'{columna}: fecha inválida "{valor}" (use AAAA-MM-DD o DD/MM/AAAA)')
+
+
+def _opcion(valor, opciones, columna, por_defecto=None):
+    valor = (valor or '').strip()
+    if not valor and por_defecto:
+        return por_defecto
+    try:
+        return opciones[valor.lower()]
+    except KeyError:
+        raise ErrorImportacion(f'{columna}: valor no permitido "{valor}"') from None
+
+
+def convenio_desde_fila(fila, supervisores):
+    """Valida una fila y construye el ``Convenio`` sin guardarlo"""
+    empresa = (fila.get('empresa_entidad') or '').strip()
+    if not empresa:
+        raise ErrorImportacion('empresa_entidad: campo obligatorio')
+    if len(empresa) > _MAX_EMPRESA:
+        raise ErrorImportacion(f'empresa_entidad: máximo {_MAX_EMPRESA} caracteres')
+
+    fecha_inicio = _fecha(fila.get('fecha_inicio'), 'fecha_inicio')
+    fecha_vencimiento = _fecha(fila.get('fecha_vencimiento'), 'fecha_vencimiento')
+    if fecha_vencimiento < fecha_inicio:
+        raise ErrorImportacion('fecha_vencimiento: anterior a la fecha de inicio')
+
+    supervisor_id = None
+    usuario = (fila.get('supervisor') or '').strip()
+    if usuario:
+        supervisor_id = supervisores.get(usuario)
+        if supervisor_id is None:
+            raise ErrorImportacion(f'supervisor: no existe el usuario "{usuario}"')
+
+    return Convenio(
+        empresa_entidad=empresa,
+        tipo=_opcion(fila.get('tipo'), TIPOS, 'tipo'),
+        estado=_opcion(fila.get('estado'), ESTADOS, 'estado', por_defecto='activo'),
+        fecha_inicio=fecha_inicio,
+        fecha_vencimiento=fecha_vencimiento,
+        supervisor_id=supervisor_id,
+        descripcion=(fila.get('descripcion') or '').strip(),
+    )
+
+
+def _resolver_supervisores(lote, supervisores):
+    """Agrega al diccionario los usuarios del lote aún no consultados"""
+    nuevos = {
+        (fila.get('supervisor') or '').strip() for _, fila in lote
+    } - supervisores.keys() - {''}
+    if not nuevos:
+        return
+    supervisores.update(dict.fromkeys(nuevos))
+    supervisores.update(User.objects.filter(username__in=nuevos).values_list('username', 'id'))
+
+
+def _procesar_lote(lote, supervisores, resultado, simular):
+    _resolver_supervisores(lote, supervisores)
+
+    convenios = []
+    for numero, fila in lote:
+        try:
+            convenios.append(convenio_desde_fila(fila, supervisores))
+        except ErrorImportacion as exc:
+            resultado.errores.append(ErrorFila(numero, str(exc)))
+
+    resultado.procesadas += len(lote)
+    resultado.lotes += 1
+    if simular:
+        # En simulación ``creadas`` cuenta las filas válidas que se crearían
+        resultado.creadas += len(convenios)
+        return
+    if not convenios:
+        return
+
+    with transaction.atomic():
+        creados = Convenio.objects.bulk_create(convenios)
+        obtener_backend().indexar([convenio.pk for convenio in creados])
+    resultado.creadas += len(creados)
+
+
+def tamano_lote():
+    return getattr(settings, 'IMPORTACION_TAMANO_LOTE', 500)
+
+
+def importar_convenios(archivo, lote=None, simular=False):
+    """
+    Importa los convenios de ``archivo`` (texto CSV con encabezados).
+
+    Lanza ``ErrorImportacion`` si faltan columnas obligatorias; los errores de
+    cada fila se devuelven en ``ResultadoImportacion.errores``. Con
+    ``simular`` sólo se valida, sin escribir.
+    """
+    lote = lote or tamano_lote()
+    inicio = time.perf_counter()
+    lector = csv.DictReader(archivo)
+    columnas = [columna.strip() for columna in lector.fieldnames or []]
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in columnas]
+    if faltantes:
+        raise ErrorImportacion(f'Faltan columnas obligatorias: {", ".join(faltantes)}')
+    lector.fieldnames = columnas
+
+    resultado = ResultadoImportacion()
+    supervisores = {}
+    pendientes = []
+    for fila in lector:
+        # line_num cuenta líneas físicas, así los errores señalan la línea del archivo
+        pendientes.append((lector.line_num, fila))
+        if len(pendientes) >= lote:
+            _procesar_lote(pendientes, supervisores, resultado, simular)
+            pendientes = []
+    if pendientes:
+        _procesar_lote(pendientes, supervisores, resultado, simular)
+
+    if resultado.creadas and not simular:
+        contadores.invalidar('convenios')
+    resultado.duracion = time.perf_counter() - inicio
+    return resultado
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from convenios.estados import actualizar_estados
+
+
+class Command(BaseCommand):
+    help = 'Actualiza los estados activo/por vencer/vencido según la fecha de vencimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas actualizadas por transacción')
+        parser.add_argument('--simular', action='store_true', help='Sólo cuenta los cambios, sin aplicarlos')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        cambios = actualizar_estados(lote=options['lote'], simular=options['simular'])
+        duracion = time.perf_counter() - inicio
+
+        verbo = 'cambiarían' if options['simular'] else 'cambiados'
+        for estado, total in cambios.items():
+            self.stdout.write(f'  -> {estado}: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(cambios.values())} convenios {verbo} en {duracion:.2f} s'
+        ))
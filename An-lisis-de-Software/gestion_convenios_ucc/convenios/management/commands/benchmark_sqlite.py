@@ -0,0 +1,114 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Configuración por defecto de SQLite (la que usa el perfil de desarrollo)
+PERFIL_DESARROLLO = 'PRAGMA journal_mode=DELETE;PRAGMA synchronous=FULL'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide lecturas y escrituras concurrentes por segundo en una base SQLite temporal '
+        'con la configuración por defecto y con los PRAGMAs del perfil de producción'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segundos', type=float, default=3.0, help='Duración de cada medición')
+        parser.add_argument('--lectores', type=int, default=4, help='Hilos que leen')
+        parser.add_argument('--escritores', type=int, default=2, help='Hilos que escriben')
+        parser.add_argument('--filas', type=int, default=20000, help='Filas de la tabla de prueba')
+
+    def handle(self, *args, **options):
+        perfiles = [
+            ('desarrollo', PERFIL_DESARROLLO),
+            ('produccion', settings.SQLITE_INIT_COMMAND_PRODUCCION),
+        ]
+        for nombre, pragmas in perfiles:
+            with tempfile.TemporaryDirectory() as directorio:
+                ruta = os.path.join(directorio, 'benchmark.sqlite3')
+                self._preparar(ruta, pragmas, options['filas'])
+                lecturas, escrituras, bloqueos = self._medir(ruta, pragmas, options)
+            segundos = options['segundos']
+            self.stdout.write(
+                f'{nombre:<11} lecturas/s: {lecturas / segundos:>9.0f}   '
+                f'escrituras/s: {escrituras / segundos:>8.0f}   bloqueos: {bloqueos}'
+            )
+
+    @staticmethod
+    def _conectar(ruta, pragmas):
+        conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        for pragma in pragmas.split(';'):
+            if pragma.strip():
+                conexion.execute(pragma)
+        return conexion
+
+    def _preparar(self, ruta, pragmas, filas):
+        conexion = self._conectar(ruta, pragmas)
+        conexion.execute('CREATE TABLE registro (id INTEGER PRIMARY KEY, estado TEXT, valor INTEGER, ultimo_acceso REAL)')
+        conexion.execute('CREATE INDEX registro_estado ON registro (estado, valor)')
+        conexion.execute('BEGIN')
+        conexion.executemany(
+            'INSERT INTO registro (id, estado, valor, ultimo_acceso) VALUES (?, ?, ?, ?)',
+            ((i, random.choice(('activo', 'por_vencer', 'vencido')), i, time.time()) for i in range(1, filas + 1)),
+        )
+        conexion.execute('COMMIT')
+        conexion.close()
+
+    def _medir(self, ruta, pragmas, options):
+        filas = options['filas']
+        fin = time.perf_counter() + options['segundos']
+        totales = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+        lock = threading.Lock()
+
+        def sumar(clave, cantidad):
+            with lock:
+                totales[clave] += cantidad
+
+        def lector():
+            conexion = self._conectar(ruta, pragmas)
+            hechas = bloqueos = 0
+            while time.perf_counter() < fin:
+                desde = random.randint(1, filas)
+                try:
+                    # Agregación y página de listado, como el dashboard y las listas
+                    conexion.execute('SELECT estado, COUNT(*) FROM registro GROUP BY estado').fetchall()
+                    conexion.execute(
+                        'SELECT * FROM registro WHERE id >= ? ORDER BY id LIMIT 25', [desde],
+                    ).fetchall()
+                    hechas += 1
+                except sqlite3.OperationalError:
+                    bloqueos += 1
+            conexion.close()
+            sumar('lecturas', hechas)
+            sumar('bloqueos', bloqueos)
+
+        def escritor():
+            conexion = self._conectar(ruta, pragmas)
+            hechas = bloqueos = 0
+            while time.perf_counter() < fin:
+                try:
+                    # Una transacción por escritura, como el registro de último acceso
+                    conexion.execute(
+                        'UPDATE registro SET ultimo_acceso = ? WHERE id = ?',
+                        [time.time(), random.randint(1, filas)],
+                    )
+                    hechas += 1
+                except sqlite3.OperationalError:
+                    bloqueos += 1
+            conexion.close()
+            sumar('escrituras', hechas)
+            sumar('bloqueos', bloqueos)
+
+        hilos = [threading.Thread(target=lector) for _ in range(options['lectores'])]
+        hilos += [threading.Thread(target=escritor) for _ in range(options['escritores'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return totales['lecturas'], totales['escrituras'], totales['bloqueos']
@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from convenios import benchmark
+from convenios.sinteticos import ADMINISTRADOR
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide todas las vistas de convenios, usuarios y supervisores con el cliente de pruebas: '
+        'latencia p50/p95, consultas SQL y pico de memoria por vista. Pensado para los datos de '
+        'seed_benchmark; guarda los resultados en JSON para comparar entre commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones medidas por vista')
+        parser.add_argument('--usuario', help=f'Usuario con el que se navega (por defecto {ADMINISTRADOR} o el primer superusuario)')
+        parser.add_argument('--vista', help='Sólo las vistas cuyo nombre contiene este texto')
+        parser.add_argument('--sin-cache', action='store_true', help='Vacía la caché antes de cada petición')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior con el que comparar')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1.')
+        anterior = None
+        if options['comparar']:
+            try:
+                anterior = benchmark.cargar(options['comparar'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {exc}')
+
+        self.stdout.write(
+            f'{"vista":<42}{"estado":>7}{"p50":>10}{"p95":>10}{"consultas":>10}{"sql":>10}{"memoria":>11}'
+        )
+        resultado = benchmark.medir(
+            self._usuario(options['usuario']),
+            repeticiones=options['repeticiones'],
+            filtro=options['vista'],
+            sin_cache=options['sin_cache'],
+            al_medir=self._escribir,
+        )
+        for vista, motivo in resultado.omitidas.items():
+            self.stdout.write(f'{vista:<42} omitida: {motivo}')
+
+        if anterior is not None:
+            self.stdout.write(f'\nComparación con {anterior.get("commit") or options["comparar"]}')
+            for vista, p50_antes, p50, consultas_antes, consultas in benchmark.comparar(resultado, anterior):
+                cambio = (p50 - p50_antes) / p50_antes * 100 if p50_antes else 0.0
+                self.stdout.write(
+                    f'{vista:<42}{p50_antes:>8.1f}ms →{p50:>8.1f}ms ({cambio:+6.1f}%)'
+                    f'{consultas_antes:>6} →{consultas:>4} consultas'
+                )
+
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}'))
+
+    def _escribir(self, medicion):
+        self.stdout.write(
+            f'{medicion.vista:<42}{medicion.estado:>7}{medicion.p50_ms:>8.1f}ms{medicion.p95_ms:>8.1f}ms'
+            f'{medicion.consultas:>10}{medicion.sql_ms:>8.1f}ms{medicion.memoria_pico_kb:>8.0f} KB'
+        )
+
+    @staticmethod
+    def _usuario(username):
+        usuarios = User.objects.filter(is_active=True)
+        if username:
+            usuario = usuarios.filter(username=username).first()
+        else:
+            usuario = (
+                usuarios.filter(username=ADMINISTRADOR).first()
+                or usuarios.order_by('-is_superuser', 'id').first()
+            )
+        if usuario is None:
+            raise CommandError('No hay un usuario activo con el que navegar.')
+        return usuario
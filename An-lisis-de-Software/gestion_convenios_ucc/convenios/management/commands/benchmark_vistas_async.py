@@ -0,0 +1,109 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+# (nombre, vista síncrona, variante asíncrona)
+VISTAS = [
+    ('dashboard', 'convenios:dashboard', 'convenios:dashboard_async'),
+    ('convenios', 'convenios:lista_convenios', 'convenios:lista_convenios_async'),
+    ('supervisores', 'supervisores:lista_supervisores', 'supervisores:lista_supervisores_async'),
+]
+
+
+def _resumen(tiempos):
+    tiempos = sorted(tiempos)
+    p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+    return statistics.median(tiempos) * 1000, p95 * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la latencia de las vistas síncronas (WSGI) con sus variantes asíncronas '
+        '(ASGI) usando los clientes de prueba de Django. Inicia una sesión para el usuario '
+        'indicado y la cierra al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=50, help='Peticiones por vista')
+        parser.add_argument('--usuario', help='Usuario con el que se navega (por defecto el primer superusuario)')
+        parser.add_argument(
+            '--sin-cache', action='store_true',
+            help='Vacía la caché antes de cada petición para que los contadores se consulten siempre',
+        )
+
+    def handle(self, *args, **options):
+        # Los clientes de prueba envían Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self._comparar(self._usuario(options['usuario']), options['repeticiones'], options['sin_cache'])
+
+    def _comparar(self, usuario, repeticiones, sin_cache):
+        cliente = Client()
+        cliente.force_login(usuario)
+        sincronos = {
+            nombre: self._medir_sync(cliente, reverse(vista), repeticiones, sin_cache)
+            for nombre, vista, _ in VISTAS
+        }
+        cliente.logout()
+
+        asincronos = asyncio.run(self._medir_async(usuario, repeticiones, sin_cache))
+
+        self.stdout.write(f'{"vista":<14}{"sync p50":>10}{"sync p95":>10}{"async p50":>11}{"async p95":>11}{"mejora":>9}')
+        for nombre, _, _ in VISTAS:
+            sync_p50, sync_p95 = _resumen(sincronos[nombre])
+            async_p50, async_p95 = _resumen(asincronos[nombre])
+            mejora = sync_p50 / async_p50 if async_p50 else 0
+            self.stdout.write(
+                f'{nombre:<14}{sync_p50:>8.1f}ms{sync_p95:>8.1f}ms{async_p50:>9.1f}ms{async_p95:>9.1f}ms{mejora:>8.2f}x'
+            )
+
+    @staticmethod
+    def _usuario(username):
+        usuarios = User.objects.filter(is_active=True)
+        if username:
+            usuario = usuarios.filter(username=username).first()
+        else:
+            usuario = usuarios.order_by('-is_superuser', 'id').first()
+        if usuario is None:
+            raise CommandError('No hay un usuario activo con el que navegar.')
+        return usuario
+
+    def _verificar(self, respuesta, url):
+        if respuesta.status_code != 200:
+            raise CommandError(f'{url} respondió {respuesta.status_code}')
+
+    def _medir_sync(self, cliente, url, repeticiones, sin_cache):
+        tiempos = []
+        for _ in range(repeticiones):
+            if sin_cache:
+                cache.clear()
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url)
+            tiempos.append(time.perf_counter() - inicio)
+            self._verificar(respuesta, url)
+        return tiempos
+
+    async def _medir_async(self, usuario, repeticiones, sin_cache):
+        cliente = AsyncClient()
+        await cliente.aforce_login(usuario)
+        resultados = {}
+        for nombre, _, vista in VISTAS:
+            url = reverse(vista)
+            tiempos = []
+            for _ in range(repeticiones):
+                if sin_cache:
+                    await cache.aclear()
+                inicio = time.perf_counter()
+                respuesta = await cliente.get(url)
+                tiempos.append(time.perf_counter() - inicio)
+                self._verificar(respuesta, url)
+            resultados[nombre] = tiempos
+        await cliente.alogout()
+        return resultados
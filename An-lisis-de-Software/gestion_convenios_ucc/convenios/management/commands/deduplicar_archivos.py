@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from convenios import almacenamiento
+
+
+def _tamano(bytes_):
+    return filesizeformat(bytes_).replace('\xa0', ' ')
+
+
+class Command(BaseCommand):
+    help = (
+        'Pasa los documentos de convenios e informes al almacenamiento deduplicado, recuenta '
+        'las referencias, elimina los contenidos que nadie usa e informa del espacio ahorrado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Sólo informa, sin mover ni borrar archivos')
+        parser.add_argument(
+            '--antiguedad', type=int, default=60,
+            help='Minutos que debe tener un contenido sin referencias para borrarlo (protege subidas en curso)',
+        )
+
+    def handle(self, *args, **options):
+        simular = options['simular']
+        migrados, bytes_migrados = almacenamiento.migrar_existentes(simular=simular)
+        corregidos = 0 if simular else almacenamiento.recontar_referencias()
+        limpieza = almacenamiento.eliminar_sin_referencias(
+            simular=simular, antes_de=timezone.now() - timedelta(minutes=options['antiguedad']),
+        )
+        reporte = almacenamiento.reporte()
+
+        prefijo = '(simulación) ' if simular else ''
+        self.stdout.write(f'{prefijo}archivos anteriores migrados: {migrados} ({_tamano(bytes_migrados)})')
+        self.stdout.write(f'{prefijo}referencias corregidas: {corregidos}')
+        self.stdout.write(
+            f'{prefijo}contenidos sin referencias eliminados: {limpieza.eliminados} '
+            f'({_tamano(limpieza.bytes_recuperados)} recuperados)'
+        )
+        porcentaje = reporte.bytes_ahorrados / reporte.bytes_logicos * 100 if reporte.bytes_logicos else 0
+        self.stdout.write(
+            f'{reporte.contenidos} contenidos distintos para {reporte.referencias} referencias: '
+            f'{_tamano(reporte.bytes_en_disco)} en disco en lugar de {_tamano(reporte.bytes_logicos)} '
+            f'({_tamano(reporte.bytes_ahorrados)} ahorrados, {porcentaje:.0f}%)'
+        )
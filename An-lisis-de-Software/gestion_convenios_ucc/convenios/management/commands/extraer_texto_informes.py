@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from convenios import extraccion, textos
+
+
+class Command(BaseCommand):
+    help = 'Extrae en paralelo el texto de los archivos de informes que cambiaron y reindexa sus convenios'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Procesos en paralelo (por defecto EXTRACCION_PROCESOS; 0 para no usar pool)',
+        )
+        parser.add_argument('--forzar', action='store_true', help='Vuelve a extraer también los que no cambiaron')
+        parser.add_argument('--lote', type=int, default=100, help='Textos guardados e indexados por lote')
+
+    def handle(self, *args, **options):
+        resultado = extraccion.extraer_pendientes(
+            trabajadores=options['workers'], forzar=options['forzar'], lote=options['lote'],
+        )
+        procesados = resultado.extraidos + resultado.sin_soporte + resultado.errores
+        duracion = max(resultado.duracion, 1e-6)
+        leidos = filesizeformat(resultado.bytes_leidos).replace('\xa0', ' ')
+        por_segundo = filesizeformat(resultado.bytes_leidos / duracion).replace('\xa0', ' ')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.extraidos} de {resultado.informes} informes extraídos, '
+            f'{resultado.sin_cambios} sin cambios, {resultado.sin_soporte} con formato no soportado'
+        ))
+        self.stdout.write(
+            f'{procesados} archivos ({leidos}) en {resultado.duracion:.2f} s: '
+            f'{procesados / duracion:.1f} archivos/s, {por_segundo}/s'
+        )
+        if resultado.errores:
+            self.stdout.write(self.style.WARNING(f'{resultado.errores} archivos no se pudieron procesar'))
+        if not textos.pdf_disponible():
+            self.stdout.write(self.style.WARNING('pypdf no está instalado: los PDF no se extraen'))
@@ -0,0 +1,43 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from convenios.importacion import (
+    COLUMNAS_OBLIGATORIAS, ERRORES_A_MOSTRAR, ErrorImportacion, importar_convenios,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa convenios desde un CSV con las columnas '
+        f'{", ".join(COLUMNAS_OBLIGATORIAS)} y opcionalmente estado, supervisor y descripcion'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV')
+        parser.add_argument('--lote', type=int, default=None, help='Filas insertadas por transacción')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificación del archivo')
+        parser.add_argument('--simular', action='store_true', help='Sólo valida, sin guardar')
+        parser.add_argument('--max-errores', type=int, default=ERRORES_A_MOSTRAR, help='Errores a mostrar (0 para todos)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], encoding=options['encoding'], newline='') as archivo:
+                resultado = importar_convenios(archivo, lote=options['lote'], simular=options['simular'])
+        except (OSError, UnicodeDecodeError, csv.Error, ErrorImportacion) as exc:
+            raise CommandError(str(exc))
+
+        errores = resultado.errores
+        if options['max_errores']:
+            errores = errores[:options['max_errores']]
+        for error in errores:
+            self.stderr.write(f'  línea {error.fila}: {error.mensaje}')
+        if len(errores) < resultado.con_error:
+            self.stderr.write(f'  ... y {resultado.con_error - len(errores)} errores más')
+
+        verbo = 'válidos' if options['simular'] else 'creados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creadas} convenios {verbo}, {resultado.con_error} filas con error de '
+            f'{resultado.procesadas} procesadas en {resultado.lotes} lotes '
+            f'({resultado.duracion:.2f} s, {resultado.filas_por_segundo:.0f} filas/s)'
+        ))
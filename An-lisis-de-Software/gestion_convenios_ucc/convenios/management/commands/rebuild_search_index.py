@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from convenios.busqueda import obtener_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de los convenios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Convenios indexados por lote')
+        parser.add_argument('--database', default=None, help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        backend = obtener_backend(options['database'])
+        inicio = time.perf_counter()
+        total = backend.reconstruir(lote=options['lote'])
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} convenios indexados con {type(backend).__name__} en {duracion:.2f} s'
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from convenios.sinteticos import ADMINISTRADOR, ErrorSiembra, generar
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos reproducibles (supervisores, convenios, informes, notificaciones y '
+        'evaluaciones) con bulk_create para medir las vistas a escala de producción. Usar sobre una base vacía'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convenios', type=int, default=100_000)
+        parser.add_argument('--supervisores', type=int, default=500)
+        parser.add_argument('--informes', type=int, default=1_000_000)
+        parser.add_argument('--notificaciones', type=int, default=None, help='Por defecto, un décimo de los informes')
+        parser.add_argument('--evaluaciones', type=int, default=None, help='Por defecto, 20 por supervisor')
+        parser.add_argument('--semilla', type=int, default=42, help='La misma semilla genera los mismos datos')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas insertadas por transacción')
+        parser.add_argument(
+            '--sobre-datos-existentes', action='store_true',
+            help='Añade los datos aunque la base ya tenga usuarios o convenios (nunca en producción)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resultado = generar(
+                convenios=options['convenios'],
+                supervisores=options['supervisores'],
+                informes=options['informes'],
+                notificaciones=options['notificaciones'],
+                evaluaciones=options['evaluaciones'],
+                semilla=options['semilla'],
+                lote=options['lote'],
+                sobre_datos_existentes=options['sobre_datos_existentes'],
+            )
+        except ErrorSiembra as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.convenios} convenios, {resultado.informes} informes, {resultado.supervisores} supervisores '
+            f'({resultado.asignaciones} asignaciones), {resultado.notificaciones} notificaciones y '
+            f'{resultado.evaluaciones} evaluaciones creados en {resultado.duracion:.1f} s'
+        ))
+        self.stdout.write(f'Usuario para benchmark_vistas: {ADMINISTRADOR} (sin contraseña, entra con force_login)')
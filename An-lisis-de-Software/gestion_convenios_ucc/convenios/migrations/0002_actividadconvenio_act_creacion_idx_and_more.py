@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actividadconvenio',
+            index=models.Index(fields=['-fecha_creacion'], name='act_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actividadconvenio',
+            index=models.Index(fields=['convenio', '-fecha_creacion'], name='act_convenio_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='conv_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(fields=['estado', '-fecha_creacion', '-id'], name='conv_estado_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(fields=['tipo', '-fecha_creacion', '-id'], name='conv_tipo_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(fields=['fecha_inicio'], name='conv_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(fields=['fecha_vencimiento'], name='conv_vencimiento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='conv_estado_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='informe',
+            index=models.Index(fields=['supervisor', 'estado'], name='inf_supervisor_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='informe',
+            index=models.Index(fields=['convenio', '-fecha_creacion'], name='inf_convenio_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='informe',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['-fecha_creacion'], name='inf_pendientes_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE convenios_busqueda USING fts5("
+            "empresa_entidad, descripcion, supervisores, informes, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE convenios_busqueda ('
+            'convenio_id bigint PRIMARY KEY REFERENCES convenios_convenio (id) ON DELETE CASCADE '
+            'DEFERRABLE INITIALLY DEFERRED, '
+            'documento tsvector NOT NULL)'
+        )
+        schema_editor.execute('CREATE INDEX convenios_busqueda_gin ON convenios_busqueda USING GIN (documento)')
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS convenios_busqueda')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0002_actividadconvenio_act_creacion_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
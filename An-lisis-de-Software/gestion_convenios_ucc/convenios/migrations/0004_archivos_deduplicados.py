@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+import convenios.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0003_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='convenio',
+            name='archivo_convenio',
+            field=models.FileField(blank=True, null=True, storage=convenios.almacenamiento.almacenamiento_documentos, upload_to='convenios/', verbose_name='Archivo del Convenio'),
+        ),
+        migrations.AlterField(
+            model_name='informe',
+            name='archivo_informe',
+            field=models.FileField(storage=convenios.almacenamiento.almacenamiento_documentos, upload_to='informes/', verbose_name='Archivo del Informe'),
+        ),
+        migrations.CreateModel(
+            name='ArchivoAlmacenado',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256')),
+                ('nombre', models.CharField(max_length=255, unique=True, verbose_name='Ruta en el Almacenamiento')),
+                ('tamano', models.BigIntegerField(verbose_name='Tamaño (bytes)')),
+                ('referencias', models.PositiveIntegerField(default=0, verbose_name='Referencias')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+            ],
+            options={
+                'verbose_name': 'Archivo Almacenado',
+                'verbose_name_plural': 'Archivos Almacenados',
+                'indexes': [models.Index(condition=models.Q(('referencias', 0)), fields=['fecha_creacion'], name='archivo_sin_referencias_idx')],
+            },
+        ),
+    ]
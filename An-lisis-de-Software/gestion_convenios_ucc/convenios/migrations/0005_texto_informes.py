@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0004_archivos_deduplicados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextoInforme',
+            fields=[
+                ('informe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='texto_extraido', serialize=False, to='convenios.informe', verbose_name='Informe')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('estado', models.CharField(choices=[('extraido', 'Extraído'), ('sin_soporte', 'Formato no Soportado'), ('error', 'Error')], max_length=20, verbose_name='Estado')),
+                ('texto', models.TextField(blank=True, verbose_name='Texto')),
+                ('error', models.CharField(blank=True, max_length=500, verbose_name='Error')),
+                ('fecha_extraccion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Extracción')),
+            ],
+            options={
+                'verbose_name': 'Texto de Informe',
+                'verbose_name_plural': 'Textos de Informes',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:23
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0005_texto_informes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='convenio',
+            index=models.Index(django.db.models.functions.text.Lower('empresa_entidad'), models.F('id'), name='conv_empresa_prefijo_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:47
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def usar_fecha_creacion(apps, schema_editor):
+    ArchivoAlmacenado = apps.get_model('convenios', 'ArchivoAlmacenado')
+    ArchivoAlmacenado.objects.using(schema_editor.connection.alias).update(ultimo_uso=F('fecha_creacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0006_conv_empresa_prefijo_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivoalmacenado',
+            name='archivo_sin_referencias_idx',
+        ),
+        migrations.AddField(
+            model_name='archivoalmacenado',
+            name='ultimo_uso',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Último Uso'),
+        ),
+        migrations.RunPython(usar_fecha_creacion, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivoalmacenado',
+            index=models.Index(condition=models.Q(('referencias', 0)), fields=['ultimo_uso'], name='archivo_sin_referencias_idx'),
+        ),
+    ]
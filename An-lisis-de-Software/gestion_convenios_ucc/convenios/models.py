@@ -1,7 +1,15 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .almacenamiento import almacenamiento_documentos
+
+
+# Días antes del vencimiento en los que un convenio se considera "por vencer"
+DIAS_AVISO_VENCIMIENTO = 60
+
 
 class Convenio(models.Model):
     TIPO_CHOICES = [
@@ -28,7 +36,7 @@ class Convenio(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='activo', verbose_name="Estado")
     supervisor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Supervisor")
     descripcion = models.TextField(blank=True, verbose_name="Descripción")
-    archivo_convenio = models.FileField(upload_to='convenios/', blank=True, null=True, verbose_name="Archivo del Convenio")
+    archivo_convenio = models.FileField(upload_to='convenios/', storage=almacenamiento_documentos, blank=True, null=True, verbose_name="Archivo del Convenio")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
     
@@ -36,6 +44,18 @@ class Convenio(models.Model):
         verbose_name = "Convenio"
         verbose_name_plural = "Convenios"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Listado paginado por cursor, con y sin filtros de estado/tipo
+            models.Index(fields=['-fecha_creacion', '-id'], name='conv_creacion_idx'),
+            models.Index(fields=['estado', '-fecha_creacion', '-id'], name='conv_estado_creacion_idx'),
+            models.Index(fields=['tipo', '-fecha_creacion', '-id'], name='conv_tipo_creacion_idx'),
+            # Filtros por rango de fechas y vencimientos
+            models.Index(fields=['fecha_inicio'], name='conv_inicio_idx'),
+            models.Index(fields=['fecha_vencimiento'], name='conv_vencimiento_idx'),
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='conv_estado_venc_idx'),
+            # Autocompletado por prefijo de la empresa/entidad, paginado por (nombre, id)
+            models.Index(Lower('empresa_entidad'), F('id'), name='conv_empresa_prefijo_idx'),
+        ]
     
     def __str__(self):
         return f"{self.empresa_entidad} - {self.get_tipo_display()}"
@@ -50,7 +70,7 @@ class Convenio(models.Model):
     @property
     def esta_por_vencer(self):
         """Verifica si el convenio está por vencer (menos de 60 días)"""
-        return 0 <= self.dias_para_vencer <= 60
+        return 0 <= self.dias_para_vencer <= DIAS_AVISO_VENCIMIENTO
     
     @property
     def esta_vencido(self):
@@ -69,7 +89,7 @@ class Informe(models.Model):
     supervisor = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Supervisor")
     titulo = models.CharField(max_length=200, verbose_name="Título del Informe")
     descripcion = models.TextField(blank=True, verbose_name="Descripción")
-    archivo_informe = models.FileField(upload_to='informes/', verbose_name="Archivo del Informe")
+    archivo_informe = models.FileField(upload_to='informes/', storage=almacenamiento_documentos, verbose_name="Archivo del Informe")
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
     fecha_entrega = models.DateField(verbose_name="Fecha de Entrega")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
@@ -80,6 +100,15 @@ class Informe(models.Model):
         verbose_name = "Informe"
         verbose_name_plural = "Informes"
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['supervisor', 'estado'], name='inf_supervisor_estado_idx'),
+            models.Index(fields=['convenio', '-fecha_creacion'], name='inf_convenio_creacion_idx'),
+            models.Index(
+                fields=['-fecha_creacion'],
+                condition=models.Q(estado='pendiente'),
+                name='inf_pendientes_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.titulo} - {self.convenio.empresa_entidad}"
@@ -99,6 +128,55 @@ class ActividadConvenio(models.Model):
         verbose_name = "Actividad de Convenio"
         verbose_name_plural = "Actividades de Convenios"
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['-fecha_creacion'], name='act_creacion_idx'),
+            models.Index(fields=['convenio', '-fecha_creacion'], name='act_convenio_creacion_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.titulo} - {self.convenio.empresa_entidad}"
+
+class ArchivoAlmacenado(models.Model):
+    """Contenido único guardado por ``AlmacenamientoDeduplicado``, con sus referencias"""
+    sha256 = models.CharField(max_length=64, primary_key=True, verbose_name="SHA-256")
+    nombre = models.CharField(max_length=255, unique=True, verbose_name="Ruta en el Almacenamiento")
+    tamano = models.BigIntegerField(verbose_name="Tamaño (bytes)")
+    referencias = models.PositiveIntegerField(default=0, verbose_name="Referencias")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    # Cada subida del contenido lo renueva; la recolección respeta un margen desde aquí
+    ultimo_uso = models.DateTimeField(default=timezone.now, verbose_name="Último Uso")
+    
+    class Meta:
+        verbose_name = "Archivo Almacenado"
+        verbose_name_plural = "Archivos Almacenados"
+        indexes = [
+            # Candidatos a recolección de basura
+            models.Index(fields=['ultimo_uso'], condition=models.Q(referencias=0), name='archivo_sin_referencias_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.referencias} referencias)"
+
+
+class TextoInforme(models.Model):
+    """Texto extraído del archivo de un informe, en su propia tabla para que los listados nunca lo lean"""
+    ESTADO_CHOICES = [
+        ('extraido', 'Extraído'),
+        ('sin_soporte', 'Formato no Soportado'),
+        ('error', 'Error'),
+    ]
+    
+    informe = models.OneToOneField(Informe, on_delete=models.CASCADE, primary_key=True, related_name='texto_extraido', verbose_name="Informe")
+    # Contenido del que se extrajo: si el archivo no cambia no se vuelve a extraer
+    sha256 = models.CharField(max_length=64, verbose_name="SHA-256")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, verbose_name="Estado")
+    texto = models.TextField(blank=True, verbose_name="Texto")
+    error = models.CharField(max_length=500, blank=True, verbose_name="Error")
+    fecha_extraccion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Extracción")
+    
+    class Meta:
+        verbose_name = "Texto de Informe"
+        verbose_name_plural = "Textos de Informes"
     
     def __str__(self):
-        return f"{self.titulo} - {self.convenio.empresa_entidad}"
\ No newline at end of file
+        return f"Texto del informe {self.informe_id} ({self.get_estado_display()})"
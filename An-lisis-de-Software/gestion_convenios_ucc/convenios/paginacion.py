@@ -0,0 +1,175 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de ``OFFSET`` el cursor guarda los valores de ordenamiento de la
+última fila mostrada y la página siguiente se obtiene con una condición
+``WHERE (campo1, campo2) < (v1, v2)``, de modo que la página 500 cuesta lo
+mismo que la primera. El resto de parámetros GET (filtros de estado, tipo,
+fechas o búsqueda) se conservan tal cual en los enlaces de navegación.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+PARAMETRO_CURSOR = 'cursor'
+PARAMETRO_TAMANO = 'tamano'
+
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class PaginaCursor:
+    """Una página de resultados con los cursores para avanzar y retroceder"""
+
+    def __init__(self, objetos, tamano, parametros, cursor_siguiente=None, cursor_anterior=None):
+        self.objetos = objetos
+        self.tamano = tamano
+        self.parametros = parametros
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    def _url(self, cursor):
+        parametros = self.parametros.copy()
+        parametros[PARAMETRO_CURSOR] = cursor
+        return f'?{parametros.urlencode()}'
+
+    @property
+    def url_siguiente(self):
+        return self._url(self.cursor_siguiente) if self.cursor_siguiente else None
+
+    @property
+    def url_anterior(self):
+        return self._url(self.cursor_anterior) if self.cursor_anterior else None
+
+
+def _serializar(valor):
+    # isoformat conserva los microsegundos, necesarios para comparar con exactitud
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def codificar_cursor(valores, direccion=SIGUIENTE):
+    datos = json.dumps({'v': [_serializar(valor) for valor in valores], 'd': direccion}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def leer_cursor(cursor, cantidad):
+    """Devuelve ``(valores, direccion)`` sin convertir o lanza ``CursorInvalido``"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        valores, direccion = datos['v'], datos['d']
+    except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+        raise CursorInvalido(cursor) from exc
+    if direccion not in (SIGUIENTE, ANTERIOR) or not isinstance(valores, list) or len(valores) != cantidad:
+        raise CursorInvalido(cursor)
+    return valores, direccion
+
+
+def decodificar_cursor(cursor, modelo, campos):
+    """Devuelve ``(valores, direccion)`` o lanza ``CursorInvalido``"""
+    valores, direccion = leer_cursor(cursor, len(campos))
+    try:
+        valores = [
+            modelo._meta.get_field(nombre).to_python(valor)
+            for (nombre, _), valor in zip(campos, valores)
+        ]
+    except (ValueError, TypeError, FieldDoesNotExist, ValidationError) as exc:
+        raise CursorInvalido(cursor) from exc
+    return valores, direccion
+
+
+def condicion_posterior(campos, valores, invertir):
+    """Construye la condición de búsqueda para las filas que siguen al cursor"""
+    condicion = Q()
+    iguales = Q()
+    for (nombre, descendente), valor in zip(campos, valores):
+        hacia_menores = descendente != invertir
+        lookup = f'{nombre}__lt' if hacia_menores else f'{nombre}__gt'
+        condicion |= iguales & Q(**{lookup: valor})
+        iguales &= Q(**{nombre: valor})
+    return condicion
+
+
+def tamano_pagina(request, por_defecto=None):
+    """Tamaño de página pedido por GET, acotado por la configuración"""
+    maximo = getattr(settings, 'PAGINACION_TAMANO_MAXIMO', 100)
+    tamano = por_defecto or getattr(settings, 'PAGINACION_TAMANO_PAGINA', 25)
+    try:
+        tamano = int(request.GET.get(PARAMETRO_TAMANO, tamano))
+    except (TypeError, ValueError):
+        pass
+    return max(1, min(tamano, maximo))
+
+
+def paginar_por_cursor(queryset, request, orden, tamano=None):
+    """
+    Pagina ``queryset`` según ``orden`` (p. ej. ``('-fecha_creacion', '-id')``).
+
+    El último campo de ``orden`` debe ser único para que el orden sea total.
+    Un cursor inválido o manipulado se ignora y se devuelve la primera página.
+    """
+    tamano = tamano_pagina(request, tamano)
+    campos = [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+
+    parametros = request.GET.copy()
+    parametros.pop(PARAMETRO_CURSOR, None)
+
+    valores, direccion = None, SIGUIENTE
+    cursor = request.GET.get(PARAMETRO_CURSOR)
+    if cursor:
+        try:
+            valores, direccion = decodificar_cursor(cursor, queryset.model, campos)
+        except CursorInvalido:
+            valores, direccion = None, SIGUIENTE
+
+    invertir = direccion == ANTERIOR
+    if invertir:
+        queryset = queryset.order_by(*(nombre if descendente else f'-{nombre}' for nombre, descendente in campos))
+    else:
+        queryset = queryset.order_by(*orden)
+
+    if valores is not None:
+        queryset = queryset.filter(condicion_posterior(campos, valores, invertir))
+
+    objetos = list(queryset[:tamano + 1])
+    hay_mas = len(objetos) > tamano
+    objetos = objetos[:tamano]
+    if invertir:
+        objetos.reverse()
+
+    def cursor_de(objeto, sentido):
+        return codificar_cursor([getattr(objeto, nombre) for nombre, _ in campos], sentido)
+
+    cursor_siguiente = cursor_anterior = None
+    if objetos:
+        if hay_mas or invertir:
+            cursor_siguiente = cursor_de(objetos[-1], SIGUIENTE)
+        if (hay_mas and invertir) or (valores is not None and not invertir):
+            cursor_anterior = cursor_de(objetos[0], ANTERIOR)
+
+    return PaginaCursor(objetos, tamano, parametros, cursor_siguiente, cursor_anterior)
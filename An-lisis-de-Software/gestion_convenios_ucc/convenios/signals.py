@@ -0,0 +1,133 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import almacenamiento, contadores, extraccion
+from .busqueda import obtener_backend
+from .models import Convenio, Informe
+
+
+def _invalidar_al_confirmar(*grupos):
+    """Invalida los contadores cuando la transacción en curso se confirma"""
+    transaction.on_commit(partial(contadores.invalidar, *grupos))
+
+
+# Los cambios con ``list_editable`` del admin pasan por ``save_model`` y los
+# borrados masivos por ``QuerySet.delete``: ambos disparan estas señales.
+
+@receiver([post_save, post_delete], sender=Convenio)
+def invalidar_contadores_convenios(sender, **kwargs):
+    _invalidar_al_confirmar('convenios')
+
+
+@receiver([post_save, post_delete], sender=Informe)
+def invalidar_contadores_informes(sender, **kwargs):
+    _invalidar_al_confirmar('informes')
+
+
+@receiver([post_save, post_delete], sender='supervisores.Supervisor')
+def invalidar_contadores_supervisores(sender, **kwargs):
+    _invalidar_al_confirmar('supervisores')
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender='usuarios.PerfilUsuario')
+def invalidar_contadores_usuarios(sender, update_fields=None, **kwargs):
+    # ``update_last_login`` guarda el usuario en cada inicio de sesión
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    _invalidar_al_confirmar('usuarios')
+
+
+# Índice de búsqueda: se actualiza en la misma transacción que el cambio
+
+@receiver(post_save, sender=Convenio)
+def indexar_convenio(sender, instance, **kwargs):
+    obtener_backend().indexar([instance.pk])
+
+
+@receiver(post_delete, sender=Convenio)
+def desindexar_convenio(sender, instance, **kwargs):
+    obtener_backend().eliminar([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Informe)
+def indexar_convenio_del_informe(sender, instance, **kwargs):
+    obtener_backend().indexar([instance.convenio_id])
+
+
+@receiver(post_save, sender=User)
+def indexar_convenios_del_usuario(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    convenio_ids = Convenio.objects.filter(
+        Q(supervisor=instance) | Q(supervisores_asignados__user=instance)
+    ).values_list('id', flat=True).distinct()
+    obtener_backend().indexar(list(convenio_ids))
+
+
+@receiver(m2m_changed, sender='supervisores.Supervisor_convenios_asignados')
+def indexar_convenios_asignados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._convenios_antes_de_vaciar = list(instance.convenios_asignados.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        convenio_ids = [instance.pk]
+    elif action == 'post_clear':
+        convenio_ids = getattr(instance, '_convenios_antes_de_vaciar', [])
+    else:
+        convenio_ids = pk_set or []
+    obtener_backend().indexar(convenio_ids)
+
+
+# Referencias a los documentos deduplicados (ver convenios/almacenamiento.py).
+# El borrado en cascada de los informes al eliminar un convenio también emite
+# post_delete por cada informe.
+
+CAMPOS_DOCUMENTO = {Convenio: 'archivo_convenio', Informe: 'archivo_informe'}
+
+
+@receiver(pre_save, sender=Convenio)
+@receiver(pre_save, sender=Informe)
+def recordar_documento(sender, instance, raw=False, update_fields=None, **kwargs):
+    campo = CAMPOS_DOCUMENTO[sender]
+    instance._documento_anterior = None
+    if raw or instance._state.adding or (update_fields is not None and campo not in update_fields):
+        return
+    instance._documento_anterior = sender.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+
+
+@receiver(post_save, sender=Convenio)
+@receiver(post_save, sender=Informe)
+def contar_documento(sender, instance, raw=False, update_fields=None, **kwargs):
+    campo = CAMPOS_DOCUMENTO[sender]
+    if raw or (update_fields is not None and campo not in update_fields):
+        return
+    actual = getattr(instance, campo).name or None
+    anterior = getattr(instance, '_documento_anterior', None) or None
+    if actual != anterior:
+        almacenamiento.sumar_referencia(actual)
+        almacenamiento.restar_referencia(anterior)
+
+
+@receiver(post_delete, sender=Convenio)
+@receiver(post_delete, sender=Informe)
+def descontar_documento(sender, instance, **kwargs):
+    almacenamiento.restar_referencia(getattr(instance, CAMPOS_DOCUMENTO[sender]).name)
+
+
+# Texto de los archivos de informes para la búsqueda (ver convenios/extraccion.py)
+
+@receiver(post_save, sender=Informe)
+def extraer_texto_informe(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'archivo_informe' not in update_fields):
+        return
+    nombre = instance.archivo_informe.name
+    if nombre and nombre != getattr(instance, '_documento_anterior', None):
+        transaction.on_commit(partial(extraccion.programar, instance.pk, nombre))
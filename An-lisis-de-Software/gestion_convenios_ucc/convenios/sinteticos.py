@@ -0,0 +1,274 @@
+"""
+Datos sintéticos a escala de producción para medir las vistas.
+
+``generar`` crea supervisores (con su usuario y perfil), convenios con sus
+asignaciones, informes, notificaciones y evaluaciones con ``bulk_create`` por
+lotes, sin guardar más de un lote en memoria. Todo sale de un
+``random.Random(semilla)``: con la misma semilla sobre una base vacía se
+obtienen los mismos datos. Los usuarios se llaman ``bench_*`` y no tienen
+contraseña utilizable: ``benchmark_vistas`` entra con ``force_login``. Para no
+mezclar los datos sintéticos con los reales, ``generar`` se niega a trabajar
+sobre una base con usuarios o convenios salvo que se pida expresamente.
+
+Las distribuciones imitan las reales: la mayoría de convenios vigentes, los
+vencidos y por vencer según sus fechas, y unos pocos convenios con muchos
+informes. Las fechas de creación son las de la carga (``auto_now_add``).
+
+Como ``bulk_create`` no emite señales, al terminar se reconstruyen el índice
+de búsqueda, los contadores de notificaciones no leídas y el ranking de
+supervisores, y se invalidan los contadores del dashboard.
+"""
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from supervisores import ranking
+from supervisores.models import EvaluacionSupervisor, Supervisor
+from usuarios.models import Notificacion, PerfilUsuario
+from usuarios.notificaciones import recalcular_no_leidas
+
+from . import contadores
+from .busqueda import obtener_backend
+from .models import Convenio, Informe
+
+PREFIJO_USUARIO = 'bench_'
+ADMINISTRADOR = f'{PREFIJO_USUARIO}admin'
+
+FORMAS = ('Industrias', 'Grupo', 'Fundación', 'Corporación', 'Hospital', 'Alcaldía de', 'Colegio', 'Cooperativa')
+NUCLEOS = (
+    'Andina', 'del Pacífico', 'Bancolombia', 'Ecopetrol', 'Nutresa', 'Antioquia', 'Bogotá', 'Caribe',
+    'Santander', 'del Valle', 'Boyacá', 'Tolima', 'Huila', 'Nariño', 'Cafetera', 'Llanera',
+)
+SECTORES = ('Salud', 'Energía', 'Tecnología', 'Educación', 'Agroindustria', 'Logística', 'Finanzas', 'Gobierno')
+ESPECIALIDADES = ('Ingeniería de Sistemas', 'Derecho', 'Psicología', 'Administración', 'Medicina', 'Contaduría')
+NOMBRES = ('Ana', 'Carlos', 'María', 'Juan', 'Laura', 'Andrés', 'Camila', 'Felipe', 'Valentina', 'Santiago')
+APELLIDOS = ('Gómez', 'Rodríguez', 'Martínez', 'López', 'García', 'Restrepo', 'Quintero', 'Ospina', 'Vargas')
+
+ESTADOS_VIGENTES = (('activo', 70), ('revision', 8), ('juridico', 6), ('firma', 6), ('aprobado', 6), ('rechazado', 4))
+ESTADOS_INFORME = (('aprobado', 70), ('pendiente', 20), ('rechazado', 10))
+TIPOS_CONVENIO = (('practicas', 55), ('marco', 30), ('bienestar', 15))
+TIPOS_NOTIFICACION = (
+    ('convenio_vencimiento', 40), ('informe_pendiente', 35), ('actividad_asignada', 15), ('sistema', 10),
+)
+ESTADOS_SUPERVISOR = (('activo', 85), ('inactivo', 10), ('suspendido', 5))
+
+INICIO_DATOS = date(2018, 1, 1)
+DIAS_POR_VENCER = 30
+
+
+@dataclass
+class ResultadoSiembra:
+    usuarios: int = 0
+    supervisores: int = 0
+    convenios: int = 0
+    asignaciones: int = 0
+    informes: int = 0
+    notificaciones: int = 0
+    evaluaciones: int = 0
+    duracion: float = 0.0
+
+
+class ErrorSiembra(ValueError):
+    pass
+
+
+def _elegir(rng, opciones):
+    valores, pesos = zip(*opciones)
+    return rng.choices(valores, pesos)[0]
+
+
+def _fecha(rng, desde, hasta):
+    return desde + timedelta(days=rng.randint(0, max(0, (hasta - desde).days)))
+
+
+def _sesgado(rng, cantidad):
+    # Índice con más probabilidad en los primeros: pocos convenios concentran muchos informes
+    return min(cantidad - 1, int(cantidad * rng.random() ** 2))
+
+
+def _por_lotes(filas, lote):
+    pendientes = []
+    for fila in filas:
+        pendientes.append(fila)
+        if len(pendientes) >= lote:
+            yield pendientes
+            pendientes = []
+    if pendientes:
+        yield pendientes
+
+
+def _insertar(modelo, filas, lote, **opciones):
+    """Inserta ``filas`` por lotes y devuelve los ids creados en orden"""
+    ids = []
+    for pendientes in _por_lotes(filas, lote):
+        with transaction.atomic():
+            creados = modelo.objects.bulk_create(pendientes, **opciones)
+        ids.extend(objeto.pk for objeto in creados)
+    return ids
+
+
+def _usuarios(rng, cantidad, contrasena):
+    yield User(
+        username=ADMINISTRADOR, password=contrasena, first_name='Administración', last_name='Benchmark',
+        is_staff=True, is_superuser=True,
+    )
+    for numero in range(1, cantidad + 1):
+        yield User(
+            username=f'{PREFIJO_USUARIO}sup{numero:05d}', password=contrasena,
+            first_name=rng.choice(NOMBRES), last_name=rng.choice(APELLIDOS),
+            email=f'sup{numero:05d}@benchmark.test',
+        )
+
+
+def _convenios(rng, cantidad, supervisores_usuario, hoy):
+    for _ in range(cantidad):
+        inicio = _fecha(rng, INICIO_DATOS, hoy + timedelta(days=180))
+        vencimiento = inicio + timedelta(days=rng.randint(365, 5 * 365))
+        if vencimiento < hoy:
+            estado = 'vencido'
+        elif vencimiento <= hoy + timedelta(days=DIAS_POR_VENCER):
+            estado = 'por_vencer'
+        else:
+            estado = _elegir(rng, ESTADOS_VIGENTES)
+        sector = rng.choice(SECTORES)
+        yield Convenio(
+            empresa_entidad=f'{rng.choice(FORMAS)} {rng.choice(NUCLEOS)} {sector}',
+            tipo=_elegir(rng, TIPOS_CONVENIO),
+            fecha_inicio=inicio,
+            fecha_vencimiento=vencimiento,
+            estado=estado,
+            supervisor_id=rng.choice(supervisores_usuario) if rng.random() < 0.9 else None,
+            descripcion=f'Convenio de cooperación en {sector.lower()} para prácticas y proyectos conjuntos.',
+        )
+
+
+def generar(convenios=100_000, supervisores=500, informes=1_000_000, notificaciones=None, evaluaciones=None,
+            semilla=42, lote=5000, sobre_datos_existentes=False):
+    """
+    Crea los datos sintéticos; ``notificaciones`` y ``evaluaciones`` se
+    calculan a partir de los informes y supervisores si no se indican.
+    """
+    if supervisores < 1 or convenios < 1:
+        raise ErrorSiembra('Se necesita al menos un supervisor y un convenio.')
+    if User.objects.filter(username__startswith=PREFIJO_USUARIO).exists():
+        raise ErrorSiembra(f'Ya hay usuarios {PREFIJO_USUARIO}*: genere los datos sobre una base vacía.')
+    if not sobre_datos_existentes and (User.objects.exists() or Convenio.objects.exists()):
+        raise ErrorSiembra(
+            'La base ya tiene usuarios o convenios: genere los datos sobre una base vacía '
+            'o confirme que quiere añadirlos a estos.'
+        )
+    notificaciones = informes // 10 if notificaciones is None else notificaciones
+    evaluaciones = supervisores * 20 if evaluaciones is None else evaluaciones
+
+    inicio = time.perf_counter()
+    rng = random.Random(semilla)
+    hoy = timezone.localdate()
+    resultado = ResultadoSiembra()
+
+    usuario_ids = _insertar(User, _usuarios(rng, supervisores, make_password(None)), lote)
+    administrador_id, supervisores_usuario = usuario_ids[0], usuario_ids[1:]
+    resultado.usuarios = len(usuario_ids)
+    _insertar(PerfilUsuario, (
+        PerfilUsuario(user_id=usuario_id, rol='admin' if usuario_id == administrador_id else 'supervisor')
+        for usuario_id in usuario_ids
+    ), lote)
+
+    supervisor_ids = _insertar(Supervisor, (
+        Supervisor(
+            user_id=usuario_id,
+            codigo_supervisor=f'BENCH-{numero:05d}',
+            especialidad=rng.choice(ESPECIALIDADES),
+            experiencia_anos=rng.randint(0, 30),
+            estado=_elegir(rng, ESTADOS_SUPERVISOR),
+            fecha_ingreso=_fecha(rng, date(2005, 1, 1), hoy),
+        )
+        for numero, usuario_id in enumerate(supervisores_usuario, start=1)
+    ), lote)
+    resultado.supervisores = len(supervisor_ids)
+    supervisor_de_usuario = dict(zip(supervisores_usuario, supervisor_ids))
+
+    # Sólo lo necesario para elegir al azar: (id, usuario supervisor) de cada convenio
+    convenio_ids, convenio_supervisores = [], []
+    for pendientes in _por_lotes(_convenios(rng, convenios, supervisores_usuario, hoy), lote):
+        with transaction.atomic():
+            creados = Convenio.objects.bulk_create(pendientes)
+        convenio_ids.extend(convenio.pk for convenio in creados)
+        convenio_supervisores.extend(convenio.supervisor_id for convenio in creados)
+    resultado.convenios = len(convenio_ids)
+
+    def asignaciones():
+        Asignacion = Supervisor.convenios_asignados.through
+        for convenio_id, usuario_id in zip(convenio_ids, convenio_supervisores):
+            asignados = {supervisor_de_usuario[usuario_id]} if usuario_id else set()
+            if rng.random() < 0.2:
+                asignados.add(rng.choice(supervisor_ids))
+            for supervisor_id in sorted(asignados):
+                yield Asignacion(supervisor_id=supervisor_id, convenio_id=convenio_id)
+
+    resultado.asignaciones = len(_insertar(
+        Supervisor.convenios_asignados.through, asignaciones(), lote, ignore_conflicts=True,
+    ))
+
+    def filas_informes():
+        for numero in range(informes):
+            indice = _sesgado(rng, len(convenio_ids))
+            entrega = _fecha(rng, INICIO_DATOS, hoy)
+            yield Informe(
+                convenio_id=convenio_ids[indice],
+                supervisor_id=convenio_supervisores[indice] or rng.choice(supervisores_usuario),
+                titulo=f'Informe de seguimiento {entrega:%m/%Y} #{numero + 1}',
+                descripcion='Avance de las actividades del periodo y compromisos del siguiente.',
+                estado=_elegir(rng, ESTADOS_INFORME),
+                fecha_entrega=entrega,
+            )
+
+    resultado.informes = len(_insertar(Informe, filas_informes(), lote))
+
+    ahora = timezone.now()
+
+    def filas_notificaciones():
+        for _ in range(notificaciones):
+            leida = rng.random() < 0.7
+            # También al administrador, para que benchmark_vistas mida las rutas de notificaciones
+            yield Notificacion(
+                usuario_id=rng.choice(usuario_ids),
+                titulo='Aviso de convenios',
+                mensaje='Revise el estado de sus convenios e informes pendientes.',
+                tipo=_elegir(rng, TIPOS_NOTIFICACION),
+                leida=leida,
+                fecha_lectura=ahora if leida else None,
+                convenio_id=rng.choice(convenio_ids),
+            )
+
+    resultado.notificaciones = len(_insertar(Notificacion, filas_notificaciones(), lote))
+
+    def puntaje():
+        return max(1, min(10, round(rng.gauss(7.5, 1.5))))
+
+    def filas_evaluaciones():
+        for _ in range(evaluaciones):
+            yield EvaluacionSupervisor(
+                supervisor_id=rng.choice(supervisor_ids),
+                evaluador_id=administrador_id,
+                convenio_id=rng.choice(convenio_ids),
+                calificacion_general=puntaje(),
+                puntualidad=puntaje(),
+                calidad_informes=puntaje(),
+                comunicacion=puntaje(),
+            )
+
+    resultado.evaluaciones = len(_insertar(EvaluacionSupervisor, filas_evaluaciones(), lote))
+
+    obtener_backend().reconstruir(lote=lote)
+    recalcular_no_leidas(usuario_ids)
+    ranking.reconstruir(lote=lote)
+    contadores.invalidar()
+
+    resultado.duracion = time.perf_counter() - inicio
+    return resultado
@@ -0,0 +1,119 @@
+"""
+Servicio de estadísticas para las tarjetas del dashboard y de los listados.
+
+Cada función resuelve todos los contadores de una tabla con una sola consulta
+de agregación condicional (``Count(..., filter=Q(...))``) y devuelve un objeto
+tipado, de modo que una vista cuesta una consulta por tabla y no una por
+contador.
+"""
+from dataclasses import dataclass, field
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+
+from .models import Convenio, Informe
+from supervisores.models import Supervisor
+
+
+@dataclass(frozen=True)
+class EstadisticasConvenios:
+    total: int = 0
+    activos: int = 0
+    por_vencer: int = 0
+    vencidos: int = 0
+    distribucion_tipos: list = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class EstadisticasInformes:
+    total: int = 0
+    pendientes: int = 0
+    aprobados: int = 0
+
+
+@dataclass(frozen=True)
+class EstadisticasSupervisores:
+    activos: int = 0
+
+
+@dataclass(frozen=True)
+class EstadisticasUsuarios:
+    total: int = 0
+    supervisores_activos: int = 0
+    estudiantes: int = 0
+    cuentas_inactivas: int = 0
+
+
+@dataclass(frozen=True)
+class EstadisticasDashboard:
+    convenios: EstadisticasConvenios
+    informes: EstadisticasInformes
+    supervisores: EstadisticasSupervisores
+
+
+def estadisticas_convenios():
+    """Cuenta los convenios por estado y por tipo en una sola consulta"""
+    conteos_tipo = {
+        f'tipo_{tipo}': Count('id', filter=Q(tipo=tipo))
+        for tipo, _ in Convenio.TIPO_CHOICES
+    }
+    resultado = Convenio.objects.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=Q(estado='activo')),
+        por_vencer=Count('id', filter=Q(estado='por_vencer')),
+        vencidos=Count('id', filter=Q(estado='vencido')),
+        **conteos_tipo,
+    )
+
+    # Misma forma que ``values('tipo').annotate(total=Count('id'))``
+    distribucion_tipos = [
+        {'tipo': tipo, 'total': resultado[f'tipo_{tipo}']}
+        for tipo, _ in Convenio.TIPO_CHOICES
+        if resultado[f'tipo_{tipo}']
+    ]
+
+    return EstadisticasConvenios(
+        total=resultado['total'],
+        activos=resultado['activos'],
+        por_vencer=resultado['por_vencer'],
+        vencidos=resultado['vencidos'],
+        distribucion_tipos=distribucion_tipos,
+    )
+
+
+def estadisticas_informes():
+    """Cuenta los informes totales, pendientes y aprobados en una sola consulta"""
+    resultado = Informe.objects.aggregate(
+        total=Count('id'),
+        pendientes=Count('id', filter=Q(estado='pendiente')),
+        aprobados=Count('id', filter=Q(estado='aprobado')),
+    )
+    return EstadisticasInformes(**resultado)
+
+
+def estadisticas_supervisores():
+    """Cuenta los supervisores activos"""
+    resultado = Supervisor.objects.aggregate(
+        activos=Count('id', filter=Q(estado='activo')),
+    )
+    return EstadisticasSupervisores(**resultado)
+
+
+def estadisticas_usuarios():
+    """Cuenta los usuarios por rol y estado del perfil en una sola consulta"""
+    resultado = User.objects.aggregate(
+        total=Count('id'),
+        supervisores_activos=Count('id', filter=Q(perfilusuario__rol='supervisor', perfilusuario__estado='activo')),
+        estudiantes=Count('id', filter=Q(perfilusuario__rol='estudiante')),
+        cuentas_inactivas=Count('id', filter=Q(perfilusuario__estado='inactivo')),
+    )
+    return EstadisticasUsuarios(**resultado)
+
+
+def estadisticas_dashboard():
+    """Reúne los contadores del dashboard: una consulta por tabla"""
+    return EstadisticasDashboard(
+        convenios=estadisticas_convenios(),
+        informes=estadisticas_informes(),
+        supervisores=estadisticas_supervisores(),
+    )
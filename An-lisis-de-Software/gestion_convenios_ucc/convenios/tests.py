@@ -1,3 +1,1275 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+from unittest import mock
+from datetime import date, timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import contadores
+from .concurrencia import en_paralelo
+from .busqueda import obtener_backend
+from .estados import actualizar_estados
+from . import almacenamiento, benchmark, descargas, exportacion, extraccion, sinteticos, textos
+from .importacion import ERRORES_A_MOSTRAR, ErrorImportacion, importar_convenios
+from .models import ActividadConvenio, ArchivoAlmacenado, Convenio, Informe, TextoInforme
+from .paginacion import condicion_posterior, paginar_por_cursor
+from .stats import estadisticas_convenios, estadisticas_dashboard, estadisticas_informes
+from supervisores.models import EvaluacionSupervisor, Supervisor
+from usuarios.models import Notificacion, PerfilUsuario
+from gestion_convenios_ucc import instrumentacion, metricas, routers
+
+
+def crear_convenio(**kwargs):
+    datos = {
+        'empresa_entidad': 'Empresa de prueba',
+        'tipo': 'marco',
+        'fecha_inicio': date(2025, 1, 1),
+        'fecha_vencimiento': date(2027, 1, 1),
+        'estado': 'activo',
+    }
+    datos.update(kwargs)
+    return Convenio.objects.create(**datos)
+
+
+def crear_informe(convenio, supervisor, **kwargs):
+    datos = {
+        'convenio': convenio,
+        'supervisor': supervisor,
+        'titulo': 'Informe de prueba',
+        'archivo_informe': 'informes/prueba.pdf',
+        'fecha_entrega': date(2025, 6, 1),
+    }
+    datos.update(kwargs)
+    return Informe.objects.create(**datos)
+
+
+def plan_de_consulta(queryset):
+    """Devuelve las líneas de ``EXPLAIN QUERY PLAN`` de SQLite para un queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [fila[-1] for fila in cursor.fetchall()]
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es propio de SQLite')
+class PlanDeConsultaTestCase(TestCase):
+    def assertUsaIndice(self, queryset, indice):
+        plan = plan_de_consulta(queryset)
+        tabla = queryset.model._meta.db_table
+        self.assertNotIn(f'SCAN {tabla}', plan, f'Recorrido completo de {tabla}: {plan}')
+        self.assertTrue(
+            any(linea.endswith(indice) or f'INDEX {indice} ' in linea for linea in plan),
+            f'No se usa {indice}: {plan}',
+        )
+
+
+class EstadisticasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('supervisor', password='clave-segura-123')
+        Supervisor.objects.create(
+            user=cls.usuario, codigo_supervisor='SUP-1', especialidad='Ingeniería',
+            fecha_ingreso=date(2024, 1, 1),
+        )
+        cls.convenio = crear_convenio(tipo='marco', estado='activo')
+        crear_convenio(tipo='marco', estado='por_vencer')
+        crear_convenio(tipo='practicas', estado='vencido')
+        crear_convenio(tipo='practicas', estado='revision')
+        crear_informe(cls.convenio, cls.usuario, estado='pendiente')
+        crear_informe(cls.convenio, cls.usuario, estado='aprobado')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_estadisticas_convenios_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            estadisticas = estadisticas_convenios()
+        self.assertEqual(estadisticas.total, 4)
+        self.assertEqual(estadisticas.activos, 1)
+        self.assertEqual(estadisticas.por_vencer, 1)
+        self.assertEqual(estadisticas.vencidos, 1)
+        self.assertEqual(estadisticas.distribucion_tipos, [
+            {'tipo': 'marco', 'total': 2},
+            {'tipo': 'practicas', 'total': 2},
+        ])
+
+    def test_estadisticas_informes(self):
+        estadisticas = estadisticas_informes()
+        self.assertEqual((estadisticas.total, estadisticas.pendientes, estadisticas.aprobados), (2, 1, 1))
+
+    def test_estadisticas_dashboard_una_consulta_por_tabla(self):
+        with self.assertNumQueries(3):
+            estadisticas = estadisticas_dashboard()
+        self.assertEqual(estadisticas.supervisores.activos, 1)
+
+    def test_dashboard_renderiza_contadores(self):
+        respuesta = self.client.get(reverse('convenios:dashboard'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['convenios_activos'], 1)
+        self.assertEqual(respuesta.context['informes_pendientes'], 1)
+
+
+class ContadoresCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        contadores.reiniciar_estadisticas_cache()
+        self.convenio = crear_convenio()
+
+    def test_segunda_lectura_sale_de_cache(self):
+        with self.assertNumQueries(1):
+            contadores.obtener('convenios')
+        with self.assertNumQueries(0):
+            estadisticas = contadores.obtener('convenios')
+        self.assertEqual(estadisticas.total, 1)
+        self.assertEqual(contadores.estadisticas_cache()['convenios'], {'aciertos': 1, 'fallos': 1})
+
+    def test_guardar_convenio_invalida_solo_su_grupo(self):
+        contadores.obtener('convenios')
+        contadores.obtener('informes')
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_convenio(estado='vencido')
+        with self.assertNumQueries(1):
+            self.assertEqual(contadores.obtener('convenios').vencidos, 1)
+        with self.assertNumQueries(0):
+            contadores.obtener('informes')
+
+    def test_cambio_de_estado_desde_el_admin_invalida(self):
+        admin = User.objects.create_superuser('admin', password='clave-segura-123')
+        self.client.force_login(admin)
+        self.assertEqual(contadores.obtener('convenios').activos, 1)
+        datos = {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '1',
+            'form-0-id': str(self.convenio.pk),
+            'form-0-estado': 'vencido',
+            '_save': 'Guardar',
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:convenios_convenio_changelist'), datos)
+        self.assertEqual(contadores.obtener('convenios').vencidos, 1)
+
+    def test_borrar_convenio_invalida(self):
+        contadores.obtener('convenios')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.convenio.delete()
+        self.assertEqual(contadores.obtener('convenios').total, 0)
+
+
+class PaginacionCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            crear_convenio(empresa_entidad=f'Empresa {i}', tipo='marco' if i % 2 else 'practicas')
+        # Fechas repetidas: el desempate por id debe mantener el orden total
+        Convenio.objects.update(fecha_creacion=timezone.now())
+        cls.esperado = list(Convenio.objects.order_by('-fecha_creacion', '-id').values_list('id', flat=True))
+
+    def pagina(self, url):
+        return paginar_por_cursor(Convenio.objects.all(), RequestFactory().get(url), orden=('-fecha_creacion', '-id'))
+
+    def test_recorre_todas_las_paginas_hacia_adelante_y_atras(self):
+        vistos, paginas = [], []
+        pagina = self.pagina('/lista/?tamano=3')
+        self.assertFalse(pagina.tiene_anterior)
+        while True:
+            paginas.append(pagina)
+            vistos.extend(convenio.id for convenio in pagina)
+            if not pagina.tiene_siguiente:
+                break
+            pagina = self.pagina(f'/lista/{pagina.url_siguiente}')
+        self.assertEqual(vistos, self.esperado)
+        self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+
+        anterior = self.pagina(f'/lista/{paginas[-1].url_anterior}')
+        self.assertEqual([c.id for c in anterior], [c.id for c in paginas[1]])
+        self.assertTrue(anterior.tiene_anterior)
+        primera = self.pagina(f'/lista/{anterior.url_anterior}')
+        self.assertEqual([c.id for c in primera], [c.id for c in paginas[0]])
+        self.assertFalse(primera.tiene_anterior)
+
+    def test_conserva_los_filtros_en_los_enlaces(self):
+        pagina = self.pagina('/lista/?tipo=marco&busqueda=Emp&tamano=2')
+        self.assertIn('tipo=marco', pagina.url_siguiente)
+        self.assertIn('busqueda=Emp', pagina.url_siguiente)
+        self.assertIn('tamano=2', pagina.url_siguiente)
+
+    def test_cursor_invalido_devuelve_la_primera_pagina(self):
+        pagina = self.pagina('/lista/?cursor=no-es-un-cursor&tamano=3')
+        self.assertEqual([c.id for c in pagina], self.esperado[:3])
+
+    def test_tamano_acotado(self):
+        with self.settings(PAGINACION_TAMANO_MAXIMO=5):
+            self.assertEqual(self.pagina('/lista/?tamano=1000').tamano, 5)
+
+    def test_lista_convenios_pagina_con_filtros(self):
+        usuario = User.objects.create_user('lector', password='clave-segura-123')
+        Convenio.objects.update(supervisor=usuario)
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('convenios:lista_convenios'), {'tipo': 'marco', 'tamano': 2})
+        self.assertEqual(len(respuesta.context['convenios']), 2)
+        self.assertTrue(respuesta.context['pagina'].tiene_siguiente)
+
+
+class IndicesConveniosTests(PlanDeConsultaTestCase):
+    def test_listado_paginado(self):
+        orden = ('-fecha_creacion', '-id')
+        self.assertUsaIndice(Convenio.objects.select_related('supervisor').order_by(*orden)[:26], 'conv_creacion_idx')
+        self.assertUsaIndice(Convenio.objects.filter(estado='activo').order_by(*orden)[:26], 'conv_estado_creacion_idx')
+        self.assertUsaIndice(Convenio.objects.filter(tipo='marco').order_by(*orden)[:26], 'conv_tipo_creacion_idx')
+        cursor = condicion_posterior([('fecha_creacion', True), ('id', True)], [timezone.now(), 10], False)
+        self.assertUsaIndice(Convenio.objects.filter(cursor).order_by(*orden)[:26], 'conv_creacion_idx')
+
+    def test_filtros_de_fechas(self):
+        hoy = date.today()
+        self.assertUsaIndice(Convenio.objects.filter(fecha_inicio__gte=hoy, fecha_inicio__lte=hoy), 'conv_inicio_idx')
+        self.assertUsaIndice(
+            Convenio.objects.filter(fecha_vencimiento__gte=hoy, fecha_vencimiento__lte=hoy + timedelta(days=60))[:5],
+            'conv_vencimiento_idx',
+        )
+        self.assertUsaIndice(
+            Convenio.objects.filter(estado__in=['activo', 'por_vencer'], fecha_vencimiento__lt=hoy).values('id'),
+            'conv_estado_venc_idx',
+        )
+
+    def test_informes(self):
+        self.assertUsaIndice(Informe.objects.filter(supervisor_id=1, estado='pendiente').values('id'), 'inf_supervisor_estado_idx')
+        self.assertUsaIndice(Informe.objects.filter(estado='pendiente').order_by('-fecha_creacion')[:10], 'inf_pendientes_idx')
+        self.assertUsaIndice(Informe.objects.filter(convenio_id=1).order_by('-fecha_creacion'), 'inf_convenio_creacion_idx')
+
+    def test_actividades(self):
+        self.assertUsaIndice(ActividadConvenio.objects.order_by('-fecha_creacion')[:5], 'act_creacion_idx')
+        self.assertUsaIndice(ActividadConvenio.objects.filter(convenio_id=1).order_by('-fecha_creacion'), 'act_convenio_creacion_idx')
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisora = User.objects.create_user('mgomez', first_name='María', last_name='Gómez')
+        cls.bancolombia = crear_convenio(
+            empresa_entidad='Bancolombia', descripcion='Prácticas en analítica de datos', supervisor=cls.supervisora,
+        )
+        cls.ecopetrol = crear_convenio(empresa_entidad='Ecopetrol', descripcion='Convenio marco con Bancolombia')
+        cls.alcaldia = crear_convenio(empresa_entidad='Alcaldía de Bogotá', tipo='bienestar')
+
+    def buscar(self, texto):
+        return obtener_backend().buscar(texto)
+
+    def test_prefijos_y_acentos(self):
+        self.assertEqual(self.buscar('alcald'), [self.alcaldia.pk])
+        self.assertEqual(self.buscar('bogota'), [self.alcaldia.pk])
+        self.assertEqual(self.buscar('practicas datos'), [self.bancolombia.pk])
+
+    def test_ranking_prioriza_la_empresa(self):
+        self.assertEqual(self.buscar('bancolombia'), [self.bancolombia.pk, self.ecopetrol.pk])
+
+    def test_nombre_del_supervisor(self):
+        self.assertEqual(self.buscar('gomez'), [self.bancolombia.pk])
+
+    def test_sincronizacion_incremental(self):
+        crear_informe(self.alcaldia, self.supervisora, titulo='Seguimiento trimestral')
+        self.assertEqual(self.buscar('trimestral'), [self.alcaldia.pk])
+
+        self.supervisora.last_name = 'Restrepo'
+        self.supervisora.save()
+        self.assertEqual(self.buscar('restrepo'), [self.bancolombia.pk])
+
+        from supervisores.tests import crear_supervisor
+        supervisor = crear_supervisor('jperez', codigo_supervisor='SUP-JP')
+        supervisor.user.first_name = 'Jacinto'
+        supervisor.user.save()
+        supervisor.convenios_asignados.add(self.ecopetrol)
+        self.assertEqual(self.buscar('jacinto'), [self.ecopetrol.pk])
+        supervisor.convenios_asignados.clear()
+        self.assertEqual(self.buscar('jacinto'), [])
+
+        self.ecopetrol.delete()
+        self.assertEqual(self.buscar('ecopetrol'), [])
+
+    def test_filtrar_conserva_el_orden_del_queryset(self):
+        convenios = obtener_backend().filtrar(Convenio.objects.order_by('id'), 'bancolombia')
+        self.assertEqual(list(convenios.values_list('id', flat=True)), [self.bancolombia.pk, self.ecopetrol.pk])
+
+    def test_reconstruir_indice(self):
+        obtener_backend().vaciar()
+        self.assertEqual(self.buscar('ecopetrol'), [])
+        call_command('rebuild_search_index', lote=2, stdout=StringIO())
+        self.assertEqual(self.buscar('ecopetrol'), [self.ecopetrol.pk])
+
+
+class ActualizarEstadosTests(TestCase):
+    def setUp(self):
+        self.hoy = timezone.now().date()
+        self.vencido = crear_convenio(fecha_vencimiento=self.hoy - timedelta(days=1), estado='activo')
+        self.por_vencer = crear_convenio(fecha_vencimiento=self.hoy + timedelta(days=30), estado='activo')
+        self.renovado = crear_convenio(fecha_vencimiento=self.hoy + timedelta(days=400), estado='vencido')
+        self.limite = crear_convenio(fecha_vencimiento=self.hoy + timedelta(days=60), estado='activo')
+        self.en_revision = crear_convenio(fecha_vencimiento=self.hoy - timedelta(days=10), estado='revision')
+        self.al_dia = crear_convenio(fecha_vencimiento=self.hoy + timedelta(days=200), estado='activo')
+
+    def estados(self):
+        return dict(Convenio.objects.values_list('id', 'estado'))
+
+    def test_transiciones_por_lotes(self):
+        cambios = actualizar_estados(hoy=self.hoy, lote=1)
+        self.assertEqual(cambios, {'vencido': 1, 'por_vencer': 2, 'activo': 1})
+        estados = self.estados()
+        self.assertEqual(estados[self.vencido.pk], 'vencido')
+        self.assertEqual(estados[self.por_vencer.pk], 'por_vencer')
+        self.assertEqual(estados[self.limite.pk], 'por_vencer')
+        self.assertEqual(estados[self.renovado.pk], 'activo')
+        self.assertEqual(estados[self.en_revision.pk], 'revision')
+        self.assertEqual(estados[self.al_dia.pk], 'activo')
+
+    def test_idempotente(self):
+        actualizar_estados(hoy=self.hoy)
+        self.assertEqual(actualizar_estados(hoy=self.hoy), {'vencido': 0, 'por_vencer': 0, 'activo': 0})
+
+    def test_simular_no_modifica(self):
+        antes = self.estados()
+        self.assertEqual(sum(actualizar_estados(hoy=self.hoy, simular=True).values()), 4)
+        self.assertEqual(self.estados(), antes)
+
+    def test_coincide_con_las_propiedades_del_modelo(self):
+        actualizar_estados(hoy=self.hoy)
+        for convenio in Convenio.objects.filter(estado__in=['activo', 'por_vencer', 'vencido']):
+            self.assertEqual(convenio.estado == 'vencido', convenio.esta_vencido)
+            self.assertEqual(convenio.estado == 'por_vencer', convenio.esta_por_vencer)
+
+    def test_invalida_contadores(self):
+        cache.clear()
+        self.assertEqual(contadores.obtener('convenios').por_vencer, 0)
+        call_command('actualizar_estados_convenios', stdout=StringIO())
+        self.assertEqual(contadores.obtener('convenios').por_vencer, 2)
+
+
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('exportador', first_name='Ana', last_name='Ruiz')
+        hoy = timezone.now().date()
+        cls.marco = crear_convenio(
+            empresa_entidad='Universidad Nacional', tipo='marco', supervisor=cls.usuario,
+            fecha_vencimiento=hoy + timedelta(days=10),
+        )
+        cls.practicas = crear_convenio(empresa_entidad='Empresa Prácticas', tipo='practicas')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def descargar(self, **parametros):
+        respuesta = self.client.get(reverse('convenios:exportar_convenios'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_csv_con_filtros_y_dias_calculados_en_sql(self):
+        respuesta = self.descargar(formato='csv', tipo='marco')
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        filas = list(csv.reader(StringIO(contenido)))
+        self.assertEqual(filas[0], exportacion.ENCABEZADOS)
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][1:4], ['Universidad Nacional', 'Marco', 'Activo'])
+        self.assertEqual(filas[1][6], '10')
+        self.assertEqual(filas[1][7], 'Ana Ruiz')
+
+    @unittest.skipUnless(exportacion.xlsx_disponible(), 'openpyxl no está instalado')
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        respuesta = self.descargar(formato='xlsx')
+        libro = load_workbook(BytesIO(b''.join(respuesta.streaming_content)), read_only=True)
+        filas = list(libro['Convenios'].iter_rows(values_only=True))
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[0][0], 'ID')
+
+    def test_csv_no_exporta_formulas(self):
+        crear_convenio(empresa_entidad='=1+1', tipo='bienestar')
+        crear_convenio(empresa_entidad='@SUMA(A1)', tipo='bienestar')
+        contenido = b''.join(self.descargar(formato='csv', tipo='bienestar').streaming_content).decode('utf-8-sig')
+        empresas = sorted(fila[1] for fila in list(csv.reader(StringIO(contenido)))[1:])
+        self.assertEqual(empresas, ["'=1+1", "'@SUMA(A1)"])
+
+    @unittest.skipUnless(exportacion.xlsx_disponible(), 'openpyxl no está instalado')
+    def test_xlsx_no_exporta_formulas(self):
+        from openpyxl import load_workbook
+
+        crear_convenio(empresa_entidad='=1+1', tipo='bienestar')
+        respuesta = self.descargar(formato='xlsx', tipo='bienestar')
+        libro = load_workbook(BytesIO(b''.join(respuesta.streaming_content)))
+        celda = libro['Convenios']['B2']
+        self.assertEqual(celda.data_type, 's')
+        self.assertEqual(celda.value, "'=1+1")
+
+    def test_formato_desconocido(self):
+        respuesta = self.client.get(reverse('convenios:exportar_convenios'), {'formato': 'pdf'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ImportacionTests(TestCase):
+    ENCABEZADO = 'empresa_entidad,tipo,estado,fecha_inicio,fecha_vencimiento,supervisor,descripcion\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('importador')
+        cls.supervisor = User.objects.create_user('jperez', first_name='Juan', last_name='Pérez')
+
+    def setUp(self):
+        cache.clear()
+
+    def csv(self, *filas):
+        return StringIO(self.ENCABEZADO + ''.join(f'{fila}\n' for fila in filas))
+
+    def test_importa_en_lotes_y_reporta_errores_por_linea(self):
+        archivo = self.csv(
+            'Alfa S.A.,marco,,2025-01-01,2026-01-01,jperez,Convenio alfa',
+            'Beta Ltda,Prácticas,Por vencer,01/02/2025,01/02/2026,,',
+            'Gamma,desconocido,activo,2025-01-01,2026-01-01,,',
+            'Delta,bienestar,activo,2025-01-01,2024-01-01,,',
+            'Épsilon,marco,activo,2025-01-01,2026-01-01,nadie,',
+            ',marco,activo,2025-01-01,2026-01-01,,',
+            'Zeta,marco,activo,2025-13-01,2026-01-01,jperez,',
+        )
+        resultado = importar_convenios(archivo, lote=2)
+
+        self.assertEqual(resultado.procesadas, 7)
+        self.assertEqual(resultado.creadas, 2)
+        self.assertEqual(resultado.lotes, 4)
+        self.assertEqual([error.fila for error in resultado.errores], [4, 5, 6, 7, 8])
+        self.assertIn('tipo', resultado.errores[0].mensaje)
+        self.assertIn('nadie', resultado.errores[2].mensaje)
+
+        alfa = Convenio.objects.get(empresa_entidad='Alfa S.A.')
+        self.assertEqual((alfa.estado, alfa.supervisor_id), ('activo', self.supervisor.id))
+        beta = Convenio.objects.get(empresa_entidad='Beta Ltda')
+        self.assertEqual((beta.tipo, beta.estado, beta.fecha_inicio), ('practicas', 'por_vencer', date(2025, 2, 1)))
+        self.assertEqual(set(obtener_backend().buscar('perez')), {alfa.id})
+
+    def test_consultas_constantes_por_lote(self):
+        filas = [f'Empresa {i},marco,activo,2025-01-01,2026-01-01,jperez,' for i in range(50)]
+        # supervisores, savepoint, INSERT, 3 lecturas y 2 escrituras del índice, release
+        with self.assertNumQueries(9):
+            resultado = importar_convenios(self.csv(*filas), lote=50)
+        self.assertEqual(resultado.creadas, 50)
+
+    def test_simular_no_escribe(self):
+        resultado = importar_convenios(self.csv('Alfa,marco,activo,2025-01-01,2026-01-01,,'), simular=True)
+        self.assertEqual(resultado.creadas, 1)
+        self.assertFalse(Convenio.objects.exists())
+
+    def test_columnas_faltantes(self):
+        with self.assertRaises(ErrorImportacion):
+            importar_convenios(StringIO('empresa_entidad,tipo\nAlfa,marco\n'))
+
+    def test_invalida_contadores(self):
+        self.assertEqual(contadores.obtener('convenios').total, 0)
+        importar_convenios(self.csv('Alfa,marco,activo,2025-01-01,2026-01-01,,'))
+        self.assertEqual(contadores.obtener('convenios').total, 1)
+
+    def test_vista_de_carga(self):
+        self.client.force_login(self.usuario)
+        contenido = (self.ENCABEZADO + 'Alfa,marco,activo,2025-01-01,2026-01-01,jperez,\n').encode('utf-8-sig')
+        respuesta = self.client.post(reverse('convenios:importar_convenios'), {
+            'archivo': SimpleUploadedFile('convenios.csv', contenido, content_type='text/csv'),
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['resultado'].creadas, 1)
+        self.assertTrue(Convenio.objects.filter(empresa_entidad='Alfa').exists())
+
+    def test_comando(self):
+        import tempfile
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write(self.ENCABEZADO + 'Alfa,marco,activo,2025-01-01,2026-01-01,,\nBeta,x,,,,,\n')
+        salida, errores = StringIO(), StringIO()
+        call_command('importar_convenios', archivo.name, stdout=salida, stderr=errores)
+        self.assertIn('1 convenios creados, 1 filas con error', salida.getvalue())
+        self.assertIn('línea 3', errores.getvalue())
+
+    def test_comando_con_csv_mal_formado(self):
+        import tempfile
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write(self.ENCABEZADO + 'Alfa,marco,activo,2025-01-01,2026-01-01,,"' + 'x' * 200_000 + '"\n')
+        with self.assertRaises(CommandError):
+            call_command('importar_convenios', archivo.name, stdout=StringIO(), stderr=StringIO())
+
+    def test_vista_limita_los_errores_mostrados(self):
+        self.client.force_login(self.usuario)
+        filas = ''.join(f'Empresa {i},x,,,,,\n' for i in range(ERRORES_A_MOSTRAR + 5))
+        respuesta = self.client.post(reverse('convenios:importar_convenios'), {
+            'archivo': SimpleUploadedFile('convenios.csv', (self.ENCABEZADO + filas).encode(), content_type='text/csv'),
+        })
+        self.assertEqual(len(respuesta.context['errores']), ERRORES_A_MOSTRAR)
+        self.assertContains(respuesta, 'y 5 errores más')
+
+
+class BenchmarkSQLiteTests(TestCase):
+    def test_compara_ambos_perfiles(self):
+        salida = StringIO()
+        call_command('benchmark_sqlite', segundos=0.1, filas=100, lectores=1, escritores=1, stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual([linea.split()[0] for linea in lineas], ['desarrollo', 'produccion'])
+        self.assertTrue(all('bloqueos' in linea for linea in lineas))
+
+
+class VistasAsincronasTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('asincrono', is_superuser=True)
+        hoy = timezone.now().date()
+        crear_convenio(empresa_entidad='Alfa', supervisor=self.usuario, fecha_vencimiento=hoy + timedelta(days=5))
+        crear_convenio(empresa_entidad='Beta', tipo='practicas', supervisor=self.usuario)
+        self.client.force_login(self.usuario)
+
+    def test_en_paralelo_ejecuta_a_la_vez(self):
+        # Si las funciones corrieran una tras otra la barrera nunca se completaría
+        barrera = threading.Barrier(3, timeout=5)
+
+        def esperar(valor):
+            barrera.wait()
+            return valor
+
+        resultados = async_to_sync(en_paralelo)(*(lambda i=i: esperar(i) for i in range(3)))
+        self.assertEqual(resultados, [0, 1, 2])
+
+    def test_mismo_contexto_que_las_vistas_sincronas(self):
+        pares = [
+            ('convenios:dashboard', 'convenios:dashboard_async', ['total_convenios', 'convenios_por_vencer']),
+            ('convenios:lista_convenios', 'convenios:lista_convenios_async', ['convenios_por_vencer_count', 'filtros']),
+        ]
+        for sincrona, asincrona, claves in pares:
+            esperado = self.client.get(reverse(sincrona), {'tipo': 'marco'})
+            obtenido = self.client.get(reverse(asincrona), {'tipo': 'marco'})
+            self.assertEqual(obtenido.status_code, 200)
+            for clave in claves:
+                self.assertEqual(obtenido.context[clave], esperado.context[clave])
+        self.assertEqual(
+            [c.empresa_entidad for c in obtenido.context['convenios']],
+            [c.empresa_entidad for c in esperado.context['convenios']],
+        )
+        self.assertEqual(
+            [c.empresa_entidad for c in self.client.get(reverse('convenios:dashboard_async')).context['convenios_por_vencer_detalle']],
+            ['Alfa'],
+        )
+
+    def test_listado_asincrono_requiere_sesion(self):
+        self.client.logout()
+        respuesta = self.client.get(reverse('convenios:lista_convenios_async'))
+        self.assertEqual(respuesta.status_code, 302)
+
+    def test_benchmark(self):
+        salida = StringIO()
+        call_command('benchmark_vistas_async', repeticiones=2, usuario='asincrono', stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual([linea.split()[0] for linea in lineas], ['vista', 'dashboard', 'convenios', 'supervisores'])
+
+    @override_settings(SQL_SERVER_TIMING=True)
+    def test_instrumentacion_cuenta_las_consultas_de_los_hilos(self):
+        with self.assertLogs('gestion_convenios_ucc.instrumentacion', 'INFO') as registro:
+            respuesta = self.client.get(reverse('convenios:dashboard_async'))
+        datos = registro.records[0].sql
+        self.assertEqual(datos['vista'], 'convenios:dashboard_async')
+        self.assertGreater(datos['consultas'], 3)
+        self.assertIn(f'desc="{datos["consultas"]} consultas"', respuesta['Server-Timing'])
+
+
+@override_settings(REPLICAS_LECTURA=['replica1', 'replica2'])
+class RouterReplicasTests(TestCase):
+    def setUp(self):
+        self.router = routers.RouterReplicas()
+
+    def test_lecturas_fuera_de_vistas_de_solo_lectura_van_a_la_primaria(self):
+        self.assertEqual(self.router.db_for_read(Convenio), 'default')
+
+    def test_turnos_entre_replicas_y_escrituras_en_la_primaria(self):
+        leer = routers.solo_lectura(lambda: [self.router.db_for_read(Convenio) for _ in range(4)])
+        self.assertEqual(sorted(leer()), ['replica1', 'replica1', 'replica2', 'replica2'])
+        escribir = routers.solo_lectura(lambda: self.router.db_for_write(Convenio))
+        self.assertEqual(escribir(), 'default')
+
+    def test_en_primaria_dentro_de_una_vista_de_solo_lectura(self):
+        def leer():
+            with routers.en_primaria():
+                return self.router.db_for_read(Convenio)
+        self.assertEqual(routers.solo_lectura(leer)(), 'default')
+
+    def test_las_replicas_no_se_migran(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'convenios'))
+        self.assertTrue(self.router.allow_migrate('default', 'convenios'))
+
+    def test_cookie_tras_escritura(self):
+        self.client.force_login(User.objects.create_user('escritor'))
+        respuesta = self.client.post(reverse('convenios:importar_convenios'))
+        self.assertIn(routers.COOKIE_PRIMARIA, respuesta.cookies)
+        respuesta = self.client.get(reverse('convenios:dashboard'))
+        self.assertNotIn(routers.COOKIE_PRIMARIA, respuesta.cookies)
+
+
+class ReplicaSQLiteTests(TransactionTestCase):
+    """Primaria y réplica en dos archivos SQLite distintos"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('lector')
+        self.client.force_login(self.usuario)
+        crear_convenio(empresa_entidad='Replicado', supervisor=self.usuario)
+
+        # La réplica es una copia de la primaria en este momento
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        primaria = connections['default']
+        datos = {**primaria.settings_dict, 'NAME': os.path.join(directorio.name, 'replica.sqlite3')}
+        replica = primaria.__class__(datos, alias='replica')
+        connections['replica'] = replica
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(replica.close)
+        primaria.ensure_connection()
+        replica.ensure_connection()
+        primaria.connection.backup(replica.connection)
+
+        # Escrito sólo en la primaria: la réplica "va atrasada"
+        crear_convenio(empresa_entidad='Reciente', supervisor=self.usuario)
+
+    def empresas_listadas(self):
+        respuesta = self.client.get(reverse('convenios:lista_convenios'))
+        return {convenio.empresa_entidad for convenio in respuesta.context['convenios']}
+
+    @override_settings(REPLICAS_LECTURA=['replica'])
+    def test_lee_de_la_replica_hasta_escribir(self):
+        self.assertEqual(self.empresas_listadas(), {'Replicado'})
+
+        self.client.post(reverse('convenios:importar_convenios'))
+        self.assertEqual(self.empresas_listadas(), {'Replicado', 'Reciente'})
+
+    @override_settings(REPLICAS_LECTURA=['replica'], REPLICA_VENTANA_PRIMARIA=0)
+    def test_sin_ventana_sigue_leyendo_de_la_replica(self):
+        self.client.post(reverse('convenios:importar_convenios'))
+        self.assertEqual(self.empresas_listadas(), {'Replicado'})
+
+    @override_settings(REPLICAS_LECTURA=['replica'])
+    def test_contadores_se_calculan_en_la_primaria(self):
+        cache.clear()
+        total = routers.solo_lectura(lambda: contadores.obtener('convenios').total)
+        self.assertEqual(total(), 2)
+
+    def test_sin_replicas_todo_va_a_la_primaria(self):
+        self.assertEqual(self.empresas_listadas(), {'Replicado', 'Reciente'})
+
+
+@override_settings(EXTRACCION_PROCESOS=0)
+@override_settings(ACTIVIDAD_INTERVALO_VOLCADO=3600)
+class InstrumentacionSQLTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('medido', is_superuser=True)
+        for i in range(3):
+            crear_convenio(empresa_entidad=f'Medido {i}', supervisor=cls.usuario)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_forma_sin_valores(self):
+        self.assertEqual(
+            instrumentacion.forma("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND nombre = 'x''y' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (%s...) AND nombre = ? LIMIT ?',
+        )
+        self.assertEqual(
+            instrumentacion.forma('SELECT * FROM t WHERE id IN (%s) LIMIT 5'),
+            instrumentacion.forma('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 7'),
+        )
+
+    @override_settings(SQL_SERVER_TIMING=True)
+    def test_cabecera_y_registro_por_vista(self):
+        with CaptureQueriesContext(connection) as consultas, \
+                self.assertLogs('gestion_convenios_ucc.instrumentacion', 'INFO') as registro:
+            respuesta = self.client.get(reverse('convenios:lista_convenios'))
+        datos = registro.records[0].sql
+        self.assertEqual(datos['vista'], 'convenios:lista_convenios')
+        self.assertEqual(datos['estado'], 200)
+        self.assertEqual(datos['consultas'], len(consultas))
+        self.assertIn('vista=convenios:lista_convenios metodo=GET estado=200', registro.output[0])
+        self.assertRegex(respuesta['Server-Timing'], rf'^sql;dur=[\d.]+;desc="{len(consultas)} consultas", total;dur=[\d.]+$')
+        self.assertEqual(len(registro.records), 1)
+
+    @override_settings(SQL_PRESUPUESTO_POR_VISTA={'convenios:lista_convenios': 2})
+    def test_aviso_al_superar_el_presupuesto(self):
+        with self.assertLogs('gestion_convenios_ucc.instrumentacion', 'WARNING') as registro:
+            self.client.get(reverse('convenios:lista_convenios'))
+        self.assertIn('presupuesto=2', registro.output[0])
+
+    @override_settings(SQL_UMBRAL_REPETIDAS=3)
+    def test_consultas_repetidas(self):
+        medicion = instrumentacion.MedicionSQL()
+        token = instrumentacion._medicion.set(medicion)
+        try:
+            for convenio in Convenio.objects.all():
+                Informe.objects.filter(convenio=convenio).count()
+        finally:
+            instrumentacion._medicion.reset(token)
+        self.assertEqual(medicion.consultas, 4)
+        [(sql, veces)] = medicion.repetidas(3)
+        self.assertEqual(veces, 3)
+        self.assertIn('"convenio_id" = %s', sql)
+
+    def test_cabecera_solo_con_debug(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('convenios:lista_convenios')))
+        with self.settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get(reverse('convenios:lista_convenios')))
+
+    @override_settings(SQL_SERVER_TIMING=True, SQL_INSTRUMENTACION_ACTIVA=False)
+    def test_desactivada(self):
+        respuesta = self.client.get(reverse('convenios:lista_convenios'))
+        self.assertNotIn('Server-Timing', respuesta)
+        self.assertFalse(hasattr(respuesta.wsgi_request, 'medicion_sql'))
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('prometeo', is_superuser=True)
+        crear_convenio(empresa_entidad='Medida', supervisor=cls.usuario)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(
+            METRICAS_ARCHIVO=os.path.join(directorio.name, 'metricas.sqlite3'), ACTIVIDAD_INTERVALO_VOLCADO=3600,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        with metricas._lock:
+            metricas._pendientes.clear()
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def series(self):
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertEqual(respuesta['Content-Type'], metricas.CONTENT_TYPE)
+        lineas = respuesta.content.decode().splitlines()
+        return lineas, dict(linea.rsplit(' ', 1) for linea in lineas if not linea.startswith('#'))
+
+    def test_histogramas_por_vista_y_estado(self):
+        self.client.get(reverse('convenios:lista_convenios'))
+        self.client.get(reverse('convenios:lista_convenios'))
+        self.client.get('/no-existe/')
+        lineas, series = self.series()
+
+        lista = 'vista="convenios:lista_convenios",estado="200"'
+        self.assertEqual(series[f'peticiones_duracion_segundos_count{{{lista}}}'], '2')
+        self.assertEqual(series[f'peticiones_duracion_segundos_bucket{{{lista},le="+Inf"}}'], '2')
+        self.assertEqual(series['peticiones_duracion_segundos_count{vista="<sin_ruta>",estado="404"}'], '1')
+        self.assertEqual(series['peticiones_consultas_sql_count{vista="convenios:lista_convenios"}'], '2')
+        self.assertIn('peticiones_sql_segundos_sum{vista="convenios:lista_convenios"}', series)
+        self.assertIn('# TYPE peticiones_duracion_segundos histogram', lineas)
+
+        # Cubetas en orden creciente, con +Inf, la suma y la cuenta al final
+        cubetas = [linea for linea in lineas if linea.startswith(f'peticiones_duracion_segundos_bucket{{{lista}')]
+        limites = [float(linea.split('le="')[1].split('"')[0]) for linea in cubetas]
+        self.assertEqual(limites, sorted(limites))
+        self.assertEqual(limites[-1], float('inf'))
+        posicion = lineas.index(cubetas[-1])
+        self.assertTrue(lineas[posicion + 1].startswith(f'peticiones_duracion_segundos_sum{{{lista}}}'))
+
+    @override_settings(METRICAS_INTERVALO_VOLCADO=0)
+    def test_la_peticion_no_escribe_el_archivo(self):
+        with mock.patch.object(metricas.volcado, 'asegurar') as asegurar:
+            self.client.get(reverse('convenios:lista_convenios'))
+        asegurar.assert_called_once_with()
+        self.assertFalse(os.path.exists(metricas.archivo()))
+        self.assertTrue(metricas._pendientes)
+
+    def test_aciertos_y_fallos_de_cache(self):
+        cache.get('metricas-prueba')
+        cache.set('metricas-prueba', 1)
+        cache.get_many(['metricas-prueba', 'otra'])
+        _, series = self.series()
+        self.assertEqual(series['cache_aciertos_total'], '1')
+        self.assertEqual(series['cache_fallos_total'], '2')
+
+    def test_cache_compartida_de_produccion(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        # Dos workers con la misma ubicación: lo que uno invalida deja de verlo el otro
+        worker, comando = (metricas.FileBasedCacheMedida(directorio.name, {}) for _ in range(2))
+        worker.set(contadores._clave('convenios'), 'viejo')
+        comando.delete(contadores._clave('convenios'))
+        self.assertIsNone(worker.get(contadores._clave('convenios')))
+        worker.set('otra', 1)
+        self.assertEqual(comando.get_many(['otra']), {'otra': 1})
+        _, series = self.series()
+        self.assertEqual(series['cache_aciertos_total'], '1')
+        self.assertEqual(series['cache_fallos_total'], '1')
+
+    def test_suma_lo_volcado_por_varios_procesos(self):
+        # Otro worker ya volcó sus series en el archivo compartido
+        metricas.sumar('cache_aciertos_total', 5)
+        self.assertEqual(metricas.volcar(), 1)
+        metricas.sumar('cache_aciertos_total', 2)
+        _, series = self.series()
+        self.assertEqual(series['cache_aciertos_total'], '7')
+
+    @override_settings(METRICAS_INTERVALO_TABLAS=3600)
+    def test_filas_de_las_tablas_muestreadas(self):
+        _, series = self.series()
+        self.assertEqual(series['tabla_filas{tabla="convenios_convenio"}'], '1')
+        self.assertEqual(series['tabla_filas{tabla="usuarios_notificacion"}'], '0')
+
+        crear_convenio(empresa_entidad='Nueva')
+        with self.assertNumQueries(0):
+            self.assertFalse(metricas.muestrear_tablas())
+        self.assertTrue(metricas.muestrear_tablas(forzar=True))
+        _, series = self.series()
+        self.assertEqual(series['tabla_filas{tabla="convenios_convenio"}'], '2')
+
+    def test_acceso_restringido(self):
+        url = reverse('metricas')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.8').status_code, 403)
+        with self.settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer otro'}).status_code, 403)
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer secreto'}).status_code, 200)
+        # Como en producción: sin token ni IPs permitidas no se atiende ni desde loopback
+        with self.settings(METRICAS_IPS_PERMITIDAS=()):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class DatosSinteticosTests(TestCase):
+    def generar(self, **opciones):
+        datos = {'convenios': 40, 'supervisores': 4, 'informes': 200, 'notificaciones': 30, 'evaluaciones': 12}
+        datos.update(opciones)
+        salida = StringIO()
+        call_command('seed_benchmark', semilla=7, lote=50, stdout=salida, **datos)
+        return salida.getvalue()
+
+    def test_genera_datos_coherentes(self):
+        salida = self.generar()
+        self.assertIn('40 convenios, 200 informes, 4 supervisores', salida)
+        self.assertEqual(Informe.objects.count(), 200)
+        self.assertEqual(Supervisor.objects.count(), 4)
+        self.assertFalse(User.objects.filter(username__startswith=sinteticos.PREFIJO_USUARIO)
+                         .exclude(password__startswith='!').exists())
+
+        hoy = timezone.localdate()
+        self.assertFalse(Convenio.objects.filter(estado='vencido', fecha_vencimiento__gte=hoy).exists())
+        self.assertFalse(Convenio.objects.filter(fecha_vencimiento__lt=hoy).exclude(estado='vencido').exists())
+        # Los derivados que bulk_create no actualiza
+        self.assertTrue(obtener_backend().buscar(Convenio.objects.first().empresa_entidad.split()[-1]))
+        self.assertEqual(Supervisor.objects.filter(resumen_evaluaciones__isnull=False).count(),
+                         EvaluacionSupervisor.objects.values('supervisor').distinct().count())
+        no_leidas = sum(PerfilUsuario.objects.values_list('notificaciones_no_leidas', flat=True))
+        self.assertEqual(no_leidas, Notificacion.objects.filter(leida=False).count())
+
+        with self.assertRaisesMessage(CommandError, 'base vacía'):
+            self.generar()
+
+    def test_misma_semilla_mismos_datos(self):
+        def huella():
+            return list(Convenio.objects.order_by('pk').values_list('empresa_entidad', 'tipo', 'estado', 'fecha_inicio'))
+
+        self.generar()
+        primera = huella()
+        User.objects.filter(username__startswith=sinteticos.PREFIJO_USUARIO).delete()
+        Convenio.objects.all().delete()
+        self.generar()
+        self.assertEqual(huella(), primera)
+
+    def test_no_mezcla_con_datos_existentes(self):
+        User.objects.create_user('real')
+        with self.assertRaisesMessage(CommandError, 'base vacía'):
+            self.generar()
+        self.assertFalse(Convenio.objects.exists())
+
+        self.generar(sobre_datos_existentes=True)
+        self.assertEqual(Convenio.objects.count(), 40)
+
+    def test_benchmark_de_todas_las_vistas(self):
+        self.generar()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ruta = os.path.join(directorio.name, 'resultados.json')
+        call_command('benchmark_vistas', repeticiones=2, salida=ruta, stdout=StringIO())
+
+        resultados = benchmark.cargar(ruta)
+        vistas = {vista['vista']: vista for vista in resultados['vistas']}
+        self.assertEqual(resultados['tablas']['convenios.Informe'], 200)
+        self.assertIn('usuarios:flujo_notificaciones', resultados['omitidas'])
+        for nombre in ('convenios:dashboard', 'convenios:lista_convenios', 'convenios:detalle_convenio',
+                       'usuarios:lista_usuarios', 'supervisores:ranking_supervisores'):
+            self.assertEqual(vistas[nombre]['estado'], 200, nombre)
+            self.assertGreater(vistas[nombre]['consultas'], 0)
+            self.assertGreaterEqual(vistas[nombre]['p95_ms'], vistas[nombre]['p50_ms'])
+            self.assertGreater(vistas[nombre]['memoria_pico_kb'], 0)
+        # Las rutas que sólo aceptan POST se miden con POST
+        self.assertEqual(vistas['usuarios:marcar_notificacion_leida']['estado'], 302)
+        self.assertEqual(vistas['usuarios:marcar_todas_leidas']['estado'], 302)
+
+        salida = StringIO()
+        call_command('benchmark_vistas', repeticiones=1, vista='ranking', comparar=ruta, stdout=salida)
+        self.assertIn('supervisores:ranking_supervisores', salida.getvalue().split('Comparación')[1])
+
+
+class DescargasTests(TestCase):
+    CONTENIDO = bytes(range(256)) * 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = User.objects.create_user('firmante')
+        cls.asignado = User.objects.create_user('asignado')
+        cls.ajeno = User.objects.create_user('ajeno')
+        cls.admin = User.objects.create_user('admin', is_staff=True)
+        cls.convenio = crear_convenio(supervisor=cls.supervisor)
+        Supervisor.objects.create(
+            user=cls.asignado, codigo_supervisor='SUP-A', especialidad='Derecho', fecha_ingreso=date(2024, 1, 1),
+        ).convenios_asignados.add(cls.convenio)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=directorio.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.convenio.archivo_convenio.save('firmado.pdf', ContentFile(self.CONTENIDO))
+        self.url = reverse('convenios:descargar_convenio', args=[self.convenio.pk])
+        self.client.force_login(self.supervisor)
+
+    def cuerpo(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+
+    def test_descarga_completa_con_validadores(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.cuerpo(respuesta), self.CONTENIDO)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(respuesta['Content-Length'], str(len(self.CONTENIDO)))
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertTrue(respuesta['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', respuesta)
+        self.assertIn('private', respuesta['Cache-Control'])
+        self.assertTrue(respuesta['Content-Disposition'].startswith('inline'))
+        self.assertTrue(self.client.get(self.url + '?descargar')['Content-Disposition'].startswith('attachment'))
+
+    def test_rangos(self):
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], f'bytes 100-199/{len(self.CONTENIDO)}')
+        self.assertEqual(respuesta['Content-Length'], '100')
+        self.assertEqual(self.cuerpo(respuesta), self.CONTENIDO[100:200])
+
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(self.cuerpo(respuesta), self.CONTENIDO[-10:])
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=10000-'})
+        self.assertEqual(self.cuerpo(respuesta), self.CONTENIDO[10000:])
+
+        respuesta = self.client.get(self.url, headers={'Range': f'bytes={len(self.CONTENIDO)}-'})
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], f'bytes */{len(self.CONTENIDO)}')
+
+        # Varios intervalos no se atienden: se envía el archivo completo
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=0-1,5-6'}).status_code, 200)
+
+    def test_interpretar_rango(self):
+        self.assertEqual(descargas.interpretar_rango('bytes=0-', 10), (0, 9))
+        self.assertEqual(descargas.interpretar_rango('bytes=5-50', 10), (5, 9))
+        self.assertEqual(descargas.interpretar_rango('bytes=-50', 10), (0, 9))
+        self.assertIsNone(descargas.interpretar_rango('bytes=5-2', 10))
+        self.assertIsNone(descargas.interpretar_rango('items=0-1', 10))
+        self.assertIs(descargas.interpretar_rango('bytes=-0', 10), False)
+        self.assertIs(descargas.interpretar_rango('bytes=0-', 0), False)
+
+    def test_revalidacion_y_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        respuesta = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+        self.assertEqual(respuesta.status_code, 206)
+        # El archivo cambió desde que se pidió el rango: se envía completo
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"otro"'})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_permisos(self):
+        self.client.force_login(self.asignado)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.force_login(self.ajeno)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_informe(self):
+        informe = crear_informe(self.convenio, self.ajeno, archivo_informe=None)
+        informe.archivo_informe.save('avance.pdf', ContentFile(b'%PDF informe'))
+        url = reverse('convenios:descargar_informe', args=[informe.pk])
+        self.assertEqual(self.cuerpo(self.client.get(url)), b'%PDF informe')
+
+        self.client.force_login(self.ajeno)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user('otro'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_sin_archivo(self):
+        sin_archivo = crear_convenio(supervisor=self.supervisor)
+        self.assertEqual(self.client.get(reverse('convenios:descargar_convenio', args=[sin_archivo.pk])).status_code, 404)
+
+    def test_delegada_al_servidor_frontal(self):
+        with self.settings(ARCHIVOS_DESCARGA_DELEGADA='x-accel-redirect'):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.content, b'')
+        self.assertEqual(respuesta['X-Accel-Redirect'], '/archivos-protegidos/' + self.convenio.archivo_convenio.name)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+
+        with self.settings(ARCHIVOS_DESCARGA_DELEGADA='x-sendfile'):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['X-Sendfile'], self.convenio.archivo_convenio.path)
+
+        self.client.force_login(self.ajeno)
+        with self.settings(ARCHIVOS_DESCARGA_DELEGADA='x-sendfile'):
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+# Sin margen: las pruebas sueltan referencias justo después de subir
+@override_settings(EXTRACCION_PROCESOS=0, ALMACENAMIENTO_GRACIA=0)
+class AlmacenamientoDeduplicadoTests(TestCase):
+    FIRMADO = b'%PDF convenio firmado ' * 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('firmante')
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.media = directorio.name
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def archivos_en_disco(self):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nombre), self.media)
+            for raiz, _, nombres in os.walk(self.media) for nombre in nombres
+        )
+
+    def convenio_con_informes(self, informes=2):
+        convenio = crear_convenio(supervisor=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            convenio.archivo_convenio.save('firmado.pdf', ContentFile(self.FIRMADO))
+            for i in range(informes):
+                informe = crear_informe(convenio, self.usuario, archivo_informe=None)
+                informe.archivo_informe.save(f'anexo-{i}.PDF', ContentFile(self.FIRMADO))
+        return convenio
+
+    def test_guarda_cada_contenido_una_vez(self):
+        convenio = self.convenio_con_informes()
+        archivo = ArchivoAlmacenado.objects.get()
+        self.assertEqual(archivo.referencias, 3)
+        self.assertEqual(archivo.tamano, len(self.FIRMADO))
+        self.assertEqual(convenio.archivo_convenio.name, archivo.nombre)
+        self.assertEqual(set(Informe.objects.values_list('archivo_informe', flat=True)), {archivo.nombre})
+        self.assertEqual(self.archivos_en_disco(), [archivo.nombre])
+        self.assertTrue(archivo.nombre.startswith(f'documentos/{archivo.sha256[:2]}/{archivo.sha256}'))
+
+    def test_reemplazar_el_archivo_descuenta_el_anterior(self):
+        convenio = self.convenio_con_informes(informes=0)
+        anterior = convenio.archivo_convenio.name
+        with self.captureOnCommitCallbacks(execute=True):
+            convenio.archivo_convenio.save('corregido.pdf', ContentFile(b'%PDF corregido'))
+        self.assertFalse(ArchivoAlmacenado.objects.filter(nombre=anterior).exists())
+        self.assertEqual(self.archivos_en_disco(), [convenio.archivo_convenio.name])
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 1)
+
+    def test_eliminar_convenio_recoge_los_archivos_en_cascada(self):
+        compartido = self.convenio_con_informes()
+        otro = crear_convenio(supervisor=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.archivo_convenio.save('copia.pdf', ContentFile(self.FIRMADO))
+
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('convenios:eliminar_convenio', args=[compartido.pk]))
+        # Sigue en uso por el otro convenio
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 1)
+        self.assertEqual(len(self.archivos_en_disco()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('convenios:eliminar_convenio', args=[otro.pk]))
+        self.assertFalse(ArchivoAlmacenado.objects.exists())
+        self.assertEqual(self.archivos_en_disco(), [])
+
+    @override_settings(ALMACENAMIENTO_GRACIA=300)
+    def test_subida_reciente_no_se_recoge(self):
+        convenio = self.convenio_con_informes(informes=0)
+        anterior = convenio.archivo_convenio.name
+        # Ya es antiguo cuando otra subida del mismo contenido lo renueva y, antes de
+        # que se guarde su fila, el convenio suelta la última referencia
+        ArchivoAlmacenado.objects.update(ultimo_uso=timezone.now() - timedelta(days=1))
+        almacenamiento.almacenamiento_documentos().save('otra-copia.pdf', ContentFile(self.FIRMADO))
+        with self.captureOnCommitCallbacks(execute=True):
+            convenio.archivo_convenio.save('corregido.pdf', ContentFile(b'%PDF corregido'))
+
+        self.assertEqual(ArchivoAlmacenado.objects.get(nombre=anterior).referencias, 0)
+        self.assertIn(anterior, self.archivos_en_disco())
+
+        # Pasado el margen sí se recoge
+        ArchivoAlmacenado.objects.filter(nombre=anterior).update(ultimo_uso=timezone.now() - timedelta(days=1))
+        almacenamiento.eliminar_sin_referencias([anterior], antes_de=timezone.now() - timedelta(minutes=5))
+        self.assertNotIn(anterior, self.archivos_en_disco())
+
+    def test_comando_migra_recuenta_y_limpia(self):
+        self.convenio_con_informes(informes=1)
+        # Archivo subido antes del almacenamiento deduplicado, con el mismo contenido
+        os.makedirs(os.path.join(self.media, 'informes'))
+        with open(os.path.join(self.media, 'informes', 'antiguo.pdf'), 'wb') as archivo:
+            archivo.write(self.FIRMADO)
+        antiguo = crear_informe(Convenio.objects.get(), self.usuario, archivo_informe='informes/antiguo.pdf')
+        # Contenido huérfano y un contador desajustado
+        almacenamiento.almacenamiento_documentos().save('perdido.pdf', ContentFile(b'sin referencias'))
+        ArchivoAlmacenado.objects.filter(tamano=len(self.FIRMADO)).update(referencias=7)
+
+        salida = StringIO()
+        call_command('deduplicar_archivos', antiguedad=0, stdout=salida)
+        salida = salida.getvalue()
+
+        antiguo.refresh_from_db()
+        archivo = ArchivoAlmacenado.objects.get()
+        self.assertEqual(antiguo.archivo_informe.name, archivo.nombre)
+        self.assertEqual(archivo.referencias, 3)
+        self.assertEqual(self.archivos_en_disco(), [archivo.nombre])
+        self.assertIn('archivos anteriores migrados: 1', salida)
+        self.assertIn('contenidos sin referencias eliminados: 1', salida)
+        self.assertIn('1 contenidos distintos para 3 referencias', salida)
+        reporte = almacenamiento.reporte()
+        self.assertEqual(reporte.bytes_ahorrados, 2 * len(self.FIRMADO))
+
+    def test_simulacion_no_toca_nada(self):
+        almacenamiento.almacenamiento_documentos().save('perdido.pdf', ContentFile(b'sin referencias'))
+        antes = self.archivos_en_disco()
+        salida = StringIO()
+        call_command('deduplicar_archivos', simular=True, antiguedad=0, stdout=salida)
+        self.assertIn('(simulación) contenidos sin referencias eliminados: 1', salida.getvalue())
+        self.assertEqual(self.archivos_en_disco(), antes)
+        self.assertTrue(ArchivoAlmacenado.objects.exists())
+
+
+def docx_prueba(*parrafos):
+    contenido = BytesIO()
+    w = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    cuerpo = ''.join(f'<w:p><w:r><w:t>{parrafo}</w:t></w:r></w:p>' for parrafo in parrafos)
+    with zipfile.ZipFile(contenido, 'w') as documento:
+        documento.writestr('word/document.xml', f'<w:document xmlns:w="{w}"><w:body>{cuerpo}</w:body></w:document>')
+    return contenido.getvalue()
+
+
+@override_settings(EXTRACCION_PROCESOS=0)
+class ExtraccionTextoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('revisora')
+        cls.convenio = crear_convenio(supervisor=cls.usuario, empresa_entidad='Acueducto Municipal')
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=directorio.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def subir(self, nombre, contenido, informe=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            informe = informe or crear_informe(self.convenio, self.usuario, archivo_informe=None)
+            informe.archivo_informe.save(nombre, ContentFile(contenido))
+        return informe
+
+    def test_extrae_el_texto_al_subir_y_se_puede_buscar(self):
+        informe = self.subir('avance.txt', 'Cronograma de   mantenimiento hidráulico\n\nfase dos'.encode())
+
+        texto = TextoInforme.objects.get(informe=informe)
+        self.assertEqual(texto.estado, 'extraido')
+        self.assertEqual(texto.texto, 'Cronograma de mantenimiento hidráulico\nfase dos')
+        self.assertEqual(texto.sha256, extraccion.sha256_conocido(informe.archivo_informe.name))
+        self.assertEqual(obtener_backend().buscar('hidraulico'), [self.convenio.pk])
+
+    def test_extrae_docx(self):
+        informe = self.subir('anexo.docx', docx_prueba('Primer párrafo', 'Interventoría técnica'))
+        self.assertEqual(TextoInforme.objects.get(informe=informe).texto, 'Primer párrafo\nInterventoría técnica')
+        self.assertEqual(obtener_backend().buscar('interventoria'), [self.convenio.pk])
+
+    def test_texto_utf8_cortado_a_mitad_de_caracter(self):
+        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as archivo:
+            archivo.write(('a' + 'ñandú ' * 5).encode())
+        self.addCleanup(os.remove, archivo.name)
+        _, estado, texto = textos.extraer(archivo.name, maximo=3)
+        self.assertEqual((estado, texto), ('extraido', 'aña'))
+
+    @override_settings(BUSQUEDA_MAX_CARACTERES_INFORME=30)
+    def test_solo_indexa_el_comienzo_del_texto(self):
+        self.subir('largo.txt', ('inicio ' + 'relleno ' * 10 + 'desenlace').encode())
+        self.assertEqual(obtener_backend().buscar('inicio'), [self.convenio.pk])
+        self.assertEqual(obtener_backend().buscar('desenlace'), [])
+
+    def test_archivos_danados_o_no_soportados(self):
+        danado = self.subir('roto.docx', b'no es un zip')
+        imagen = self.subir('foto.png', b'\x89PNG')
+
+        texto = TextoInforme.objects.get(informe=danado)
+        self.assertEqual((texto.estado, texto.texto), ('error', ''))
+        self.assertIn('BadZipFile', texto.error)
+        self.assertEqual(TextoInforme.objects.get(informe=imagen).estado, 'sin_soporte')
+
+    def test_cambiar_el_archivo_vuelve_a_extraer(self):
+        informe = self.subir('avance.txt', b'primera version')
+        self.subir('avance.txt', b'segunda version', informe=informe)
+        self.assertEqual(TextoInforme.objects.get(informe=informe).texto, 'segunda version')
+        self.assertEqual(obtener_backend().buscar('primera'), [])
+
+    def test_error_al_guardar_sin_pool(self):
+        informe = self.subir('avance.txt', b'primera version')
+        informe.archivo_informe.save('otro.txt', ContentFile(b'segunda version'), save=False)
+        with mock.patch.object(extraccion, 'guardar', side_effect=RuntimeError('base caída')), \
+                self.assertLogs('convenios.extraccion', 'ERROR'):
+            futuro = extraccion.programar(informe.pk, informe.archivo_informe.name)
+        self.assertIsInstance(futuro.exception(), RuntimeError)
+
+    def test_los_listados_no_leen_el_texto(self):
+        self.subir('avance.txt', b'contenido extenso')
+        with CaptureQueriesContext(connection) as consultas:
+            list(Informe.objects.select_related('convenio'))
+        self.assertNotIn(TextoInforme._meta.db_table, consultas[0]['sql'])
+
+    def test_comando_solo_extrae_los_que_cambiaron(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            for i in range(3):
+                informe = crear_informe(self.convenio, self.usuario, archivo_informe=None)
+                informe.archivo_informe.save(f'avance-{i}.txt', ContentFile(f'bitácora número {i}'.encode()))
+
+        salida = StringIO()
+        call_command('extraer_texto_informes', workers=2, stdout=salida)
+        self.assertIn('3 de 3 informes extraídos, 0 sin cambios', salida.getvalue())
+        self.assertEqual(TextoInforme.objects.filter(estado='extraido').count(), 3)
+        self.assertEqual(obtener_backend().buscar('bitacora'), [self.convenio.pk])
+
+        salida = StringIO()
+        call_command('extraer_texto_informes', workers=2, stdout=salida)
+        self.assertIn('0 de 3 informes extraídos, 3 sin cambios', salida.getvalue())
+
+        salida = StringIO()
+        call_command('extraer_texto_informes', workers=0, forzar=True, stdout=salida)
+        self.assertIn('3 de 3 informes extraídos', salida.getvalue())
@@ -0,0 +1,108 @@
+"""
+Extracción del texto plano de los archivos de informes.
+
+Sólo depende de la biblioteca estándar (y de pypdf, opcional, para los PDF):
+se ejecuta en los procesos del pool de ``convenios.extraccion``, que se
+arrancan con ``spawn`` y no cargan Django.
+"""
+import codecs
+import hashlib
+import os
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - dependencia opcional
+    PdfReader = None
+
+BLOQUE = 64 * 1024
+
+EXTRAIDO = 'extraido'
+SIN_SOPORTE = 'sin_soporte'
+ERROR = 'error'
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def pdf_disponible():
+    return PdfReader is not None
+
+
+def resumen_sha256(ruta):
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def _texto_plano(ruta, maximo):
+    with open(ruta, 'rb') as archivo:
+        datos = archivo.read(maximo * 4)
+    try:
+        # Incremental: un carácter de varios bytes cortado al final de lo leído no es un error
+        return codecs.getincrementaldecoder('utf-8')().decode(datos, final=False)
+    except UnicodeDecodeError:
+        return datos.decode('cp1252', errors='replace')
+
+
+def _texto_docx(ruta, maximo):
+    # document.xml se recorre con iterparse: no se carga el árbol completo
+    partes, total = [], 0
+    with zipfile.ZipFile(ruta) as documento, documento.open('word/document.xml') as xml:
+        for _, elemento in ElementTree.iterparse(xml):
+            if elemento.tag == f'{_W}t' and elemento.text:
+                partes.append(elemento.text)
+                total += len(elemento.text)
+            elif elemento.tag == f'{_W}tab':
+                partes.append('\t')
+            elif elemento.tag == f'{_W}p':
+                partes.append('\n')
+                elemento.clear()
+            if total >= maximo:
+                break
+    return ''.join(partes)
+
+
+def _texto_pdf(ruta, maximo):
+    partes, total = [], 0
+    for pagina in PdfReader(ruta).pages:
+        texto = pagina.extract_text() or ''
+        partes.append(texto)
+        total += len(texto)
+        if total >= maximo:
+            break
+    return '\n'.join(partes)
+
+
+EXTRACTORES = {
+    '.txt': _texto_plano,
+    '.csv': _texto_plano,
+    '.md': _texto_plano,
+    '.docx': _texto_docx,
+    '.pdf': _texto_pdf,
+}
+
+
+def extraer(ruta, sha256=None, anterior=None, maximo=500_000):
+    """
+    Devuelve ``(sha256, estado, texto)`` del archivo en ``ruta``. Si no se
+    conoce ``sha256`` se calcula; si coincide con ``anterior`` el archivo no
+    cambió y se devuelve ``(sha256, None, None)`` sin extraer nada. Con
+    estado ``ERROR`` el texto es la descripción del fallo.
+    """
+    sha256 = sha256 or resumen_sha256(ruta)
+    if sha256 == anterior:
+        return sha256, None, None
+    extension = os.path.splitext(ruta)[1].lower()
+    extractor = EXTRACTORES.get(extension)
+    if extractor is None or (extension == '.pdf' and not pdf_disponible()):
+        return sha256, SIN_SOPORTE, ''
+    try:
+        texto = extractor(ruta, maximo)
+    except Exception as exc:  # archivo dañado o con un formato inesperado
+        return sha256, ERROR, f'{type(exc).__name__}: {exc}'[:500]
+    # Espacios colapsados: el índice no los necesita y ocupan la mitad en algunos PDF
+    texto = '\n'.join(' '.join(linea.split()) for linea in texto.splitlines())
+    return sha256, EXTRAIDO, '\n'.join(linea for linea in texto.split('\n') if linea)[:maximo]
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.shortcuts import redirect
-from . import views
+from . import async_views, views
 
 app_name = 'convenios'
 
@@ -11,8 +11,14 @@ urlpatterns = [
     path('', redirect_to_login, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('lista/', views.lista_convenios, name='lista_convenios'),
+    path('async/dashboard/', async_views.dashboard, name='dashboard_async'),
+    path('async/lista/', async_views.lista_convenios, name='lista_convenios_async'),
+    path('exportar/', views.exportar_convenios, name='exportar_convenios'),
     path('<int:convenio_id>/', views.detalle_convenio, name='detalle_convenio'),
+    path('<int:convenio_id>/archivo/', views.descargar_convenio, name='descargar_convenio'),
+    path('informes/<int:informe_id>/archivo/', views.descargar_informe, name='descargar_informe'),
     path('crear/', views.crear_convenio, name='crear_convenio'),
+    path('importar/', views.importar_convenios, name='importar_convenios'),
     path('<int:convenio_id>/editar/', views.editar_convenio, name='editar_convenio'),
     path('<int:convenio_id>/eliminar/', views.eliminar_convenio, name='eliminar_convenio'),
 ]
@@ -1,117 +1,146 @@
+import csv
+import io
+
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
 from django.utils import timezone
+from django.views.decorators.http import require_safe
 from datetime import datetime, timedelta
-from .models import Convenio, Informe, ActividadConvenio
-from usuarios.models import PerfilUsuario, Notificacion
-from supervisores.models import Supervisor
+from .models import Convenio, Informe, ActividadConvenio, DIAS_AVISO_VENCIMIENTO
+from . import contadores, descargas, exportacion, importacion
+from .busqueda import obtener_backend
+from .paginacion import paginar_por_cursor
+from gestion_convenios_ucc.routers import solo_lectura
+
+
+def actividades_recientes():
+    return list(ActividadConvenio.objects.select_related('convenio', 'responsable').order_by('-fecha_creacion')[:5])
+
+
+def convenios_por_vencer_detalle():
+    """Convenios que vencen en los próximos 2 meses"""
+    hoy = timezone.now().date()
+    fecha_limite = hoy + timedelta(days=DIAS_AVISO_VENCIMIENTO)
+    return list(Convenio.objects.filter(
+        fecha_vencimiento__lte=fecha_limite,
+        fecha_vencimiento__gte=hoy
+    ).select_related('supervisor')[:5])
+
+
+def contexto_dashboard(estadisticas, actividades, por_vencer):
+    # Propuestas de estudiantes (simulado)
+    propuestas_estudiantes = 3  # Este valor se puede calcular basado en actividades pendientes
+    
+    return {
+        'total_convenios': estadisticas.convenios.total,
+        'convenios_activos': estadisticas.convenios.activos,
+        'convenios_por_vencer': estadisticas.convenios.por_vencer,
+        'convenios_vencidos': estadisticas.convenios.vencidos,
+        'total_informes': estadisticas.informes.total,
+        'informes_pendientes': estadisticas.informes.pendientes,
+        'informes_aprobados': estadisticas.informes.aprobados,
+        'supervisores_activos': estadisticas.supervisores.activos,
+        'propuestas_estudiantes': propuestas_estudiantes,
+        'actividades_recientes': actividades,
+        'convenios_por_vencer_detalle': por_vencer,
+        'distribucion_tipos': estadisticas.convenios.distribucion_tipos,
+    }
 
 
+@solo_lectura
 def dashboard(request):
     """Vista principal del dashboard"""
-    # Estadísticas generales
-    total_convenios = Convenio.objects.count()
-    convenios_activos = Convenio.objects.filter(estado='activo').count()
-    convenios_por_vencer = Convenio.objects.filter(estado='por_vencer').count()
-    convenios_vencidos = Convenio.objects.filter(estado='vencido').count()
+    # Estadísticas generales: cacheadas, una consulta de agregación por tabla
+    estadisticas = contadores.dashboard()
     
-    # Informes
-    total_informes = Informe.objects.count()
-    informes_pendientes = Informe.objects.filter(estado='pendiente').count()
-    informes_aprobados = Informe.objects.filter(estado='aprobado').count()
+    context = contexto_dashboard(estadisticas, actividades_recientes(), convenios_por_vencer_detalle())
     
-    # Supervisores
-    supervisores_activos = Supervisor.objects.filter(estado='activo').count()
+    return render(request, 'convenios/dashboard.html', context)
+
+
+def filtrar_convenios(convenios, parametros):
+    """Aplica los filtros GET del listado de convenios; devuelve el queryset y los filtros"""
+    filtros = {
+        clave: parametros.get(clave)
+        for clave in ('estado', 'tipo', 'fecha_desde', 'fecha_hasta', 'busqueda')
+    }
     
-    # Propuestas de estudiantes (simulado)
-    propuestas_estudiantes = 3  # Este valor se puede calcular basado en actividades pendientes
+    if filtros['estado'] and filtros['estado'] != 'todos':
+        convenios = convenios.filter(estado=filtros['estado'])
     
-    # Actividades recientes
-    actividades_recientes = ActividadConvenio.objects.select_related('convenio', 'responsable').order_by('-fecha_creacion')[:5]
+    if filtros['tipo'] and filtros['tipo'] != 'todos':
+        convenios = convenios.filter(tipo=filtros['tipo'])
     
-    # Convenios por vencer (próximos 2 meses)
-    fecha_limite = timezone.now().date() + timedelta(days=60)
-    convenios_por_vencer_detalle = Convenio.objects.filter(
-        fecha_vencimiento__lte=fecha_limite,
-        fecha_vencimiento__gte=timezone.now().date()
-    ).select_related('supervisor')[:5]
+    if filtros['fecha_desde']:
+        convenios = convenios.filter(fecha_inicio__gte=filtros['fecha_desde'])
     
-    # Distribución por tipo de convenio
-    distribucion_tipos = Convenio.objects.values('tipo').annotate(total=Count('id'))
+    if filtros['fecha_hasta']:
+        convenios = convenios.filter(fecha_inicio__lte=filtros['fecha_hasta'])
     
-    context = {
-        'total_convenios': total_convenios,
-        'convenios_activos': convenios_activos,
-        'convenios_por_vencer': convenios_por_vencer,
-        'convenios_vencidos': convenios_vencidos,
-        'total_informes': total_informes,
-        'informes_pendientes': informes_pendientes,
-        'informes_aprobados': informes_aprobados,
-        'supervisores_activos': supervisores_activos,
-        'propuestas_estudiantes': propuestas_estudiantes,
-        'actividades_recientes': actividades_recientes,
-        'convenios_por_vencer_detalle': convenios_por_vencer_detalle,
-        'distribucion_tipos': distribucion_tipos,
-    }
+    if filtros['busqueda']:
+        # Índice de texto completo (FTS5 / tsvector) en lugar de LIKE '%...%'
+        convenios = obtener_backend().filtrar(convenios, filtros['busqueda'])
     
-    return render(request, 'convenios/dashboard.html', context)
+    return convenios, filtros
+
+
+ORDEN_CONVENIOS = ('-fecha_creacion', '-id')
+
+
+def contexto_lista_convenios(pagina, filtros, estadisticas):
+    return {
+        'convenios': pagina,
+        'pagina': pagina,
+        'convenios_activos_count': estadisticas.activos,
+        'convenios_por_vencer_count': estadisticas.por_vencer,
+        'convenios_vencidos_count': estadisticas.vencidos,
+        'filtros': filtros,
+        'exportacion_xlsx': exportacion.xlsx_disponible(),
+    }
 
 
+@solo_lectura
 @login_required
 def lista_convenios(request):
     """Vista para listar todos los convenios"""
-    convenios = Convenio.objects.select_related('supervisor').order_by('-fecha_creacion')
-    
-    # Filtros
-    estado = request.GET.get('estado')
-    tipo = request.GET.get('tipo')
-    fecha_desde = request.GET.get('fecha_desde')
-    fecha_hasta = request.GET.get('fecha_hasta')
-    busqueda = request.GET.get('busqueda')
-    
-    if estado and estado != 'todos':
-        convenios = convenios.filter(estado=estado)
-    
-    if tipo and tipo != 'todos':
-        convenios = convenios.filter(tipo=tipo)
+    convenios = Convenio.objects.select_related('supervisor')
     
-    if fecha_desde:
-        convenios = convenios.filter(fecha_inicio__gte=fecha_desde)
+    convenios, filtros = filtrar_convenios(convenios, request.GET)
     
-    if fecha_hasta:
-        convenios = convenios.filter(fecha_inicio__lte=fecha_hasta)
-    
-    if busqueda:
-        convenios = convenios.filter(
-            Q(empresa_entidad__icontains=busqueda) |
-            Q(supervisor__first_name__icontains=busqueda) |
-            Q(supervisor__last_name__icontains=busqueda)
-        )
+    # Paginación por cursor: los filtros viajan como parámetros GET estables
+    pagina = paginar_por_cursor(convenios, request, orden=ORDEN_CONVENIOS)
     
     # Estadísticas para las tarjetas
-    convenios_activos_count = Convenio.objects.filter(estado='activo').count()
-    convenios_por_vencer_count = Convenio.objects.filter(estado='por_vencer').count()
-    convenios_vencidos_count = Convenio.objects.filter(estado='vencido').count()
+    estadisticas = contadores.obtener('convenios')
     
-    context = {
-        'convenios': convenios,
-        'convenios_activos_count': convenios_activos_count,
-        'convenios_por_vencer_count': convenios_por_vencer_count,
-        'convenios_vencidos_count': convenios_vencidos_count,
-        'filtros': {
-            'estado': estado,
-            'tipo': tipo,
-            'fecha_desde': fecha_desde,
-            'fecha_hasta': fecha_hasta,
-            'busqueda': busqueda,
-        }
-    }
+    context = contexto_lista_convenios(pagina, filtros, estadisticas)
     
     return render(request, 'convenios/lista_convenios.html', context)
 
 
+@solo_lectura
+@login_required
+def exportar_convenios(request):
+    """Descarga en CSV o XLSX el listado de convenios con los mismos filtros"""
+    convenios, _ = filtrar_convenios(Convenio.objects.all(), request.GET)
+    # El archivo se genera después de salir de la vista: se fija ya la base de lectura
+    convenios = convenios.using(convenios.db)
+    formato = request.GET.get('formato', 'csv')
+    
+    if formato == 'xlsx':
+        if not exportacion.xlsx_disponible():
+            return HttpResponseBadRequest('La exportación a XLSX requiere openpyxl.')
+        return exportacion.respuesta_xlsx(convenios)
+    if formato == 'csv':
+        return exportacion.respuesta_csv(convenios)
+    return HttpResponseBadRequest('Formato no soportado.')
+
+
+@solo_lectura
 @login_required
 def detalle_convenio(request, convenio_id):
     """Vista para mostrar el detalle de un convenio"""
@@ -128,6 +157,37 @@ def detalle_convenio(request, convenio_id):
     return render(request, 'convenios/detalle_convenio.html', context)
 
 
+@solo_lectura
+@login_required
+@require_safe
+def descargar_convenio(request, convenio_id):
+    """Vista para descargar el archivo firmado de un convenio"""
+    convenio = get_object_or_404(Convenio.objects.only('id', 'supervisor_id', 'archivo_convenio'), id=convenio_id)
+    if not descargas.puede_ver_convenio(request.user, convenio):
+        raise PermissionDenied
+    
+    return descargas.respuesta_archivo(
+        request, convenio.archivo_convenio, descargar='descargar' in request.GET, nombre=f'convenio-{convenio.id}',
+    )
+
+
+@solo_lectura
+@login_required
+@require_safe
+def descargar_informe(request, informe_id):
+    """Vista para descargar el archivo de un informe"""
+    informe = get_object_or_404(
+        Informe.objects.select_related('convenio').only('id', 'supervisor_id', 'archivo_informe', 'convenio__supervisor_id'),
+        id=informe_id,
+    )
+    if not descargas.puede_ver_informe(request.user, informe):
+        raise PermissionDenied
+    
+    return descargas.respuesta_archivo(
+        request, informe.archivo_informe, descargar='descargar' in request.GET, nombre=f'informe-{informe.id}',
+    )
+
+
 @login_required
 def crear_convenio(request):
     """Vista para crear un nuevo convenio"""
@@ -144,6 +204,36 @@ def crear_convenio(request):
     return render(request, 'convenios/crear_convenio.html', context)
 
 
+@login_required
+def importar_convenios(request):
+    """Vista para importar convenios en lote desde un archivo CSV"""
+    resultado = None
+    
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            messages.error(request, 'Seleccione un archivo CSV.')
+        else:
+            # Se lee como texto sobre el archivo subido, sin cargarlo completo en memoria
+            texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            try:
+                resultado = importacion.importar_convenios(texto, simular='simular' in request.POST)
+            except (importacion.ErrorImportacion, UnicodeDecodeError, csv.Error) as exc:
+                messages.error(request, f'No se pudo importar el archivo: {exc}')
+            finally:
+                texto.detach()
+    
+    context = {
+        'resultado': resultado,
+        'errores': resultado.errores[:importacion.ERRORES_A_MOSTRAR] if resultado else [],
+        'errores_omitidos': max(0, resultado.con_error - importacion.ERRORES_A_MOSTRAR) if resultado else 0,
+        'columnas_obligatorias': importacion.COLUMNAS_OBLIGATORIAS,
+        'columnas_opcionales': importacion.COLUMNAS_OPCIONALES,
+    }
+    
+    return render(request, 'convenios/importar_convenios.html', context)
+
+
 @login_required
 def editar_convenio(request, convenio_id):
     """Vista para editar un convenio existente"""
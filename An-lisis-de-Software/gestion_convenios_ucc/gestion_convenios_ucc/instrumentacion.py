@@ -0,0 +1,204 @@
+"""
+Consultas SQL y latencia de cada petición.
+
+``ConsultasSQLMiddleware`` mide cada petición sin depender de ``DEBUG``: en
+lugar de ``connection.queries`` (que con ``DEBUG = True`` guarda todas las
+consultas del proceso) instala con ``connection.execute_wrapper`` una función
+que sólo suma en la ``MedicionSQL`` de la petición en curso el número de
+consultas, el tiempo de SQL y cuántas veces se repite cada forma de consulta
+(el SQL con los literales y las listas de ``IN`` normalizados). Una forma que
+se repite ``SQL_UMBRAL_REPETIDAS`` veces o más suele ser un N+1.
+
+La medición vive en un ``ContextVar``, así que también llega a las consultas
+que las vistas asíncronas hacen con ``sync_to_async``. Al terminar se añade
+la cabecera ``Server-Timing`` (si ``SQL_SERVER_TIMING``, o con ``DEBUG`` si
+vale ``None``: la ven todos los clientes), se escribe una
+línea ``clave=valor`` en el logger ``gestion_convenios_ucc.instrumentacion``
+con la vista resuelta (p. ej. ``convenios:dashboard``) y se avisa con un
+``warning`` si se superó el presupuesto de consultas de la vista
+(``SQL_PRESUPUESTO_POR_VISTA`` o ``SQL_PRESUPUESTO_CONSULTAS``) o hubo
+consultas repetidas. Las consultas que una respuesta en streaming hace
+después de devolverse no se cuentan.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+SIN_RUTA = '<sin_ruta>'
+# Formas distintas que se recuerdan por petición: acota la memoria de las peticiones enormes
+MAXIMO_FORMAS = 200
+
+_medicion = ContextVar('medicion_sql', default=None)
+
+_LISTA_IN = re.compile(r'\bIN\s*\((?:\s*%s\s*,)*\s*%s\s*\)', re.IGNORECASE)
+_CADENA = re.compile(r"'(?:[^']|'')*'")
+_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_ESPACIOS = re.compile(r'\s+')
+
+
+def activa():
+    return getattr(settings, 'SQL_INSTRUMENTACION_ACTIVA', True)
+
+
+def presupuesto(vista):
+    por_vista = getattr(settings, 'SQL_PRESUPUESTO_POR_VISTA', {})
+    return por_vista.get(vista, getattr(settings, 'SQL_PRESUPUESTO_CONSULTAS', 30))
+
+
+def server_timing():
+    valor = getattr(settings, 'SQL_SERVER_TIMING', None)
+    return settings.DEBUG if valor is None else valor
+
+
+def umbral_repetidas():
+    return getattr(settings, 'SQL_UMBRAL_REPETIDAS', 5)
+
+
+def forma(sql):
+    """SQL sin los valores concretos: dos consultas con la misma forma sólo cambian de parámetros"""
+    sql = _LISTA_IN.sub('IN (%s...)', sql)
+    sql = _CADENA.sub('?', sql)
+    sql = _NUMERO.sub('?', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+@dataclass
+class MedicionSQL:
+    consultas: int = 0
+    tiempo_sql: float = 0.0
+    formas: Counter = field(default_factory=Counter)
+    # Las vistas asíncronas consultan desde varios hilos a la vez (convenios/concurrencia.py)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def anotar(self, sql, segundos):
+        clave = forma(sql)
+        with self._lock:
+            self.consultas += 1
+            self.tiempo_sql += segundos
+            if clave in self.formas or len(self.formas) < MAXIMO_FORMAS:
+                self.formas[clave] += 1
+
+    def repetidas(self, umbral):
+        """Formas que se ejecutaron al menos ``umbral`` veces, de la más repetida a la menos"""
+        return [(sql, veces) for sql, veces in self.formas.most_common() if veces >= umbral]
+
+
+def _medir(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.anotar(sql, time.perf_counter() - inicio)
+
+
+def instalar(conexion):
+    # Una sola vez por conexión: la lista de envoltorios sobrevive a reconexiones
+    if _medir not in conexion.execute_wrappers:
+        conexion.execute_wrappers.append(_medir)
+
+
+@receiver(connection_created)
+def instalar_en_conexion_nueva(sender, connection, **kwargs):
+    # Conexiones abiertas por otros hilos (p. ej. los de sync_to_async)
+    instalar(connection)
+
+
+def nombre_vista(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return SIN_RUTA
+    return coincidencia.view_name
+
+
+class ConsultasSQLMiddleware:
+    """Cuenta las consultas y el tiempo de SQL de cada petición y los publica"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not activa():
+            return self.get_response(request)
+        token, inicio = self._empezar(request)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, respuesta, inicio)
+
+    async def __acall__(self, request):
+        if not activa():
+            return await self.get_response(request)
+        token, inicio = self._empezar(request)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, respuesta, inicio)
+
+    @staticmethod
+    def _empezar(request):
+        for conexion in connections.all(initialized_only=True):
+            instalar(conexion)
+        request.medicion_sql = MedicionSQL()
+        return _medicion.set(request.medicion_sql), time.perf_counter()
+
+    @staticmethod
+    def _terminar(request, respuesta, inicio):
+        total = time.perf_counter() - inicio
+        medicion = request.medicion_sql
+        vista = nombre_vista(request)
+        repetidas = medicion.repetidas(umbral_repetidas())
+
+        if server_timing():
+            metricas = (
+                f'sql;dur={medicion.tiempo_sql * 1000:.1f};desc="{medicion.consultas} consultas", '
+                f'total;dur={total * 1000:.1f}'
+            )
+            anterior = respuesta.headers.get('Server-Timing')
+            respuesta.headers['Server-Timing'] = f'{anterior}, {metricas}' if anterior else metricas
+
+        datos = {
+            'vista': vista,
+            'metodo': request.method,
+            'estado': respuesta.status_code,
+            'consultas': medicion.consultas,
+            'sql_ms': round(medicion.tiempo_sql * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'repetidas': len(repetidas),
+        }
+        logger.info(' '.join(f'{clave}={valor}' for clave, valor in datos.items()), extra={'sql': datos})
+
+        limite = presupuesto(vista)
+        if limite is not None and medicion.consultas > limite:
+            logger.warning(
+                'vista=%s consultas=%d presupuesto=%d: se superó el presupuesto de consultas',
+                vista, medicion.consultas, limite, extra={'sql': datos},
+            )
+        for sql, veces in repetidas[:3]:
+            logger.warning(
+                'vista=%s repeticiones=%d posible N+1: %s', vista, veces, sql[:300], extra={'sql': datos},
+            )
+        return respuesta
@@ -0,0 +1,327 @@
+"""
+Métricas en formato de texto de Prometheus.
+
+``MetricasMiddleware`` observa cada petición en histogramas de latencia por
+vista y estado HTTP y, con ``request.medicion_sql`` de
+``gestion_convenios_ucc.instrumentacion``, de consultas y tiempo de SQL;
+los backends ``*Medida`` cuentan los aciertos y fallos de la caché. Todo se
+acumula en un diccionario en memoria del proceso, sin tocar la base de datos.
+
+Cada ``METRICAS_INTERVALO_VOLCADO`` segundos un hilo del proceso
+(``segundo_plano.VolcadoPeriodico``), y también al exponer y al terminar el
+proceso, suma ese buffer con un ``UPSERT`` en el archivo SQLite
+``METRICAS_ARCHIVO``, que comparten todos los workers de la máquina: la vista
+``/metrics`` lee de él el total de todos los procesos sin servicios externos.
+Las filas de ``Convenio``, ``Informe`` y ``Notificacion`` se cuentan como
+mucho una vez cada ``METRICAS_INTERVALO_TABLAS`` segundos entre todos los
+procesos y se guardan en el mismo archivo.
+
+Los contadores del archivo nunca se reinician (Prometheus tolera que crezcan
+sin límite); borrar el archivo los pone a cero.
+"""
+import atexit
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import closing
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from .instrumentacion import nombre_vista
+from .segundo_plano import VolcadoPeriodico
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LIMITES_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 30, 50, 100)
+LIMITES_SQL = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+FAMILIAS = {
+    'peticiones_duracion_segundos': ('histogram', 'Duración de las peticiones por vista y estado HTTP.'),
+    'peticiones_consultas_sql': ('histogram', 'Consultas SQL por petición.'),
+    'peticiones_sql_segundos': ('histogram', 'Tiempo de SQL por petición.'),
+    'cache_aciertos_total': ('counter', 'Lecturas de la caché que encontraron la clave.'),
+    'cache_fallos_total': ('counter', 'Lecturas de la caché que no encontraron la clave.'),
+    'tabla_filas': ('gauge', 'Filas de las tablas principales, muestreadas cada METRICAS_INTERVALO_TABLAS segundos.'),
+}
+SUFIJOS_HISTOGRAMA = ('_bucket', '_sum', '_count')
+
+TABLAS = ('convenios.Convenio', 'convenios.Informe', 'usuarios.Notificacion')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    nombre TEXT NOT NULL,
+    etiquetas TEXT NOT NULL,
+    valor REAL NOT NULL,
+    PRIMARY KEY (nombre, etiquetas)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS medidores (
+    nombre TEXT NOT NULL,
+    etiquetas TEXT NOT NULL,
+    valor REAL NOT NULL,
+    momento REAL NOT NULL,
+    PRIMARY KEY (nombre, etiquetas)
+) WITHOUT ROWID;
+"""
+
+_lock = threading.Lock()
+_pendientes = defaultdict(float)
+
+_LE = re.compile(r',?le="([^"]*)"$')
+
+
+def activas():
+    return getattr(settings, 'METRICAS_ACTIVAS', True)
+
+
+def archivo():
+    return str(settings.METRICAS_ARCHIVO)
+
+
+def intervalo_volcado():
+    return getattr(settings, 'METRICAS_INTERVALO_VOLCADO', 10)
+
+
+def intervalo_tablas():
+    return getattr(settings, 'METRICAS_INTERVALO_TABLAS', 300)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def etiquetas(**valores):
+    return ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in valores.items())
+
+
+def _numero(valor):
+    if valor == int(valor):
+        return str(int(valor))
+    return repr(valor)
+
+
+def sumar(nombre, valor=1, **etiquetas_serie):
+    with _lock:
+        _pendientes[(nombre, etiquetas(**etiquetas_serie))] += valor
+
+
+def observar(nombre, valor, limites, **etiquetas_serie):
+    """Anota ``valor`` en el histograma ``nombre`` (cubetas acumuladas, suma y cuenta)"""
+    base = etiquetas(**etiquetas_serie)
+    separador = ',' if base else ''
+    with _lock:
+        for limite in limites:
+            if valor <= limite:
+                _pendientes[(f'{nombre}_bucket', f'{base}{separador}le="{float(limite)!r}"')] += 1
+        _pendientes[(f'{nombre}_bucket', f'{base}{separador}le="+Inf"')] += 1
+        _pendientes[(f'{nombre}_sum', base)] += valor
+        _pendientes[(f'{nombre}_count', base)] += 1
+
+
+def _conectar():
+    conexion = sqlite3.connect(archivo(), timeout=5)
+    conexion.execute('PRAGMA journal_mode=WAL')
+    conexion.execute('PRAGMA synchronous=NORMAL')
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+
+def volcar():
+    """Suma lo acumulado por este proceso en el archivo compartido; devuelve cuántas series se escribieron"""
+    with _lock:
+        series = dict(_pendientes)
+        _pendientes.clear()
+    if not series:
+        return 0
+
+    try:
+        with closing(_conectar()) as conexion, conexion:
+            conexion.executemany(
+                'INSERT INTO series (nombre, etiquetas, valor) VALUES (?, ?, ?) '
+                'ON CONFLICT (nombre, etiquetas) DO UPDATE SET valor = valor + excluded.valor',
+                [(nombre, etiquetas_serie, valor) for (nombre, etiquetas_serie), valor in series.items()],
+            )
+    except sqlite3.Error:
+        # Se reintenta en el siguiente volcado
+        with _lock:
+            for clave, valor in series.items():
+                _pendientes[clave] += valor
+        logger.exception('No se pudieron volcar %d series de métricas en %s', len(series), archivo())
+        return 0
+    return len(series)
+
+
+volcado = VolcadoPeriodico('volcado-metricas', volcar, intervalo_volcado)
+
+
+@atexit.register
+def _volcar_al_salir():
+    if not _pendientes:
+        return
+    try:
+        volcar()
+    except Exception:  # el proceso está terminando: sólo se deja constancia
+        logger.exception('No se pudieron volcar las métricas al terminar')
+
+
+def muestrear_tablas(forzar=False):
+    """Cuenta las filas de ``TABLAS`` si la última muestra (de cualquier proceso) es antigua"""
+    ahora = time.time()
+    with closing(_conectar()) as conexion, conexion:
+        # La marca se toma antes de contar: los demás procesos no repiten el conteo
+        reservado = conexion.execute(
+            "UPDATE medidores SET momento = ? WHERE nombre = 'tabla_filas' AND momento <= ?",
+            (ahora, ahora - (0 if forzar else intervalo_tablas())),
+        ).rowcount
+        existentes = conexion.execute("SELECT COUNT(*) FROM medidores WHERE nombre = 'tabla_filas'").fetchone()[0]
+    if not reservado and existentes >= len(TABLAS):
+        return False
+
+    filas = [
+        ('tabla_filas', etiquetas(tabla=modelo._meta.db_table), modelo.objects.count(), ahora)
+        for modelo in map(apps.get_model, TABLAS)
+    ]
+    with closing(_conectar()) as conexion, conexion:
+        conexion.executemany(
+            'INSERT INTO medidores (nombre, etiquetas, valor, momento) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (nombre, etiquetas) DO UPDATE SET valor = excluded.valor, momento = excluded.momento',
+            filas,
+        )
+    return True
+
+
+def _familia(nombre):
+    for sufijo in SUFIJOS_HISTOGRAMA:
+        base = nombre.removesuffix(sufijo)
+        if base != nombre and FAMILIAS.get(base, ('',))[0] == 'histogram':
+            return base
+    return nombre
+
+
+def _orden(serie):
+    # Cubetas de menor a mayor límite, seguidas de la suma y la cuenta de cada serie
+    nombre, etiquetas_serie, _ = serie
+    coincidencia = _LE.search(etiquetas_serie)
+    if coincidencia is not None:
+        return etiquetas_serie[:coincidencia.start()], 0, float(coincidencia.group(1))
+    return etiquetas_serie, 2 if nombre.endswith('_count') else 1, 0.0
+
+
+def exponer():
+    """Texto de Prometheus con el total de todos los procesos"""
+    volcar()
+    try:
+        muestrear_tablas()
+    except Exception:  # una base caída no debe dejar sin el resto de métricas
+        logger.exception('No se pudieron contar las filas de las tablas')
+    with closing(_conectar()) as conexion:
+        filas = conexion.execute(
+            'SELECT nombre, etiquetas, valor FROM series UNION ALL SELECT nombre, etiquetas, valor FROM medidores',
+        ).fetchall()
+
+    por_familia = defaultdict(list)
+    for fila in filas:
+        por_familia[_familia(fila[0])].append(fila)
+    lineas = []
+    for familia in sorted(por_familia):
+        tipo, ayuda = FAMILIAS.get(familia, ('untyped', ''))
+        lineas += [f'# HELP {familia} {ayuda}', f'# TYPE {familia} {tipo}']
+        for nombre, etiquetas_serie, valor in sorted(por_familia[familia], key=_orden):
+            serie = f'{nombre}{{{etiquetas_serie}}}' if etiquetas_serie else nombre
+            lineas.append(f'{serie} {_numero(valor)}')
+    return '\n'.join(lineas) + '\n'
+
+
+def _autorizado(request):
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    if token:
+        return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICAS_IPS_PERMITIDAS', ())
+
+
+@require_safe
+def vista_metricas(request):
+    """Métricas de todos los workers para Prometheus"""
+    if not _autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(exponer(), content_type=CONTENT_TYPE)
+
+
+class CacheMedida:
+    """Cuenta los aciertos y fallos de un backend de caché (``get_many`` y ``get_or_set`` pasan por ``get``)"""
+
+    _ausente = object()
+
+    def get(self, key, default=None, version=None):
+        valor = super().get(key, self._ausente, version)
+        if valor is self._ausente:
+            if activas():
+                sumar('cache_fallos_total')
+            return default
+        if activas():
+            sumar('cache_aciertos_total')
+        return valor
+
+
+class LocMemCacheMedida(CacheMedida, LocMemCache):
+    """Caché en memoria de cada proceso, para desarrollo y pruebas"""
+
+
+class FileBasedCacheMedida(CacheMedida, FileBasedCache):
+    """Caché en archivos que comparten todos los procesos de la máquina"""
+
+
+class MetricasMiddleware:
+    """Observa la latencia, las consultas y el tiempo de SQL de cada petición"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not activas():
+            return self.get_response(request)
+        inicio = time.perf_counter()
+        respuesta = self.get_response(request)
+        self._observar(request, respuesta, inicio)
+        return respuesta
+
+    async def __acall__(self, request):
+        if not activas():
+            return await self.get_response(request)
+        inicio = time.perf_counter()
+        respuesta = await self.get_response(request)
+        self._observar(request, respuesta, inicio)
+        return respuesta
+
+    @staticmethod
+    def _observar(request, respuesta, inicio):
+        vista = nombre_vista(request)
+        observar(
+            'peticiones_duracion_segundos', time.perf_counter() - inicio, LIMITES_DURACION,
+            vista=vista, estado=respuesta.status_code,
+        )
+        # Medido por ConsultasSQLMiddleware, que va después en MIDDLEWARE
+        medicion = getattr(request, 'medicion_sql', None)
+        if medicion is not None:
+            observar('peticiones_consultas_sql', medicion.consultas, LIMITES_CONSULTAS, vista=vista)
+            observar('peticiones_sql_segundos', medicion.tiempo_sql, LIMITES_SQL, vista=vista)
+        volcado.asegurar()
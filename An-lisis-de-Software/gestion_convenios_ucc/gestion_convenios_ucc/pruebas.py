@@ -0,0 +1,34 @@
+"""
+Ejecutor de las pruebas del proyecto.
+
+Igual que el de Django, pero aparta en un directorio temporal el archivo de
+métricas que comparten los procesos (``METRICAS_ARCHIVO``): las peticiones de
+las pruebas no deben sumar en el de la instalación. Tampoco arranca los hilos
+de ``segundo_plano``: escribirían con su propia conexión mientras cada prueba
+tiene abierta su transacción.
+"""
+import os
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import metricas
+
+
+class EjecutorPruebas(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directorio = tempfile.TemporaryDirectory()
+        self._ajustes = override_settings(
+            METRICAS_ARCHIVO=os.path.join(self._directorio.name, 'metricas.sqlite3'),
+            VOLCADOS_EN_SEGUNDO_PLANO=False,
+        )
+        self._ajustes.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Lo pendiente se vuelca aquí y no al salir del proceso en el archivo real
+        metricas.volcar()
+        self._ajustes.disable()
+        self._directorio.cleanup()
+        super().teardown_test_environment(**kwargs)
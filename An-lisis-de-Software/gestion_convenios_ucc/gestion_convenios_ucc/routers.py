@@ -0,0 +1,147 @@
+"""
+Enrutamiento de lecturas hacia réplicas.
+
+Sólo las vistas marcadas con ``@solo_lectura`` (dashboard, listados, detalles
+y exportaciones) leen de las réplicas de ``REPLICAS_LECTURA``, elegidas por
+turnos; todo lo demás, y cualquier escritura, va a ``default``.
+
+Para que cada usuario lea sus propias escrituras a pesar del retraso de
+replicación, ``PrimariaTrasEscrituraMiddleware`` deja una cookie tras cada
+petición que modifica datos (POST, PUT, PATCH, DELETE) y, mientras dura
+``REPLICA_VENTANA_PRIMARIA``, las vistas de sólo lectura de ese usuario
+también leen de la primaria. Lo que se calcula para guardarlo en una caché
+compartida (los contadores del dashboard) se lee dentro de ``en_primaria``,
+para no publicar un valor atrasado a todos los usuarios.
+
+Para probarlo en local con dos archivos SQLite basta con copiar
+``db.sqlite3`` y definir ``DJANGO_REPLICA_SQLITE`` con la ruta de la copia.
+Las pruebas se ejecutan sin esa variable: ``ReplicaSQLiteTests`` monta su
+propia réplica en un archivo temporal.
+"""
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PRIMARIA = DEFAULT_DB_ALIAS
+COOKIE_PRIMARIA = 'leer_primaria_hasta'
+METODOS_SEGUROS = frozenset({'GET', 'HEAD', 'OPTIONS', 'TRACE'})
+
+_lectura = ContextVar('lectura_en_replica', default=False)
+_primaria = ContextVar('forzar_primaria', default=False)
+_turno = itertools.count()
+
+
+def replicas():
+    return list(getattr(settings, 'REPLICAS_LECTURA', []))
+
+
+def ventana_primaria():
+    return getattr(settings, 'REPLICA_VENTANA_PRIMARIA', 10)
+
+
+def solo_lectura(vista):
+    """Marca una vista (síncrona o asíncrona) cuyas lecturas pueden ir a una réplica"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura(*args, **kwargs):
+            token = _lectura.set(True)
+            try:
+                return await vista(*args, **kwargs)
+            finally:
+                _lectura.reset(token)
+    else:
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            token = _lectura.set(True)
+            try:
+                return vista(*args, **kwargs)
+            finally:
+                _lectura.reset(token)
+    return envoltura
+
+
+@contextmanager
+def en_primaria():
+    """Lee de la primaria dentro del bloque, aunque se esté en una vista de sólo lectura"""
+    token = _primaria.set(True)
+    try:
+        yield
+    finally:
+        _primaria.reset(token)
+
+
+class RouterReplicas:
+    def db_for_read(self, model, **hints):
+        if not _lectura.get() or _primaria.get():
+            return PRIMARIA
+        disponibles = replicas()
+        if not disponibles:
+            return PRIMARIA
+        return disponibles[next(_turno) % len(disponibles)]
+
+    def db_for_write(self, model, **hints):
+        # Explícito: sin esto Django escribiría en la base de la que se leyó la instancia
+        return PRIMARIA
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {PRIMARIA, *replicas()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación, no por migrate
+        return db not in replicas()
+
+
+class PrimariaTrasEscrituraMiddleware:
+    """Fija en la primaria las lecturas de quien acaba de escribir"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _primaria.set(self._leer_primaria(request))
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _primaria.reset(token)
+        return self._marcar(request, respuesta)
+
+    async def __acall__(self, request):
+        token = _primaria.set(self._leer_primaria(request))
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _primaria.reset(token)
+        return self._marcar(request, respuesta)
+
+    @staticmethod
+    def _leer_primaria(request):
+        try:
+            return float(request.COOKIES.get(COOKIE_PRIMARIA, 0)) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _marcar(request, respuesta):
+        ventana = ventana_primaria()
+        if request.method not in METODOS_SEGUROS and ventana and replicas():
+            respuesta.set_cookie(
+                COOKIE_PRIMARIA, f'{time.time() + ventana:.0f}',
+                max_age=ventana, httponly=True, samesite='Lax',
+            )
+        return respuesta
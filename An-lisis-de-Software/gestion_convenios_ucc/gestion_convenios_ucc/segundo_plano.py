@@ -0,0 +1,152 @@
+"""
+Trabajo de cada proceso que no debe hacerse dentro de una petición.
+
+``VolcadoPeriodico`` escribe cada cierto tiempo, desde un hilo daemon, lo que
+los middlewares acumulan en memoria (el último acceso de los usuarios, las
+métricas): la petición sólo anota en el buffer y nunca espera el bloqueo de
+escritura de SQLite. El hilo arranca con la primera anotación del proceso, y
+de nuevo en cada proceso hijo si el servidor hace ``fork`` después.
+
+Con ``VOLCADOS_EN_SEGUNDO_PLANO = False`` no se arranca ningún hilo y sólo se
+vuelca al terminar el proceso o al llamar a ``volcar``; así corren las pruebas
+(ver ``gestion_convenios_ucc.pruebas``), cuyas transacciones no ve otro hilo.
+
+``PoolProcesos`` y ``ejecutar_todos`` reparten en procesos el trabajo de CPU
+que se encarga al subir un archivo (miniaturas, extracción de texto) y el de
+los comandos que lo rehacen en lote. Al terminar el proceso se espera a las
+tareas encoladas: cancelarlas dejaría miniaturas o textos sin generar en cada
+reinicio de un worker, hasta que alguien ejecutara esos comandos.
+"""
+import atexit
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def activos():
+    return getattr(settings, 'VOLCADOS_EN_SEGUNDO_PLANO', True)
+
+
+class VolcadoPeriodico:
+    """Llama a ``volcar`` cada ``intervalo()`` segundos en un hilo daemon del proceso"""
+
+    def __init__(self, nombre, volcar, intervalo):
+        self.nombre = nombre
+        self._volcar = volcar
+        self._intervalo = intervalo
+        self._lock = threading.Lock()
+        self._pid = None
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def asegurar(self):
+        """Arranca el hilo si este proceso aún no lo tiene; lo demás es una comparación"""
+        if self._pid == os.getpid() or not activos():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._parar = threading.Event()
+            self._hilo = threading.Thread(target=self._bucle, args=(self._parar,), name=self.nombre, daemon=True)
+            self._hilo.start()
+            self._pid = os.getpid()
+
+    def detener(self):
+        with self._lock:
+            self._parar.set()
+            if self._hilo is not None and self._pid == os.getpid():
+                self._hilo.join()
+            self._hilo = self._pid = None
+
+    def _bucle(self, parar):
+        while not parar.wait(max(self._intervalo(), 0.1)):
+            try:
+                self._volcar()
+            except Exception:  # el hilo sigue: lo pendiente se reintenta en la siguiente vuelta
+                logger.exception('Falló el volcado periódico %s', self.nombre)
+            finally:
+                close_old_connections()
+
+
+def crear_pool(trabajadores):
+    # spawn: los hijos no heredan hilos ni conexiones del servidor
+    return ProcessPoolExecutor(max_workers=trabajadores, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _al_terminar(al_terminar, al_fallar, futuro):
+    # Se ejecuta en un hilo del ejecutor, con su propia conexión
+    try:
+        al_terminar(futuro.result())
+    except Exception:
+        al_fallar()
+    finally:
+        close_old_connections()
+
+
+class PoolProcesos:
+    """Pool de ``procesos()`` procesos que se crea con la primera tarea"""
+
+    def __init__(self, procesos):
+        self.procesos = procesos
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _obtener(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = crear_pool(self.procesos())
+                atexit.register(self._pool.shutdown, wait=True)
+            return self._pool
+
+    def programar(self, funcion, argumentos, al_terminar, al_fallar):
+        """
+        Ejecuta ``funcion(*argumentos)`` en el pool sin esperarla y pasa el
+        resultado a ``al_terminar``; si algo falla se llama a ``al_fallar``
+        dentro del ``except``. Con ``procesos()`` a 0 todo ocurre aquí mismo.
+        """
+        if not self.procesos():
+            futuro = Future()
+            try:
+                resultado = funcion(*argumentos)
+                al_terminar(resultado)
+            except Exception as exc:
+                al_fallar()
+                futuro.set_exception(exc)
+            else:
+                futuro.set_result(resultado)
+            return futuro
+        futuro = self._obtener().submit(funcion, *argumentos)
+        futuro.add_done_callback(functools.partial(_al_terminar, al_terminar, al_fallar))
+        return futuro
+
+
+def ejecutar_todos(funcion, tareas, trabajadores, al_terminar, al_fallar):
+    """
+    Ejecuta ``funcion(*argumentos)`` para cada ``(clave, argumentos)`` de
+    ``tareas`` en un pool de ``trabajadores`` procesos (aquí mismo con 0 o con
+    una sola tarea) y pasa, desde este hilo, cada resultado a
+    ``al_terminar(clave, resultado)``; si algo falla se llama a
+    ``al_fallar(clave)`` dentro del ``except``.
+    """
+    if not trabajadores or len(tareas) < 2:
+        for clave, argumentos in tareas:
+            try:
+                al_terminar(clave, funcion(*argumentos))
+            except Exception:
+                al_fallar(clave)
+        return
+    with crear_pool(min(trabajadores, len(tareas))) as pool:
+        futuros = {pool.submit(funcion, *argumentos): clave for clave, argumentos in tareas}
+        for futuro in as_completed(futuros):
+            try:
+                al_terminar(futuros[futuro], futuro.result())
+            except Exception:
+                al_fallar(futuros[futuro])
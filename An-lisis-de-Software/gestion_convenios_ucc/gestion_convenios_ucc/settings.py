@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,10 +47,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'gestion_convenios_ucc.metricas.MetricasMiddleware',
+    'gestion_convenios_ucc.instrumentacion.ConsultasSQLMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'gestion_convenios_ucc.routers.PrimariaTrasEscrituraMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'usuarios.actividad.UltimoAccesoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'usuarios.context_processors.notificaciones',
             ],
         },
     },
@@ -71,6 +79,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'gestion_convenios_ucc.wsgi.application'
 
+TEST_RUNNER = 'gestion_convenios_ucc.pruebas.EjecutorPruebas'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -82,6 +92,139 @@ DATABASES = {
     }
 }
 
+# Réplicas de lectura (ver gestion_convenios_ucc/routers.py). Las vistas de
+# sólo lectura reparten sus consultas entre REPLICAS_LECTURA; quien acaba de
+# escribir lee de la primaria durante REPLICA_VENTANA_PRIMARIA segundos.
+
+DATABASE_ROUTERS = ['gestion_convenios_ucc.routers.RouterReplicas']
+REPLICAS_LECTURA = []
+REPLICA_VENTANA_PRIMARIA = 10
+
+if os.environ.get('DJANGO_REPLICA_SQLITE'):
+    # Réplica local: una copia de db.sqlite3 para probar el enrutamiento
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DJANGO_REPLICA_SQLITE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICAS_LECTURA = ['replica']
+
+# PRAGMAs de SQLite del perfil de producción, aplicados en cada conexión nueva.
+# WAL deja leer mientras se escribe; busy_timeout espera el bloqueo en lugar
+# de fallar con "database is locked"; synchronous=NORMAL es seguro con WAL.
+SQLITE_INIT_COMMAND_PRODUCCION = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA busy_timeout=5000;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA mmap_size=134217728;'
+    'PRAGMA cache_size=-20000'
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# En desarrollo, una LocMemCache por proceso que cuenta aciertos y fallos para
+# /metrics: lo que invalida un proceso (una señal, un comando de gestión) no
+# llega a los demás. El perfil de producción usa una caché en archivos que
+# comparten todos los workers y comandos de la máquina.
+CACHES = {
+    'default': {
+        'BACKEND': 'gestion_convenios_ucc.metricas.LocMemCacheMedida',
+    }
+}
+
+# Segundos que un contador del dashboard puede vivir en caché si ninguna
+# señal lo invalida antes (ver convenios/contadores.py)
+CONTADORES_CACHE_TTL = 300
+
+
+# Paginación por cursor de los listados (ver convenios/paginacion.py)
+
+PAGINACION_TAMANO_PAGINA = 25
+PAGINACION_TAMANO_MAXIMO = 100
+
+
+# Motor de búsqueda de convenios (ver convenios/busqueda.py). Con None se usa
+# FTS5 en SQLite y tsvector en PostgreSQL. Del texto extraído de cada informe
+# sólo se indexan los primeros BUSQUEDA_MAX_CARACTERES_INFORME caracteres.
+
+BUSQUEDA_BACKEND = None
+BUSQUEDA_MAX_CARACTERES_INFORME = 20_000
+
+
+# Extracción del texto de los archivos de informes para la búsqueda (ver
+# convenios/extraccion.py): procesos del pool (0: en la misma petición) y
+# caracteres que se guardan por informe
+
+EXTRACCION_PROCESOS = 2
+EXTRACCION_MAX_CARACTERES = 500_000
+
+
+# Días antes del vencimiento en los que se avisa a los supervisores
+# (ver usuarios/notificaciones.py)
+
+NOTIFICACIONES_UMBRALES_VENCIMIENTO = (60, 30, 7)
+
+
+# Notificaciones en vivo por SSE (ver usuarios/eventos.py). Con None se reparten
+# en memoria, lo que basta con un solo worker; con varios se usa
+# 'usuarios.eventos.BackendBaseDatos'. Sólo funciona bajo ASGI (daphne, uvicorn):
+# bajo WSGI el flujo nunca enviaría nada y ocuparía un worker por página, así
+# que está apagado salvo con DJANGO_NOTIFICACIONES_SSE=1 y la vista responde
+# 204 a las peticiones que no llegan por ASGI.
+
+NOTIFICACIONES_SSE_ACTIVO = os.environ.get('DJANGO_NOTIFICACIONES_SSE') == '1'
+NOTIFICACIONES_SSE_BACKEND = None
+NOTIFICACIONES_SSE_LATIDO = 15
+NOTIFICACIONES_SSE_COLA = 50
+NOTIFICACIONES_SSE_MAX_POR_USUARIO = 5
+NOTIFICACIONES_SSE_MAX_CONEXIONES = 2000
+NOTIFICACIONES_SSE_INTERVALO_CONSULTA = 2
+
+
+# Segundos entre escrituras del último acceso de los usuarios, que se acumula
+# en memoria y vuelca un hilo de cada proceso (ver usuarios/actividad.py y
+# gestion_convenios_ucc/segundo_plano.py)
+
+VOLCADOS_EN_SEGUNDO_PLANO = True
+ACTIVIDAD_INTERVALO_VOLCADO = 60
+
+
+# Procesos que generan las miniaturas de las fotos de perfil fuera de la
+# petición (ver usuarios/miniaturas.py); con 0 se generan en la misma petición
+
+MINIATURAS_PROCESOS = 2
+
+
+# Consultas SQL y latencia por petición (ver gestion_convenios_ucc/instrumentacion.py).
+# Funciona con DEBUG = False; se avisa cuando una vista pasa de su presupuesto
+# de consultas o repite la misma consulta SQL_UMBRAL_REPETIDAS veces (N+1).
+# La cabecera Server-Timing la ve cualquier cliente: con None sólo se envía
+# con DEBUG.
+
+SQL_INSTRUMENTACION_ACTIVA = True
+SQL_SERVER_TIMING = None
+SQL_PRESUPUESTO_CONSULTAS = 30
+SQL_PRESUPUESTO_POR_VISTA = {}
+SQL_UMBRAL_REPETIDAS = 5
+
+
+# Métricas de Prometheus en /metrics (ver gestion_convenios_ucc/metricas.py).
+# Cada worker acumula en memoria y un hilo suyo suma lo acumulado cada
+# METRICAS_INTERVALO_VOLCADO segundos en METRICAS_ARCHIVO, un SQLite que
+# comparten todos los procesos de la máquina. Sin METRICAS_TOKEN sólo se
+# atiende desde METRICAS_IPS_PERMITIDAS (ninguna en producción, donde un proxy
+# hace que todo llegue desde loopback).
+# Las pruebas usan su propio archivo (ver gestion_convenios_ucc/pruebas.py).
+
+METRICAS_ACTIVAS = True
+METRICAS_ARCHIVO = os.environ.get('DJANGO_METRICAS_ARCHIVO', BASE_DIR / 'metricas.sqlite3')
+METRICAS_INTERVALO_VOLCADO = 10
+METRICAS_INTERVALO_TABLAS = 300
+METRICAS_TOKEN = os.environ.get('DJANGO_METRICAS_TOKEN') or None
+METRICAS_IPS_PERMITIDAS = ('127.0.0.1', '::1')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,7 +265,72 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Archivos subidos (convenios firmados, informes, fotos). No se publican en
+# MEDIA_URL: se descargan por las vistas protegidas de convenios/descargas.py
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Segundos desde la última subida de un contenido durante los que no se borra
+# aunque se quede sin referencias: cubre a quien lo está subiendo en ese momento
+# (ver convenios/almacenamiento.py)
+ALMACENAMIENTO_GRACIA = 300
+
+# Delegar el envío al servidor frontal: None, 'x-sendfile' o 'x-accel-redirect'
+ARCHIVOS_DESCARGA_DELEGADA = None
+ARCHIVOS_PREFIJO_INTERNO = '/archivos-protegidos/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Perfil de ejecución
+# DJANGO_ENTORNO=produccion desactiva DEBUG (que guarda en memoria cada
+# consulta SQL) y ajusta conexiones, plantillas y sesiones para carga real.
+# Medir el efecto con: python manage.py benchmark_sqlite
+
+ENTORNO = os.environ.get('DJANGO_ENTORNO', 'desarrollo')
+
+if ENTORNO == 'produccion':
+    DEBUG = False
+    # La clave de desarrollo está en el repositorio: en producción no se usa nunca
+    SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+    if not SECRET_KEY:
+        raise ImproperlyConfigured('Con DJANGO_ENTORNO=produccion hay que definir DJANGO_SECRET_KEY.')
+    ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+    # Detrás del proxy la IP de origen no identifica a nadie: /metrics sólo con METRICAS_TOKEN
+    METRICAS_IPS_PERMITIDAS = ()
+
+    for base in DATABASES.values():
+        base.update({
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': SQLITE_INIT_COMMAND_PRODUCCION,
+                # Toma el bloqueo de escritura al abrir la transacción, así
+                # busy_timeout se aplica y no hay interbloqueos al promover lecturas
+                'transaction_mode': 'IMMEDIATE',
+            },
+        })
+
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+    MEDIA_ROOT = os.environ.get('DJANGO_MEDIA_ROOT', MEDIA_ROOT)
+    ARCHIVOS_DESCARGA_DELEGADA = os.environ.get('DJANGO_DESCARGA_DELEGADA') or None
+
+    # Compartida para que una invalidación (de los contadores del dashboard, de
+    # una sesión cerrada) llegue a todos los workers y no sólo al que la hizo
+    CACHES['default'] = {
+        'BACKEND': 'gestion_convenios_ucc.metricas.FileBasedCacheMedida',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIRECTORIO', BASE_DIR / 'cache_compartida'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+
+    # Sesiones leídas desde la caché, con la base de datos como respaldo
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -17,10 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from . import metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('convenios.auth_urls')),
     path('', include('convenios.urls')),
     path('usuarios/', include('usuarios.urls')),
     path('supervisores/', include('supervisores.urls')),
+    path('metrics', metricas.vista_metricas, name='metricas'),
 ]
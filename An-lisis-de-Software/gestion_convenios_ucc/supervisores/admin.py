@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Supervisor, EvaluacionSupervisor
+from .models import Supervisor, EvaluacionSupervisor, ResumenEvaluaciones
 
 
 @admin.register(Supervisor)
@@ -19,4 +19,18 @@ class EvaluacionSupervisorAdmin(admin.ModelAdmin):
     list_filter = ['calificacion_general', 'fecha_evaluacion']
     search_fields = ['supervisor__user__first_name', 'supervisor__user__last_name', 'evaluador__username']
     date_hierarchy = 'fecha_evaluacion'
-    ordering = ['-fecha_evaluacion']
\ No newline at end of file
+    ordering = ['-fecha_evaluacion']
+
+
+@admin.register(ResumenEvaluaciones)
+class ResumenEvaluacionesAdmin(admin.ModelAdmin):
+    # Lo mantienen las señales y reconstruir_ranking_supervisores: sólo lectura
+    list_display = ['supervisor', 'evaluaciones', 'promedio', 'evaluaciones_recientes', 'promedio_reciente', 'fecha_actualizacion']
+    list_select_related = ['supervisor__user']
+    ordering = ['-promedio']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,116 @@
+"""
+Asignación de convenios a supervisores.
+
+``disponibles`` busca los convenios que un supervisor aún no tiene por
+prefijo de la empresa/entidad sin distinguir mayúsculas: el prefijo se
+convierte en un rango ``lower(empresa_entidad) >= 'acu' AND < 'acv'`` que
+recorre el índice ``conv_empresa_prefijo_idx``, y las páginas siguientes
+continúan desde ``(nombre, id)`` de la última fila (paginación por cursor),
+así que cada página cuesta lo mismo con diez o con cien mil convenios. En
+SQLite ``LOWER`` sólo convierte letras ASCII: "Álamo" se encuentra con "Ála"
+pero no con "ála".
+
+``asignar`` y ``quitar`` escriben en la tabla intermedia con un solo
+``bulk_create(ignore_conflicts=True)`` o un solo ``DELETE`` y emiten
+``m2m_changed`` con los convenios afectados, para que el índice de búsqueda
+(``convenios.signals``) los vuelva a indexar como con ``add()``/``remove()``.
+"""
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
+from django.db.models.signals import m2m_changed
+
+from convenios.models import Convenio
+from convenios.paginacion import SIGUIENTE, CursorInvalido, codificar_cursor, leer_cursor
+
+from .models import Supervisor
+
+Asignacion = Supervisor.convenios_asignados.through
+
+LIMITE_AUTOCOMPLETAR = 20
+LIMITE_AUTOCOMPLETAR_MAXIMO = 50
+MAXIMO_POR_OPERACION = 1000
+
+
+def _rango_prefijo(prefijo):
+    """Límites ``[desde, hasta)`` de las cadenas que empiezan por ``prefijo``"""
+    return prefijo, prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+def disponibles(supervisor, texto='', limite=LIMITE_AUTOCOMPLETAR, cursor=None):
+    """
+    Convenios no asignados al supervisor cuya empresa/entidad empieza por
+    ``texto``. Devuelve ``(filas, cursor_siguiente)``; un cursor inválido se
+    ignora y se empieza desde el principio.
+    """
+    limite = max(1, min(limite, LIMITE_AUTOCOMPLETAR_MAXIMO))
+    asignado = Asignacion.objects.filter(supervisor_id=supervisor.pk, convenio_id=OuterRef('pk'))
+    convenios = Convenio.objects.annotate(nombre=Lower('empresa_entidad')).filter(~Exists(asignado))
+
+    prefijo = ' '.join(texto.split()).lower()
+    if prefijo:
+        desde, hasta = _rango_prefijo(prefijo)
+        convenios = convenios.filter(nombre__gte=desde, nombre__lt=hasta)
+    if cursor:
+        try:
+            (nombre, ultimo_id), _ = leer_cursor(cursor, 2)
+            convenios = convenios.filter(Q(nombre__gt=nombre) | Q(nombre=nombre, id__gt=int(ultimo_id)))
+        except (CursorInvalido, TypeError, ValueError):
+            pass
+
+    filas = list(
+        convenios.order_by('nombre', 'id').values('id', 'nombre', 'empresa_entidad', 'tipo', 'estado')[:limite + 1]
+    )
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor([filas[-1]['nombre'], filas[-1]['id']], SIGUIENTE)
+    for fila in filas:
+        del fila['nombre']
+    return filas, siguiente
+
+
+def _avisar(supervisor, accion, convenio_ids, using):
+    # Mismo aviso que ``supervisor.convenios_asignados.add()``/``remove()``
+    m2m_changed.send(
+        sender=Asignacion, instance=supervisor, action=accion, reverse=False,
+        model=Convenio, pk_set=set(convenio_ids), using=using,
+    )
+
+
+def asignar(supervisor, convenio_ids):
+    """Asigna los convenios existentes indicados; devuelve los ids que se asignaron ahora"""
+    using = router.db_for_write(Asignacion, instance=supervisor)
+    ids = set(convenio_ids)
+    with transaction.atomic(using=using):
+        existentes = set(Convenio.objects.using(using).filter(id__in=ids).values_list('id', flat=True))
+        ya_asignados = set(
+            Asignacion.objects.using(using).filter(supervisor_id=supervisor.pk, convenio_id__in=existentes)
+            .values_list('convenio_id', flat=True)
+        )
+        nuevos = existentes - ya_asignados
+        if not nuevos:
+            return set()
+        # ignore_conflicts: una asignación simultánea del mismo convenio no falla
+        Asignacion.objects.using(using).bulk_create(
+            [Asignacion(supervisor_id=supervisor.pk, convenio_id=convenio_id) for convenio_id in nuevos],
+            ignore_conflicts=True,
+        )
+        _avisar(supervisor, 'post_add', nuevos, using)
+    return nuevos
+
+
+def quitar(supervisor, convenio_ids):
+    """Quita los convenios indicados con un solo DELETE; devuelve cuántas asignaciones se borraron"""
+    using = router.db_for_write(Asignacion, instance=supervisor)
+    with transaction.atomic(using=using):
+        # Como remove(): la señal lleva sólo los convenios que estaban asignados
+        asignaciones = Asignacion.objects.using(using).filter(
+            supervisor_id=supervisor.pk, convenio_id__in=set(convenio_ids),
+        )
+        quitados = set(asignaciones.values_list('convenio_id', flat=True))
+        if not quitados:
+            return 0
+        borradas, _ = asignaciones.filter(convenio_id__in=quitados).delete()
+        _avisar(supervisor, 'post_remove', quitados, using)
+    return borradas
@@ -0,0 +1,27 @@
+"""Variante asíncrona del listado de supervisores (ver ``convenios.async_views``)"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from .views import contexto_lista_supervisores, supervisores_listado
+from convenios import contadores
+from convenios.concurrencia import en_paralelo
+from convenios.paginacion import paginar_por_cursor
+from gestion_convenios_ucc.routers import solo_lectura
+
+
+@solo_lectura
+@login_required
+async def lista_supervisores(request):
+    """Listado de supervisores con la página y las tarjetas consultadas en paralelo"""
+    pagina, estadisticas_sup, estadisticas_inf = await en_paralelo(
+        partial(paginar_por_cursor, supervisores_listado(), request, orden=('-fecha_creacion', '-id')),
+        partial(contadores.obtener, 'supervisores'),
+        partial(contadores.obtener, 'informes'),
+    )
+    
+    context = contexto_lista_supervisores(pagina, estadisticas_sup, estadisticas_inf)
+    
+    return await sync_to_async(render)(request, 'supervisores/lista_supervisores.html', context)
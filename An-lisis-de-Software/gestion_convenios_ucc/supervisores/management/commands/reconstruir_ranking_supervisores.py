@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from supervisores import ranking
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes de evaluaciones de los supervisores que alimentan el ranking'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ventana', action='store_true',
+            help=f'Sólo descuenta las evaluaciones de más de {ranking.DIAS_VENTANA} días (para programar a diario)',
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Resúmenes escritos por lote')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['ventana']:
+            cambiados = ranking.recalcular_ventana()
+            mensaje = f'{cambiados} resúmenes con la ventana de {ranking.DIAS_VENTANA} días actualizada'
+        else:
+            total = ranking.reconstruir(lote=options['lote'])
+            mensaje = f'{total} supervisores con evaluaciones resumidos'
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{mensaje} en {duracion:.2f} s'))
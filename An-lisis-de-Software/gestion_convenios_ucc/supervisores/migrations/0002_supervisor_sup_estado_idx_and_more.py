@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0002_actividadconvenio_act_creacion_idx_and_more'),
+        ('supervisores', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supervisor',
+            index=models.Index(fields=['estado'], name='sup_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supervisor',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='sup_creacion_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+CRITERIOS = ('calificacion_general', 'puntualidad', 'calidad_informes', 'comunicacion')
+
+
+def resumir_evaluaciones(apps, schema_editor):
+    EvaluacionSupervisor = apps.get_model('supervisores', 'EvaluacionSupervisor')
+    ResumenEvaluaciones = apps.get_model('supervisores', 'ResumenEvaluaciones')
+    alias = schema_editor.connection.alias
+    recientes = Q(fecha_evaluacion__gte=timezone.now() - timedelta(days=90))
+    totales = EvaluacionSupervisor.objects.using(alias).order_by().values('supervisor_id').annotate(
+        cantidad=Count('id'),
+        **{f'total_{criterio}': Sum(criterio) for criterio in CRITERIOS},
+        cantidad_reciente=Count('id', filter=recientes),
+        total_reciente=Sum(sum(F(criterio) for criterio in CRITERIOS), filter=recientes, default=0),
+    )
+    filas = []
+    for fila in totales:
+        sumas = {f'suma_{criterio}': fila[f'total_{criterio}'] for criterio in CRITERIOS}
+        filas.append(ResumenEvaluaciones(
+            supervisor_id=fila['supervisor_id'],
+            evaluaciones=fila['cantidad'],
+            promedio=sum(sumas.values()) / (fila['cantidad'] * len(CRITERIOS)),
+            evaluaciones_recientes=fila['cantidad_reciente'],
+            suma_reciente=fila['total_reciente'],
+            promedio_reciente=(
+                fila['total_reciente'] / (fila['cantidad_reciente'] * len(CRITERIOS))
+                if fila['cantidad_reciente'] else None
+            ),
+            **sumas,
+        ))
+    ResumenEvaluaciones.objects.using(alias).bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supervisores', '0002_supervisor_sup_estado_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenEvaluaciones',
+            fields=[
+                ('supervisor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_evaluaciones', serialize=False, to='supervisores.supervisor', verbose_name='Supervisor')),
+                ('evaluaciones', models.PositiveIntegerField(default=0, verbose_name='Evaluaciones')),
+                ('suma_calificacion_general', models.PositiveIntegerField(default=0, verbose_name='Suma de Calificación General')),
+                ('suma_puntualidad', models.PositiveIntegerField(default=0, verbose_name='Suma de Puntualidad')),
+                ('suma_calidad_informes', models.PositiveIntegerField(default=0, verbose_name='Suma de Calidad de Informes')),
+                ('suma_comunicacion', models.PositiveIntegerField(default=0, verbose_name='Suma de Comunicación')),
+                ('promedio', models.FloatField(blank=True, null=True, verbose_name='Promedio')),
+                ('evaluaciones_recientes', models.PositiveIntegerField(default=0, verbose_name='Evaluaciones Recientes')),
+                ('suma_reciente', models.PositiveIntegerField(default=0, verbose_name='Suma Reciente')),
+                ('promedio_reciente', models.FloatField(blank=True, null=True, verbose_name='Promedio de los Últimos 90 Días')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Evaluaciones',
+                'verbose_name_plural': 'Resúmenes de Evaluaciones',
+                'indexes': [models.Index(condition=models.Q(('evaluaciones__gt', 0)), fields=['-promedio', '-evaluaciones', 'supervisor'], name='resumen_ranking_idx'), models.Index(condition=models.Q(('evaluaciones_recientes__gt', 0)), fields=['-promedio_reciente', '-evaluaciones_recientes', 'supervisor'], name='resumen_ranking_reciente_idx')],
+            },
+        ),
+        migrations.RunPython(resumir_evaluaciones, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,42 @@
 from django.db import models
+from django.db.models import F, Func, IntegerField, OuterRef, Prefetch, Subquery, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import User
 from convenios.models import Convenio, Informe
 
 
+def _subconsulta_conteo(queryset):
+    """Convierte un queryset correlacionado en una subconsulta ``COUNT(*)``"""
+    conteo = queryset.order_by().annotate(total=Func(F('pk'), function='COUNT')).values('total')
+    return Subquery(conteo, output_field=IntegerField())
+
+
+class SupervisorQuerySet(models.QuerySet):
+    def con_conteos(self):
+        """Anota los conteos de convenios e informes en la misma consulta"""
+        informes = Informe.objects.filter(supervisor=OuterRef('user_id'))
+        asignaciones = Supervisor.convenios_asignados.through.objects.filter(supervisor=OuterRef('pk'))
+        return self.annotate(
+            num_convenios=_subconsulta_conteo(asignaciones),
+            num_informes=_subconsulta_conteo(informes),
+            num_informes_pendientes=_subconsulta_conteo(informes.filter(estado='pendiente')),
+            num_informes_aprobados=_subconsulta_conteo(informes.filter(estado='aprobado')),
+        )
+
+    def con_informes_recientes(self, cantidad=3):
+        """Precarga en ``user.informes_recientes`` los últimos informes de cada supervisor"""
+        recientes = Informe.objects.annotate(
+            posicion=Window(
+                RowNumber(),
+                partition_by=F('supervisor_id'),
+                order_by=[F('fecha_creacion').desc(), F('id').desc()],
+            ),
+        ).filter(posicion__lte=cantidad).order_by('-fecha_creacion', '-id')
+        return self.prefetch_related(
+            Prefetch('user__informe_set', queryset=recientes, to_attr='informes_recientes')
+        )
+
+
 class Supervisor(models.Model):
     ESTADO_CHOICES = [
         ('activo', 'Activo'),
@@ -20,10 +54,16 @@ class Supervisor(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
     
+    objects = SupervisorQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Supervisor"
         verbose_name_plural = "Supervisores"
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado'], name='sup_estado_idx'),
+            models.Index(fields=['-fecha_creacion', '-id'], name='sup_creacion_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.codigo_supervisor}"
@@ -46,19 +86,32 @@ class Supervisor(models.Model):
         else:
             return self.user.username[:2].upper()
     
+    @property
+    def total_convenios(self):
+        """Cuenta los convenios asignados (usa la anotación de ``con_conteos`` si existe)"""
+        if hasattr(self, 'num_convenios'):
+            return self.num_convenios
+        return self.convenios_asignados.count()
+    
     @property
     def total_informes(self):
         """Cuenta el total de informes del supervisor"""
+        if hasattr(self, 'num_informes'):
+            return self.num_informes
         return Informe.objects.filter(supervisor=self.user).count()
     
     @property
     def informes_pendientes(self):
         """Cuenta los informes pendientes del supervisor"""
+        if hasattr(self, 'num_informes_pendientes'):
+            return self.num_informes_pendientes
         return Informe.objects.filter(supervisor=self.user, estado='pendiente').count()
     
     @property
     def informes_aprobados(self):
         """Cuenta los informes aprobados del supervisor"""
+        if hasattr(self, 'num_informes_aprobados'):
+            return self.num_informes_aprobados
         return Informe.objects.filter(supervisor=self.user, estado='aprobado').count()
 
 
@@ -90,4 +143,62 @@ class EvaluacionSupervisor(models.Model):
             self.calidad_informes,
             self.comunicacion
         ]
-        return sum(calificaciones) / len(calificaciones)
\ No newline at end of file
+        return sum(calificaciones) / len(calificaciones)
+
+
+class ResumenEvaluaciones(models.Model):
+    """
+    Totales de las evaluaciones de un supervisor, mantenidos con aritmética
+    atómica por las señales (ver supervisores/ranking.py): el ranking es una
+    sola consulta sobre un índice.
+    """
+    supervisor = models.OneToOneField(Supervisor, on_delete=models.CASCADE, primary_key=True, related_name='resumen_evaluaciones', verbose_name="Supervisor")
+    evaluaciones = models.PositiveIntegerField(default=0, verbose_name="Evaluaciones")
+    suma_calificacion_general = models.PositiveIntegerField(default=0, verbose_name="Suma de Calificación General")
+    suma_puntualidad = models.PositiveIntegerField(default=0, verbose_name="Suma de Puntualidad")
+    suma_calidad_informes = models.PositiveIntegerField(default=0, verbose_name="Suma de Calidad de Informes")
+    suma_comunicacion = models.PositiveIntegerField(default=0, verbose_name="Suma de Comunicación")
+    promedio = models.FloatField(null=True, blank=True, verbose_name="Promedio")
+    # Últimos 90 días: se suman al evaluar y ``manage.py reconstruir_ranking_supervisores --ventana`` descarta las antiguas
+    evaluaciones_recientes = models.PositiveIntegerField(default=0, verbose_name="Evaluaciones Recientes")
+    suma_reciente = models.PositiveIntegerField(default=0, verbose_name="Suma Reciente")
+    promedio_reciente = models.FloatField(null=True, blank=True, verbose_name="Promedio de los Últimos 90 Días")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
+    
+    class Meta:
+        verbose_name = "Resumen de Evaluaciones"
+        verbose_name_plural = "Resúmenes de Evaluaciones"
+        indexes = [
+            models.Index(
+                fields=['-promedio', '-evaluaciones', 'supervisor'],
+                condition=models.Q(evaluaciones__gt=0),
+                name='resumen_ranking_idx',
+            ),
+            models.Index(
+                fields=['-promedio_reciente', '-evaluaciones_recientes', 'supervisor'],
+                condition=models.Q(evaluaciones_recientes__gt=0),
+                name='resumen_ranking_reciente_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Resumen de {self.supervisor_id} ({self.evaluaciones} evaluaciones)"
+    
+    def _promedio_de(self, suma):
+        return suma / self.evaluaciones if self.evaluaciones else None
+    
+    @property
+    def promedio_calificacion_general(self):
+        return self._promedio_de(self.suma_calificacion_general)
+    
+    @property
+    def promedio_puntualidad(self):
+        return self._promedio_de(self.suma_puntualidad)
+    
+    @property
+    def promedio_calidad_informes(self):
+        return self._promedio_de(self.suma_calidad_informes)
+    
+    @property
+    def promedio_comunicacion(self):
+        return self._promedio_de(self.suma_comunicacion)
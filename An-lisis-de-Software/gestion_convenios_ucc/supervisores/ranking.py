@@ -0,0 +1,153 @@
+"""
+Ranking de supervisores según sus evaluaciones.
+
+``ResumenEvaluaciones`` guarda por supervisor el número de evaluaciones, la
+suma de cada criterio y el promedio general, que las señales de
+``supervisores.signals`` ajustan con un ``UPDATE`` de expresiones ``F()`` al
+crear, modificar o borrar una evaluación: dos evaluaciones simultáneas nunca
+se pisan y no hace falta leer las anteriores. El promedio se recalcula en el
+mismo ``UPDATE`` a partir de los valores anteriores de la fila, así que el
+ranking es una sola consulta ordenada sobre un índice parcial.
+
+La ventana de los últimos ``DIAS_VENTANA`` días también se suma al evaluar,
+pero las evaluaciones que salen de ella sólo se descuentan al recalcularla:
+``manage.py reconstruir_ranking_supervisores --ventana`` debe programarse a
+diario. Sin ``--ventana`` el comando reconstruye todo desde las evaluaciones
+(p. ej. tras cargas masivas con ``bulk_create``, que no emiten señales).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, FloatField, OuterRef, Q, Sum, Value
+from django.db.models.functions import Cast, Greatest, NullIf
+from django.utils import timezone
+
+from convenios.paginacion import condicion_posterior
+
+from .models import EvaluacionSupervisor, ResumenEvaluaciones
+
+CRITERIOS = ('calificacion_general', 'puntualidad', 'calidad_informes', 'comunicacion')
+DIAS_VENTANA = 90
+
+
+def inicio_ventana():
+    return timezone.now() - timedelta(days=DIAS_VENTANA)
+
+
+def _promedio(suma, cantidad):
+    # Promedio por criterio; NULL (y no división por cero) cuando no quedan evaluaciones
+    return Cast(suma, FloatField()) / (NullIf(cantidad, Value(0)) * len(CRITERIOS))
+
+
+def puntajes(evaluacion):
+    return {criterio: getattr(evaluacion, criterio) for criterio in CRITERIOS}
+
+
+def registrar(supervisor_id, puntajes, fecha, signo=1):
+    """Suma (``signo=1``) o descuenta (``-1``) una evaluación del resumen del supervisor"""
+    total = sum(puntajes.values())
+    suma_actual = sum((F(f'suma_{criterio}') for criterio in CRITERIOS[1:]), F(f'suma_{CRITERIOS[0]}'))
+    # Acotados en cero: descontar evaluaciones que no se sumaron (cargadas sin
+    # señales) no debe violar el CHECK de los PositiveIntegerField
+    cambios = {
+        f'suma_{criterio}': Greatest(F(f'suma_{criterio}') + signo * valor, Value(0))
+        for criterio, valor in puntajes.items()
+    }
+    cambios['evaluaciones'] = Greatest(F('evaluaciones') + signo, Value(0))
+    cambios['promedio'] = _promedio(Greatest(suma_actual + signo * total, Value(0)), cambios['evaluaciones'])
+    if fecha >= inicio_ventana():
+        recientes = Greatest(F('evaluaciones_recientes') + signo, Value(0))
+        suma_reciente = Greatest(F('suma_reciente') + signo * total, Value(0))
+        cambios.update(
+            evaluaciones_recientes=recientes,
+            suma_reciente=suma_reciente,
+            promedio_reciente=_promedio(suma_reciente, recientes),
+        )
+    resumenes = ResumenEvaluaciones.objects.filter(supervisor_id=supervisor_id)
+    if not resumenes.update(**cambios) and signo > 0:
+        # Primera evaluación: se crea la fila y se vuelve a aplicar el incremento
+        ResumenEvaluaciones.objects.get_or_create(supervisor_id=supervisor_id)
+        resumenes.update(**cambios)
+
+
+def _agregados(evaluaciones, desde):
+    suma_total = sum((F(criterio) for criterio in CRITERIOS[1:]), F(CRITERIOS[0]))
+    recientes = Q(fecha_evaluacion__gte=desde)
+    return evaluaciones.order_by().values('supervisor_id').annotate(
+        total_evaluaciones=Count('id'),
+        **{f'total_{criterio}': Sum(criterio) for criterio in CRITERIOS},
+        total_recientes=Count('id', filter=recientes),
+        total_suma_reciente=Sum(suma_total, filter=recientes, default=0),
+    )
+
+
+def reconstruir(lote=500):
+    """Recalcula todos los resúmenes desde las evaluaciones; devuelve cuántos supervisores tienen alguna"""
+    desde = inicio_ventana()
+    filas = []
+    for totales in _agregados(EvaluacionSupervisor.objects.all(), desde):
+        cantidad, recientes = totales['total_evaluaciones'], totales['total_recientes']
+        sumas = {f'suma_{criterio}': totales[f'total_{criterio}'] for criterio in CRITERIOS}
+        filas.append(ResumenEvaluaciones(
+            supervisor_id=totales['supervisor_id'],
+            evaluaciones=cantidad,
+            promedio=sum(sumas.values()) / (cantidad * len(CRITERIOS)),
+            evaluaciones_recientes=recientes,
+            suma_reciente=totales['total_suma_reciente'],
+            promedio_reciente=totales['total_suma_reciente'] / (recientes * len(CRITERIOS)) if recientes else None,
+            **sumas,
+        ))
+    campos = [
+        'evaluaciones', *(f'suma_{criterio}' for criterio in CRITERIOS), 'promedio',
+        'evaluaciones_recientes', 'suma_reciente', 'promedio_reciente', 'fecha_actualizacion',
+    ]
+    with transaction.atomic():
+        ResumenEvaluaciones.objects.exclude(
+            Exists(EvaluacionSupervisor.objects.filter(supervisor_id=OuterRef('supervisor_id'))),
+        ).delete()
+        ResumenEvaluaciones.objects.bulk_create(
+            filas, batch_size=lote, update_conflicts=True, unique_fields=['supervisor'], update_fields=campos,
+        )
+    return len(filas)
+
+
+def recalcular_ventana():
+    """Descuenta de la ventana las evaluaciones que ya salieron de ella; devuelve cuántos resúmenes cambiaron"""
+    desde = inicio_ventana()
+    vigentes = {
+        totales['supervisor_id']: (totales['total_recientes'], totales['total_suma_reciente'])
+        for totales in _agregados(EvaluacionSupervisor.objects.filter(fecha_evaluacion__gte=desde), desde)
+    }
+    cambiados = []
+    resumenes = ResumenEvaluaciones.objects.filter(
+        Q(evaluaciones_recientes__gt=0) | Q(supervisor_id__in=vigentes),
+    ).only('supervisor_id', 'evaluaciones_recientes', 'suma_reciente', 'promedio_reciente')
+    for resumen in resumenes:
+        recientes, suma = vigentes.get(resumen.supervisor_id, (0, 0))
+        if (resumen.evaluaciones_recientes, resumen.suma_reciente) != (recientes, suma):
+            resumen.evaluaciones_recientes = recientes
+            resumen.suma_reciente = suma
+            resumen.promedio_reciente = suma / (recientes * len(CRITERIOS)) if recientes else None
+            cambiados.append(resumen)
+    ResumenEvaluaciones.objects.bulk_update(
+        cambiados, ['evaluaciones_recientes', 'suma_reciente', 'promedio_reciente'], batch_size=500,
+    )
+    return len(cambiados)
+
+
+def consulta_ranking(recientes=False):
+    """Orden total del ranking (el último campo es único) y el queryset que lo recorre por el índice"""
+    if recientes:
+        orden = ('-promedio_reciente', '-evaluaciones_recientes', 'supervisor_id')
+        filtro = Q(evaluaciones_recientes__gt=0)
+    else:
+        orden = ('-promedio', '-evaluaciones', 'supervisor_id')
+        filtro = Q(evaluaciones__gt=0)
+    return orden, ResumenEvaluaciones.objects.filter(filtro).select_related('supervisor__user')
+
+
+def posicion_de(queryset, orden, resumen):
+    """Puesto en el ranking de ``resumen`` (cuenta los que van antes con el mismo índice)"""
+    campos = [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+    valores = [getattr(resumen, nombre) for nombre, _ in campos]
+    return queryset.filter(condicion_posterior(campos, valores, invertir=True)).count() + 1
@@ -0,0 +1,39 @@
+"""
+Mantiene ``ResumenEvaluaciones`` al crear, modificar o borrar evaluaciones
+una a una (ver supervisores/ranking.py).
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import ranking
+from .models import EvaluacionSupervisor
+
+
+@receiver(pre_save, sender=EvaluacionSupervisor)
+def recordar_evaluacion(sender, instance, raw=False, **kwargs):
+    instance._evaluacion_anterior = None
+    if raw or instance._state.adding:
+        return
+    instance._evaluacion_anterior = (
+        EvaluacionSupervisor.objects.filter(pk=instance.pk)
+        .values('supervisor_id', 'fecha_evaluacion', *ranking.CRITERIOS).first()
+    )
+
+
+@receiver(post_save, sender=EvaluacionSupervisor)
+def sumar_evaluacion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_evaluacion_anterior', None)
+    actual = ranking.puntajes(instance)
+    if anterior is not None:
+        supervisor_id, fecha = anterior.pop('supervisor_id'), anterior.pop('fecha_evaluacion')
+        if (supervisor_id, anterior) == (instance.supervisor_id, actual):
+            return
+        ranking.registrar(supervisor_id, anterior, fecha, signo=-1)
+    ranking.registrar(instance.supervisor_id, actual, instance.fecha_evaluacion)
+
+
+@receiver(post_delete, sender=EvaluacionSupervisor)
+def descontar_evaluacion(sender, instance, **kwargs):
+    ranking.registrar(instance.supervisor_id, ranking.puntajes(instance), instance.fecha_evaluacion, signo=-1)
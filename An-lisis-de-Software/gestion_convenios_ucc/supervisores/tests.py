@@ -1,3 +1,321 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import asignaciones, ranking
+from .models import EvaluacionSupervisor, ResumenEvaluaciones, Supervisor
+from convenios.busqueda import obtener_backend
+from convenios.models import Convenio
+from convenios.tests import PlanDeConsultaTestCase, crear_convenio, crear_informe
+
+
+def crear_supervisor(username, **kwargs):
+    usuario = User.objects.create_user(username, password='clave-segura-123')
+    datos = {
+        'user': usuario,
+        'codigo_supervisor': f'SUP-{username}',
+        'especialidad': 'Ingeniería',
+        'fecha_ingreso': date(2024, 1, 1),
+    }
+    datos.update(kwargs)
+    return Supervisor.objects.create(**datos)
+
+
+class ListaSupervisoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisores = [crear_supervisor(f'sup{i}') for i in range(5)]
+        for supervisor in cls.supervisores:
+            convenio = crear_convenio(supervisor=supervisor.user)
+            supervisor.convenios_asignados.add(convenio)
+            for estado in ('pendiente', 'aprobado', 'aprobado', 'rechazado', 'pendiente'):
+                crear_informe(convenio, supervisor.user, estado=estado, titulo=f'{supervisor.user.username}-{estado}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.supervisores[0].user)
+
+    def test_conteos_anotados_sin_consultas_adicionales(self):
+        supervisores = list(Supervisor.objects.con_conteos())
+        with self.assertNumQueries(0):
+            for supervisor in supervisores:
+                self.assertEqual(supervisor.total_convenios, 1)
+                self.assertEqual(supervisor.total_informes, 5)
+                self.assertEqual(supervisor.informes_pendientes, 2)
+                self.assertEqual(supervisor.informes_aprobados, 2)
+
+    def test_propiedades_sin_anotacion_siguen_consultando(self):
+        supervisor = Supervisor.objects.get(pk=self.supervisores[0].pk)
+        self.assertEqual(supervisor.total_informes, 5)
+        self.assertEqual(supervisor.informes_pendientes, 2)
+
+    def test_informes_recientes_limitados_por_supervisor(self):
+        supervisores = list(Supervisor.objects.select_related('user').con_informes_recientes(3))
+        for supervisor in supervisores:
+            recientes = supervisor.user.informes_recientes
+            self.assertEqual(len(recientes), 3)
+            self.assertTrue(all(informe.supervisor_id == supervisor.user_id for informe in recientes))
+
+    # Sin volcados del último acceso dentro de la petición medida
+    @override_settings(ACTIVIDAD_INTERVALO_VOLCADO=3600)
+    def test_lista_con_numero_constante_de_consultas(self):
+        # sesión, usuario, perfil del encabezado, 2 tarjetas, supervisores e informes recientes
+        with self.assertNumQueries(7):
+            respuesta = self.client.get(reverse('supervisores:lista_supervisores'))
+        self.assertContains(respuesta, 'Informes: 5')
+        self.assertContains(respuesta, 'sup0-pendiente')
+
+
+class IndicesSupervisoresTests(PlanDeConsultaTestCase):
+    def test_filtros_y_listado(self):
+        self.assertUsaIndice(Supervisor.objects.filter(estado='activo').values('id'), 'sup_estado_idx')
+        self.assertUsaIndice(Supervisor.objects.order_by('-fecha_creacion', '-id')[:26], 'sup_creacion_idx')
+
+    def test_ranking(self):
+        for recientes, indice in ((False, 'resumen_ranking_idx'), (True, 'resumen_ranking_reciente_idx')):
+            orden, resumenes = ranking.consulta_ranking(recientes=recientes)
+            self.assertUsaIndice(resumenes.select_related(None).order_by(*orden)[:26], indice)
+
+    def test_autocompletado_por_prefijo(self):
+        convenios = Convenio.objects.annotate(nombre=Lower('empresa_entidad')).filter(nombre__gte='acu', nombre__lt='acv')
+        self.assertUsaIndice(convenios.order_by('nombre', 'id').values('id')[:21], 'conv_empresa_prefijo_idx')
+
+
+class ListaSupervisoresAsincronaTests(TransactionTestCase):
+    def test_mismo_resultado_que_la_vista_sincrona(self):
+        supervisor = crear_supervisor('sup_async')
+        convenio = crear_convenio(supervisor=supervisor.user)
+        supervisor.convenios_asignados.add(convenio)
+        crear_informe(convenio, supervisor.user, estado='pendiente', titulo='informe-async')
+        self.client.force_login(supervisor.user)
+
+        esperado = self.client.get(reverse('supervisores:lista_supervisores'))
+        obtenido = self.client.get(reverse('supervisores:lista_supervisores_async'))
+        self.assertEqual(obtenido.status_code, 200)
+        self.assertEqual(obtenido.context['informes_pendientes'], esperado.context['informes_pendientes'])
+        self.assertContains(obtenido, 'informe-async')
+
+
+def evaluar(supervisor, general, puntualidad=None, calidad=None, comunicacion=None):
+    evaluador = User.objects.get_or_create(username='evaluador')[0]
+    return EvaluacionSupervisor.objects.create(
+        supervisor=supervisor, evaluador=evaluador, convenio=crear_convenio(),
+        calificacion_general=general,
+        puntualidad=general if puntualidad is None else puntualidad,
+        calidad_informes=general if calidad is None else calidad,
+        comunicacion=general if comunicacion is None else comunicacion,
+    )
+
+
+class RankingSupervisoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana, cls.beto, cls.carla = (crear_supervisor(nombre) for nombre in ('ana', 'beto', 'carla'))
+
+    def resumen(self, supervisor):
+        return ResumenEvaluaciones.objects.get(supervisor=supervisor)
+
+    def test_cada_evaluacion_actualiza_el_resumen(self):
+        evaluar(self.ana, 8, puntualidad=6, calidad=10, comunicacion=4)
+        evaluar(self.ana, 6)
+
+        resumen = self.resumen(self.ana)
+        self.assertEqual(resumen.evaluaciones, 2)
+        self.assertEqual(resumen.promedio_puntualidad, 6)
+        self.assertEqual(resumen.promedio_calidad_informes, 8)
+        self.assertAlmostEqual(resumen.promedio, 6.5)
+        self.assertAlmostEqual(resumen.promedio_reciente, 6.5)
+
+    def test_modificar_y_borrar_evaluaciones(self):
+        primera = evaluar(self.ana, 8)
+        segunda = evaluar(self.ana, 4)
+
+        segunda.calificacion_general = segunda.puntualidad = segunda.calidad_informes = segunda.comunicacion = 10
+        segunda.save()
+        self.assertAlmostEqual(self.resumen(self.ana).promedio, 9)
+
+        segunda.supervisor = self.beto
+        segunda.save()
+        self.assertAlmostEqual(self.resumen(self.ana).promedio, 8)
+        self.assertAlmostEqual(self.resumen(self.beto).promedio, 10)
+
+        primera.delete()
+        resumen = self.resumen(self.ana)
+        self.assertEqual((resumen.evaluaciones, resumen.promedio, resumen.promedio_reciente), (0, None, None))
+
+    def test_borrar_evaluaciones_cargadas_sin_senales(self):
+        evaluar(self.ana, 4)
+        # Cargadas con bulk_create: no se sumaron al resumen
+        cargadas = EvaluacionSupervisor.objects.bulk_create([
+            EvaluacionSupervisor(
+                supervisor=self.ana, evaluador=self.beto.user, convenio=crear_convenio(),
+                calificacion_general=10, puntualidad=10, calidad_informes=10, comunicacion=10,
+            )
+            for _ in range(2)
+        ])
+        for evaluacion in EvaluacionSupervisor.objects.filter(pk__in=[e.pk for e in cargadas]):
+            evaluacion.delete()
+        resumen = self.resumen(self.ana)
+        self.assertEqual(resumen.evaluaciones, 0)
+        self.assertEqual(resumen.suma_calificacion_general, 0)
+        self.assertIsNone(resumen.promedio)
+
+    def test_reconstruir_coincide_con_lo_incremental(self):
+        for supervisor, calificaciones in ((self.ana, (9, 7)), (self.beto, (5,)), (self.carla, (10, 2, 6))):
+            for calificacion in calificaciones:
+                evaluar(supervisor, calificacion, puntualidad=calificacion // 2)
+        antes = list(ResumenEvaluaciones.objects.order_by('supervisor_id').values())
+        ResumenEvaluaciones.objects.update(evaluaciones=99, promedio=1)
+
+        salida = StringIO()
+        call_command('reconstruir_ranking_supervisores', stdout=salida)
+
+        self.assertIn('3 supervisores con evaluaciones resumidos', salida.getvalue())
+        despues = list(ResumenEvaluaciones.objects.order_by('supervisor_id').values())
+        for fila in antes + despues:
+            fila.pop('fecha_actualizacion')
+        for esperado, obtenido in zip(antes, despues):
+            self.assertAlmostEqual(esperado.pop('promedio'), obtenido.pop('promedio'))
+            self.assertAlmostEqual(esperado.pop('promedio_reciente'), obtenido.pop('promedio_reciente'))
+        self.assertEqual(antes, despues)
+
+    def test_la_ventana_descarta_las_evaluaciones_antiguas(self):
+        antigua = evaluar(self.ana, 2)
+        evaluar(self.ana, 10)
+        EvaluacionSupervisor.objects.filter(pk=antigua.pk).update(
+            fecha_evaluacion=timezone.now() - timedelta(days=ranking.DIAS_VENTANA + 1),
+        )
+
+        salida = StringIO()
+        call_command('reconstruir_ranking_supervisores', ventana=True, stdout=salida)
+
+        self.assertIn('1 resúmenes con la ventana', salida.getvalue())
+        resumen = self.resumen(self.ana)
+        self.assertEqual((resumen.evaluaciones, resumen.evaluaciones_recientes), (2, 1))
+        self.assertAlmostEqual(resumen.promedio, 6)
+        self.assertAlmostEqual(resumen.promedio_reciente, 10)
+
+    @override_settings(ACTIVIDAD_INTERVALO_VOLCADO=3600)
+    def test_vista_del_ranking_paginada(self):
+        evaluar(self.ana, 7)
+        evaluar(self.beto, 9)
+        evaluar(self.carla, 7)
+        evaluar(self.carla, 7)
+        self.client.force_login(self.ana.user)
+        url = reverse('supervisores:ranking_supervisores')
+
+        # sesión, usuario, perfil del encabezado y el ranking
+        with self.assertNumQueries(4):
+            respuesta = self.client.get(url, {'tamano': 2})
+        posiciones = [(posicion, resumen.supervisor_id) for posicion, resumen in respuesta.context['posiciones']]
+        self.assertEqual(posiciones, [(1, self.beto.pk), (2, self.carla.pk)])
+
+        respuesta = self.client.get(url + respuesta.context['pagina'].url_siguiente)
+        posiciones = [(posicion, resumen.supervisor_id) for posicion, resumen in respuesta.context['posiciones']]
+        self.assertEqual(posiciones, [(3, self.ana.pk)])
+        self.assertContains(respuesta, self.ana.nombre_completo)
+
+
+class AsignacionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = crear_supervisor('asignador')
+        cls.supervisor.user.last_name = 'Quintero'
+        cls.supervisor.user.save()
+        cls.acueductos = [crear_convenio(empresa_entidad=f'Acueducto {i}') for i in range(5)]
+        cls.alcaldia = crear_convenio(empresa_entidad='ACUERDO Alcaldía')
+        cls.banco = crear_convenio(empresa_entidad='Banco de Bogotá')
+        cls.supervisor.convenios_asignados.add(cls.acueductos[0])
+
+    def setUp(self):
+        self.client.force_login(self.supervisor.user)
+
+    def ids(self, filas):
+        return [fila['id'] for fila in filas]
+
+    def test_prefijo_sin_mayusculas_excluye_los_asignados(self):
+        filas, siguiente = asignaciones.disponibles(self.supervisor, '  acu ')
+        self.assertEqual(self.ids(filas), [convenio.pk for convenio in self.acueductos[1:]] + [self.alcaldia.pk])
+        self.assertEqual(set(filas[0]), {'id', 'empresa_entidad', 'tipo', 'estado'})
+        self.assertIsNone(siguiente)
+
+    def test_paginas_por_cursor(self):
+        vistos, cursor = [], None
+        for _ in range(3):
+            filas, cursor = asignaciones.disponibles(self.supervisor, 'acu', limite=2, cursor=cursor)
+            vistos += self.ids(filas)
+            if cursor is None:
+                break
+        self.assertIsNone(cursor)
+        self.assertEqual(len(vistos), 5)
+        self.assertEqual(len(set(vistos)), 5)
+
+        filas, _ = asignaciones.disponibles(self.supervisor, 'acu', limite=2, cursor='no-es-un-cursor')
+        self.assertEqual(self.ids(filas), [convenio.pk for convenio in self.acueductos[1:3]])
+
+    def test_asignar_y_quitar_en_una_escritura(self):
+        pedidos = [self.acueductos[0].pk, self.acueductos[1].pk, self.banco.pk, 999999]
+        with CaptureQueriesContext(connection) as consultas:
+            nuevos = asignaciones.asignar(self.supervisor, pedidos)
+        tabla = asignaciones.Asignacion._meta.db_table
+        self.assertEqual(sum(consulta['sql'].startswith('INSERT') and f'INTO "{tabla}"' in consulta['sql'] for consulta in consultas), 1)
+        self.assertEqual(nuevos, {self.acueductos[1].pk, self.banco.pk})
+        self.assertEqual(obtener_backend().buscar('quintero'), sorted(
+            [self.acueductos[0].pk, self.acueductos[1].pk, self.banco.pk],
+        ))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(asignaciones.quitar(self.supervisor, [self.acueductos[1].pk, self.banco.pk, 999999]), 2)
+        self.assertEqual(sum(f'DELETE FROM "{tabla}"' in consulta['sql'] for consulta in consultas), 1)
+        self.assertEqual(obtener_backend().buscar('quintero'), [self.acueductos[0].pk])
+        self.assertEqual(asignaciones.quitar(self.supervisor, [self.banco.pk]), 0)
+
+    def test_quitar_avisa_solo_lo_que_estaba_asignado(self):
+        asignaciones.asignar(self.supervisor, [self.acueductos[0].pk])
+        avisados = []
+
+        def anotar(action, pk_set, **kwargs):
+            if action == 'post_remove':
+                avisados.append(pk_set)
+
+        m2m_changed.connect(anotar, sender=asignaciones.Asignacion)
+        self.addCleanup(m2m_changed.disconnect, anotar, sender=asignaciones.Asignacion)
+        asignaciones.quitar(self.supervisor, [convenio.pk for convenio in self.acueductos] + [self.banco.pk])
+        self.assertEqual(avisados, [{self.acueductos[0].pk}])
+
+    def test_endpoints_json(self):
+        url = reverse('supervisores:convenios_disponibles', args=[self.supervisor.pk])
+        datos = self.client.get(url, {'q': 'ban'}).json()
+        self.assertEqual(self.ids(datos['resultados']), [self.banco.pk])
+        self.assertIsNone(datos['siguiente'])
+
+        url = reverse('supervisores:asignar_convenios_lote', args=[self.supervisor.pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, {'accion': 'mover', 'convenios': [self.banco.pk]}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'accion': 'asignar'}).status_code, 400)
+        respuesta = self.client.post(url, {'accion': 'asignar', 'convenios': [self.banco.pk, self.alcaldia.pk]})
+        self.assertEqual(respuesta.json(), {'accion': 'asignar', 'cambiados': 2})
+        respuesta = self.client.post(url, {'accion': 'quitar', 'convenios': [self.banco.pk]})
+        self.assertEqual(respuesta.json(), {'accion': 'quitar', 'cambiados': 1})
+        self.assertEqual(
+            set(self.supervisor.convenios_asignados.values_list('id', flat=True)),
+            {self.acueductos[0].pk, self.alcaldia.pk},
+        )
+
+    def test_formulario_asigna_varios(self):
+        url = reverse('supervisores:asignar_convenio', args=[self.supervisor.pk])
+        respuesta = self.client.post(url, {'convenio_id': [self.banco.pk, self.alcaldia.pk]})
+        self.assertRedirects(
+            respuesta, reverse('supervisores:detalle_supervisor', args=[self.supervisor.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(self.supervisor.convenios_asignados.count(), 3)
@@ -1,14 +1,18 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'supervisores'
 
 urlpatterns = [
     path('', views.lista_supervisores, name='lista_supervisores'),
+    path('async/', async_views.lista_supervisores, name='lista_supervisores_async'),
+    path('ranking/', views.ranking_supervisores, name='ranking_supervisores'),
     path('<int:supervisor_id>/', views.detalle_supervisor, name='detalle_supervisor'),
     path('crear/', views.crear_supervisor, name='crear_supervisor'),
     path('<int:supervisor_id>/editar/', views.editar_supervisor, name='editar_supervisor'),
     path('<int:supervisor_id>/asignar-convenio/', views.asignar_convenio_supervisor, name='asignar_convenio'),
+    path('<int:supervisor_id>/convenios-disponibles/', views.convenios_disponibles, name='convenios_disponibles'),
+    path('<int:supervisor_id>/convenios/lote/', views.asignar_convenios_lote, name='asignar_convenios_lote'),
     path('<int:supervisor_id>/quitar-convenio/<int:convenio_id>/', views.quitar_convenio_supervisor, name='quitar_convenio'),
     path('<int:supervisor_id>/evaluar/', views.evaluar_supervisor, name='evaluar_supervisor'),
     path('<int:supervisor_id>/enviar-alerta/', views.enviar_alerta_supervisor, name='enviar_alerta'),
@@ -1,51 +1,99 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST, require_safe
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db.models import Q, Count
 from django.utils import timezone
-from .models import Supervisor, EvaluacionSupervisor
+from .models import Supervisor, EvaluacionSupervisor, ResumenEvaluaciones
+from . import asignaciones, ranking
 from convenios.models import Convenio, Informe
+from convenios import contadores
+from convenios.paginacion import paginar_por_cursor
+from gestion_convenios_ucc.routers import solo_lectura
 
+EVALUACIONES_RECIENTES = 20
 
+
+def supervisores_listado():
+    return Supervisor.objects.select_related('user').con_conteos().con_informes_recientes()
+
+
+def contexto_lista_supervisores(pagina, estadisticas_sup, estadisticas_inf):
+    return {
+        'supervisores': pagina,
+        'pagina': pagina,
+        'supervisores_activos': estadisticas_sup.activos,
+        'informes_aprobados': estadisticas_inf.aprobados,
+        'informes_pendientes': estadisticas_inf.pendientes,
+    }
+
+
+@solo_lectura
 @login_required
 def lista_supervisores(request):
     """Vista para listar todos los supervisores con sus convenios asignados"""
-    supervisores = Supervisor.objects.select_related('user').prefetch_related('convenios_asignados').all()
+    pagina = paginar_por_cursor(supervisores_listado(), request, orden=('-fecha_creacion', '-id'))
     
     # Estadísticas para las tarjetas
-    supervisores_activos = Supervisor.objects.filter(estado='activo').count()
-    informes_aprobados = Informe.objects.filter(estado='aprobado').count()
-    informes_pendientes = Informe.objects.filter(estado='pendiente').count()
+    estadisticas_sup = contadores.obtener('supervisores')
+    estadisticas_inf = contadores.obtener('informes')
     
-    context = {
-        'supervisores': supervisores,
-        'supervisores_activos': supervisores_activos,
-        'informes_aprobados': informes_aprobados,
-        'informes_pendientes': informes_pendientes,
-    }
+    context = contexto_lista_supervisores(pagina, estadisticas_sup, estadisticas_inf)
     
     return render(request, 'supervisores/lista_supervisores.html', context)
 
 
+@solo_lectura
 @login_required
 def detalle_supervisor(request, supervisor_id):
     """Vista para mostrar el detalle de un supervisor y sus informes"""
-    supervisor = get_object_or_404(Supervisor, id=supervisor_id)
+    supervisor = get_object_or_404(Supervisor.objects.select_related('user', 'resumen_evaluaciones'), id=supervisor_id)
     informes = Informe.objects.filter(supervisor=supervisor.user).order_by('-fecha_creacion')
     convenios_asignados = supervisor.convenios_asignados.all()
-    evaluaciones = EvaluacionSupervisor.objects.filter(supervisor=supervisor).order_by('-fecha_evaluacion')
+    # Sólo las últimas: los promedios salen del resumen, no de recorrerlas todas
+    evaluaciones = EvaluacionSupervisor.objects.filter(supervisor=supervisor).select_related(
+        'evaluador', 'convenio',
+    ).order_by('-fecha_evaluacion')[:EVALUACIONES_RECIENTES]
+    
+    try:
+        resumen = supervisor.resumen_evaluaciones
+    except ResumenEvaluaciones.DoesNotExist:
+        resumen = None
     
     context = {
         'supervisor': supervisor,
         'informes': informes,
         'convenios_asignados': convenios_asignados,
         'evaluaciones': evaluaciones,
+        'resumen': resumen,
     }
     
     return render(request, 'supervisores/detalle_supervisor.html', context)
 
 
+@solo_lectura
+@login_required
+def ranking_supervisores(request):
+    """Vista del ranking de supervisores por promedio de evaluaciones"""
+    recientes = request.GET.get('periodo') == 'recientes'
+    orden, resumenes = ranking.consulta_ranking(recientes=recientes)
+    pagina = paginar_por_cursor(resumenes, request, orden=orden)
+    
+    # El puesto del primero de la página; en la primera no hace falta contarlo
+    primero = ranking.posicion_de(resumenes, orden, pagina.objetos[0]) if pagina.tiene_anterior else 1
+    
+    context = {
+        'pagina': pagina,
+        'posiciones': list(zip(range(primero, primero + len(pagina)), pagina)),
+        'recientes': recientes,
+        'dias_ventana': ranking.DIAS_VENTANA,
+    }
+    
+    return render(request, 'supervisores/ranking_supervisores.html', context)
+
+
 @login_required
 def crear_supervisor(request):
     """Vista para crear un nuevo supervisor"""
@@ -84,23 +132,68 @@ def asignar_convenio_supervisor(request, supervisor_id):
     supervisor = get_object_or_404(Supervisor, id=supervisor_id)
     
     if request.method == 'POST':
-        convenio_id = request.POST.get('convenio_id')
-        if convenio_id:
-            convenio = get_object_or_404(Convenio, id=convenio_id)
-            supervisor.convenios_asignados.add(convenio)
-            messages.success(request, f'Convenio {convenio.empresa_entidad} asignado exitosamente.')
+        convenio_ids = _ids_de(request.POST.getlist('convenio_id'))
+        if convenio_ids:
+            asignados = asignaciones.asignar(supervisor, convenio_ids[:asignaciones.MAXIMO_POR_OPERACION])
+            messages.success(request, f'{len(asignados)} convenios asignados exitosamente.')
             return redirect('supervisores:detalle_supervisor', supervisor_id=supervisor_id)
     
-    convenios_disponibles = Convenio.objects.exclude(supervisores_asignados=supervisor)
+    # Sólo la primera página: el resto se pide al autocompletado
+    convenios_disponibles, siguiente = asignaciones.disponibles(supervisor)
     
     context = {
         'supervisor': supervisor,
         'convenios_disponibles': convenios_disponibles,
+        'cursor_siguiente': siguiente,
     }
     
     return render(request, 'supervisores/asignar_convenio.html', context)
 
 
+def _ids_de(valores):
+    return [int(valor) for valor in valores if valor.isdigit()]
+
+
+@solo_lectura
+@login_required
+@require_safe
+def convenios_disponibles(request, supervisor_id):
+    """Autocompletado JSON de convenios sin asignar por prefijo, paginado por cursor"""
+    supervisor = get_object_or_404(Supervisor.objects.only('id'), id=supervisor_id)
+    try:
+        limite = int(request.GET.get('limite', asignaciones.LIMITE_AUTOCOMPLETAR))
+    except ValueError:
+        limite = asignaciones.LIMITE_AUTOCOMPLETAR
+    
+    filas, siguiente = asignaciones.disponibles(
+        supervisor, request.GET.get('q', ''), limite=limite, cursor=request.GET.get('cursor'),
+    )
+    
+    return JsonResponse({'resultados': filas, 'siguiente': siguiente})
+
+
+@login_required
+@require_POST
+def asignar_convenios_lote(request, supervisor_id):
+    """Asigna (``accion=asignar``) o quita (``accion=quitar``) varios convenios en una sola escritura"""
+    supervisor = get_object_or_404(Supervisor.objects.only('id'), id=supervisor_id)
+    accion = request.POST.get('accion')
+    convenio_ids = _ids_de(request.POST.getlist('convenios'))
+    if accion not in ('asignar', 'quitar') or not convenio_ids:
+        return JsonResponse({'error': 'Indique la acción y al menos un convenio.'}, status=400)
+    if len(convenio_ids) > asignaciones.MAXIMO_POR_OPERACION:
+        return JsonResponse(
+            {'error': f'Como máximo {asignaciones.MAXIMO_POR_OPERACION} convenios por operación.'}, status=400,
+        )
+    
+    if accion == 'asignar':
+        cambiados = len(asignaciones.asignar(supervisor, convenio_ids))
+    else:
+        cambiados = asignaciones.quitar(supervisor, convenio_ids)
+    
+    return JsonResponse({'accion': accion, 'cambiados': cambiados})
+
+
 @login_required
 def quitar_convenio_supervisor(request, supervisor_id, convenio_id):
     """Vista para quitar un convenio de un supervisor"""
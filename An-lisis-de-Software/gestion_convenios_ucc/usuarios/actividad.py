@@ -0,0 +1,124 @@
+"""
+Registro diferido del último acceso de cada usuario.
+
+``UltimoAccesoMiddleware`` anota en un diccionario en memoria el momento de
+cada petición autenticada, sin tocar la base de datos. Cada
+``ACTIVIDAD_INTERVALO_VOLCADO`` segundos un hilo del proceso
+(``segundo_plano.VolcadoPeriodico``), y también al terminar el proceso,
+escribe el buffer con una consulta para resolver los perfiles y un único
+``bulk_update(['ultimo_acceso'])``, que no reescribe el resto de columnas ni
+``fecha_actualizacion``. Ninguna petición espera ese volcado.
+
+El buffer es por proceso: con varios workers cada uno vuelca lo suyo, y el
+valor en la base puede quedar hasta un intervalo por detrás.
+"""
+import atexit
+import logging
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from gestion_convenios_ucc.segundo_plano import VolcadoPeriodico
+
+from .models import PerfilUsuario
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pendientes = {}
+# Base contra la que se anotaron los accesos pendientes
+_base = None
+
+
+def intervalo_volcado():
+    return getattr(settings, 'ACTIVIDAD_INTERVALO_VOLCADO', 60)
+
+
+def _nombre_base():
+    return connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+
+
+def registrar(usuario_id, momento=None):
+    """Anota el acceso; sólo se conserva el más reciente de cada usuario"""
+    global _base
+    with _lock:
+        _pendientes[usuario_id] = momento or timezone.now()
+        _base = _nombre_base()
+    volcado.asegurar()
+
+
+def pendientes():
+    with _lock:
+        return dict(_pendientes)
+
+
+def volcar():
+    """Escribe los accesos pendientes; devuelve cuántos perfiles se actualizaron"""
+    with _lock:
+        accesos = dict(_pendientes)
+        _pendientes.clear()
+    if not accesos:
+        return 0
+
+    try:
+        perfiles = [
+            PerfilUsuario(id=perfil_id, ultimo_acceso=accesos[usuario_id])
+            for perfil_id, usuario_id in PerfilUsuario.objects.filter(user_id__in=accesos).values_list('id', 'user_id')
+        ]
+        PerfilUsuario.objects.bulk_update(perfiles, ['ultimo_acceso'], batch_size=500)
+    except DatabaseError:
+        # Se reintenta en el siguiente volcado sin pisar accesos más nuevos
+        with _lock:
+            for usuario_id, momento in accesos.items():
+                _pendientes.setdefault(usuario_id, momento)
+        logger.exception('No se pudo volcar el último acceso de %d usuarios', len(accesos))
+        return 0
+    return len(perfiles)
+
+
+volcado = VolcadoPeriodico('volcado-ultimo-acceso', volcar, intervalo_volcado)
+
+
+@atexit.register
+def _volcar_al_salir():
+    # Si la base cambió (p. ej. la de pruebas ya se destruyó) los ids no son válidos
+    if _base != _nombre_base():
+        return
+    try:
+        volcar()
+    except Exception:  # el proceso está terminando: sólo se deja constancia
+        logger.exception('No se pudo volcar el último acceso al terminar')
+
+
+class UltimoAccesoMiddleware:
+    """Anota el último acceso de las peticiones autenticadas"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        respuesta = self.get_response(request)
+        # El id sale de la sesión, ya cargada por la vista: no consulta el usuario
+        usuario_id = request.session.get(SESSION_KEY)
+        if usuario_id is not None:
+            registrar(User._meta.pk.to_python(usuario_id))
+        return respuesta
+
+    async def __acall__(self, request):
+        respuesta = await self.get_response(request)
+        usuario_id = await request.session.aget(SESSION_KEY)
+        if usuario_id is not None:
+            registrar(User._meta.pk.to_python(usuario_id))
+        return respuesta
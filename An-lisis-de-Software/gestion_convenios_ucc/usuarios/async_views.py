@@ -0,0 +1,54 @@
+"""Flujo asíncrono de notificaciones en vivo (ver ``usuarios.eventos``)"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from . import eventos
+
+
+def _id_evento(valor):
+    try:
+        return max(int(valor), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+@login_required
+async def flujo_notificaciones(request):
+    """Envía por SSE las notificaciones del usuario a medida que se crean"""
+    # Bajo WSGI Django consume el generador infinito antes de responder y el
+    # worker queda tomado para siempre; 204 hace que EventSource no reconecte
+    if not settings.NOTIFICACIONES_SSE_ACTIVO or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    usuario = await request.auser()
+    backend = eventos.obtener_backend()
+    try:
+        suscripcion = backend.suscribir(usuario.pk)
+    except eventos.LimiteConexiones as error:
+        respuesta = HttpResponse(str(error), status=429 if error.por_usuario else 503, content_type='text/plain')
+        respuesta['Retry-After'] = str(eventos.RECONEXION_MS // 1000)
+        return respuesta
+
+    # Al reconectar el navegador envía el último id recibido y se reenvía lo que falte
+    desde = _id_evento(request.headers.get('Last-Event-ID'))
+    try:
+        if desde is None:
+            desde = await sync_to_async(eventos.ultimo_id)(usuario.pk)
+            reanudar = False
+        else:
+            reanudar = True
+    except BaseException:
+        backend.cancelar(suscripcion)
+        raise
+
+    respuesta = StreamingHttpResponse(
+        eventos.flujo(backend, suscripcion, desde, reanudar=reanudar),
+        content_type='text/event-stream',
+    )
+    respuesta['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular el flujo en su búfer
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
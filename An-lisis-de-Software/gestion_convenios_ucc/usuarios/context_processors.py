@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .models import PerfilUsuario
+
+
+def notificaciones(request):
+    """Contador de notificaciones no leídas para el distintivo del encabezado"""
+
+    def no_leidas():
+        usuario = getattr(request, 'user', None)
+        if usuario is None or not usuario.is_authenticated:
+            return 0
+        try:
+            # El encabezado ya carga el perfil del usuario: no añade consultas
+            return usuario.perfilusuario.notificaciones_no_leidas
+        except PerfilUsuario.DoesNotExist:
+            return 0
+
+    return {
+        'notificaciones_no_leidas': SimpleLazyObject(no_leidas),
+        'notificaciones_en_vivo': getattr(settings, 'NOTIFICACIONES_SSE_ACTIVO', False),
+    }
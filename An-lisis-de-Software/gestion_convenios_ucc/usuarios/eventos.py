@@ -0,0 +1,282 @@
+"""
+Notificaciones en vivo por Server-Sent Events.
+
+``usuarios.async_views.flujo_notificaciones`` deja abierta una respuesta
+``text/event-stream`` por pestaña. Sólo conviene servirla bajo ASGI
+(``gestion_convenios_ucc.asgi``): allí cada conexión inactiva es una
+corrutina esperando en una cola, mientras que bajo WSGI ocuparía un hilo.
+
+El reparto pasa por un pub/sub en proceso: ``publicar`` entrega el evento a
+las suscripciones del usuario en este worker. ``BackendMemoria`` basta con un
+solo worker; con varios, ``BackendBaseDatos`` además consulta cada
+``NOTIFICACIONES_SSE_INTERVALO_CONSULTA`` segundos las notificaciones nuevas
+de los usuarios conectados, de modo que ve también las creadas por otros
+procesos.
+
+Cada suscripción tiene una cola acotada (``NOTIFICACIONES_SSE_COLA``). Si un
+cliente lento la llena, se vacía y queda un único aviso de ponerse al día:
+el flujo relee de la base lo que falte desde el último id enviado, así que la
+memoria por conexión queda acotada sin perder eventos. Lo mismo ocurre con
+``Last-Event-ID`` al reconectar y con los avisos creados con ``bulk_create``,
+que no emiten señales. Que los ids lleguen en orden lo garantiza SQLite, que
+serializa las escrituras.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Notificacion
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_EVENTO = ('id', 'titulo', 'mensaje', 'tipo', 'convenio_id', 'fecha_creacion')
+# Aviso sin datos: la suscripción debe leer de la base lo que le falte
+PONERSE_AL_DIA = None
+# Milisegundos que espera el navegador antes de reconectar
+RECONEXION_MS = 5000
+LATIDO = ': latido\n\n'
+
+
+def configuracion(nombre, defecto):
+    return getattr(settings, f'NOTIFICACIONES_SSE_{nombre}', defecto)
+
+
+class LimiteConexiones(Exception):
+    """Se superó el máximo de conexiones del usuario o del worker"""
+
+    def __init__(self, mensaje, por_usuario):
+        super().__init__(mensaje)
+        self.por_usuario = por_usuario
+
+
+def evento_de(notificacion):
+    """Datos del evento a partir de una instancia o de un dict de ``values(*CAMPOS_EVENTO)``"""
+    if isinstance(notificacion, dict):
+        return dict(notificacion)
+    return {campo: getattr(notificacion, campo) for campo in CAMPOS_EVENTO}
+
+
+def formatear(evento):
+    datos = json.dumps(evento, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'id: {evento["id"]}\nevent: notificacion\ndata: {datos}\n\n'
+
+
+def leer_desde(usuario_id, desde_id, limite):
+    """Notificaciones del usuario posteriores a ``desde_id``, en orden de creación"""
+    return [
+        evento_de(valores)
+        for valores in Notificacion.objects.filter(usuario_id=usuario_id, id__gt=desde_id)
+        .order_by('id').values(*CAMPOS_EVENTO)[:limite]
+    ]
+
+
+def ultimo_id(usuario_id):
+    return Notificacion.objects.filter(usuario_id=usuario_id).aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+class Suscripcion:
+    """Cola acotada de una conexión, ligada al event loop que la atiende"""
+
+    def __init__(self, usuario_id, capacidad):
+        self.usuario_id = usuario_id
+        self.cola = asyncio.Queue(maxsize=capacidad)
+        self.desbordes = 0
+        self._loop = asyncio.get_running_loop()
+
+    def entregar(self, evento):
+        """Encola el evento; se puede llamar desde cualquier hilo"""
+        try:
+            self._loop.call_soon_threadsafe(self._encolar, evento)
+        except RuntimeError:  # el loop ya se cerró: la conexión terminó
+            pass
+
+    def _encolar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo acumulado y se relee de la base
+            self.desbordes += 1
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(PONERSE_AL_DIA)
+
+
+class BackendMemoria:
+    """Pub/sub dentro del proceso; no ve lo publicado por otros workers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = defaultdict(set)
+        self._total = 0
+
+    def suscribir(self, usuario_id):
+        with self._lock:
+            if self._total >= configuracion('MAX_CONEXIONES', 2000):
+                raise LimiteConexiones('El servidor no admite más conexiones en vivo.', por_usuario=False)
+            if len(self._suscripciones[usuario_id]) >= configuracion('MAX_POR_USUARIO', 5):
+                raise LimiteConexiones('Demasiadas pestañas abiertas con notificaciones en vivo.', por_usuario=True)
+            suscripcion = Suscripcion(usuario_id, configuracion('COLA', 50))
+            self._suscripciones[usuario_id].add(suscripcion)
+            self._total += 1
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            propias = self._suscripciones.get(suscripcion.usuario_id)
+            if propias is None or suscripcion not in propias:
+                return
+            propias.discard(suscripcion)
+            self._total -= 1
+            if not propias:
+                del self._suscripciones[suscripcion.usuario_id]
+
+    def conexiones(self):
+        with self._lock:
+            return self._total
+
+    def usuarios_conectados(self):
+        with self._lock:
+            return list(self._suscripciones)
+
+    def publicar(self, usuario_id, evento=PONERSE_AL_DIA):
+        """Entrega el evento a las conexiones del usuario; devuelve a cuántas"""
+        with self._lock:
+            destinos = list(self._suscripciones.get(usuario_id, ()))
+        for suscripcion in destinos:
+            suscripcion.entregar(evento)
+        return len(destinos)
+
+
+class BackendBaseDatos(BackendMemoria):
+    """Reparte en el proceso y además consulta la tabla para ver lo creado en otros workers"""
+
+    def __init__(self):
+        super().__init__()
+        self._hilo = None
+        self._visto = None
+
+    def suscribir(self, usuario_id):
+        suscripcion = super().suscribir(usuario_id)
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = self._arrancar()
+        return suscripcion
+
+    def _arrancar(self):
+        hilo = threading.Thread(target=self._consultar, name='notificaciones-sse', daemon=True)
+        hilo.start()
+        return hilo
+
+    def _consultar(self):
+        espera = threading.Event()
+        try:
+            while self._seguir():
+                close_old_connections()
+                try:
+                    self.revisar()
+                except Exception:
+                    logger.exception('No se pudieron consultar las notificaciones nuevas')
+                espera.wait(configuracion('INTERVALO_CONSULTA', 2))
+        finally:
+            connection.close()
+
+    def _seguir(self):
+        # Bajo el mismo lock que suscribir: o sigue el hilo o se arrancará otro
+        with self._lock:
+            if self._total:
+                return True
+            self._hilo = None
+            return False
+
+    def revisar(self):
+        """Publica las notificaciones creadas desde la última revisión; devuelve cuántas"""
+        # Se fija el tope antes de leer para no saltar filas que entren entre consultas
+        tope = Notificacion.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+        if self._visto is None or tope <= self._visto:
+            self._visto = tope
+            return 0
+        nuevas = Notificacion.objects.filter(
+            id__gt=self._visto, id__lte=tope, usuario_id__in=self.usuarios_conectados(),
+        ).order_by('id').values('usuario_id', *CAMPOS_EVENTO)
+        publicadas = 0
+        for valores in nuevas:
+            self.publicar(valores.pop('usuario_id'), evento_de(valores))
+            publicadas += 1
+        self._visto = tope
+        return publicadas
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def obtener_backend():
+    """Backend de ``NOTIFICACIONES_SSE_BACKEND`` (o en memoria), uno por proceso"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            ruta = configuracion('BACKEND', None)
+            _backend = import_string(ruta)() if ruta else BackendMemoria()
+        return _backend
+
+
+@receiver(setting_changed)
+def _reiniciar_backend(setting, **kwargs):
+    global _backend
+    if setting == 'NOTIFICACIONES_SSE_BACKEND':
+        _backend = None
+
+
+def publicar_notificacion(notificacion):
+    """Reparte una notificación recién confirmada (ver ``usuarios.signals``)"""
+    obtener_backend().publicar(notificacion.usuario_id, evento_de(notificacion))
+
+
+def avisar(usuario_ids):
+    """Pide a las conexiones de los usuarios que relean de la base (tras ``bulk_create``)"""
+    backend = obtener_backend()
+    for usuario_id in usuario_ids:
+        backend.publicar(usuario_id)
+
+
+async def flujo(backend, suscripcion, desde_id, reanudar=False):
+    """Cuerpo de la respuesta SSE; libera la suscripción al cerrarse la conexión"""
+    latido = configuracion('LATIDO', 15)
+    lote = configuracion('COLA', 50)
+    ultimo = desde_id
+    pendiente = reanudar
+    try:
+        yield f'retry: {RECONEXION_MS}\n\n'
+        while True:
+            if pendiente:
+                eventos = await sync_to_async(leer_desde)(suscripcion.usuario_id, ultimo, lote)
+                for evento in eventos:
+                    ultimo = evento['id']
+                    yield formatear(evento)
+                # Un lote completo indica que quedan más por leer
+                pendiente = len(eventos) == lote
+                if pendiente:
+                    continue
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), latido)
+            except asyncio.TimeoutError:
+                yield LATIDO
+                continue
+            if evento is PONERSE_AL_DIA:
+                pendiente = True
+            elif evento['id'] > ultimo:
+                ultimo = evento['id']
+                yield formatear(evento)
+    finally:
+        backend.cancelar(suscripcion)
@@ -0,0 +1,53 @@
+"""
+Generación de miniaturas de las fotos de perfil.
+
+Sólo depende de Pillow y de la biblioteca estándar: se ejecuta en procesos
+del pool de ``usuarios.miniaturas``, que se arrancan con ``spawn`` y no
+cargan Django.
+"""
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+TAMANOS = (32, 64, 128)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def _guardar(imagen, ruta, formato):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    nombre_pil, opciones = FORMATOS[formato]
+    # Se escribe a un temporal y se renombra: nunca se sirve una variante a medias
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            imagen.save(destino, nombre_pil, **opciones)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.remove(temporal)
+        raise
+    return os.path.getsize(ruta)
+
+
+def generar_variantes(origen, destinos):
+    """
+    Recorta al centro y reduce la imagen ``origen`` a cada ``(tamano, formato,
+    ruta)`` de ``destinos``. Devuelve los bytes escritos.
+    """
+    mayor = max(tamano for tamano, _, _ in destinos)
+    escritos = 0
+    with Image.open(origen) as imagen:
+        # En JPEG decodifica directamente a una escala reducida: mucho menos memoria y CPU
+        imagen.draft('RGB', (mayor * 2, mayor * 2))
+        imagen = ImageOps.exif_transpose(imagen).convert('RGB')
+        base = ImageOps.fit(imagen, (mayor, mayor), Image.Resampling.LANCZOS)
+
+    reducidas = {}
+    for tamano, formato, ruta in sorted(destinos, reverse=True):
+        if tamano not in reducidas:
+            reducidas[tamano] = base if tamano == mayor else base.resize((tamano, tamano), Image.Resampling.LANCZOS)
+        escritos += _guardar(reducidas[tamano], ruta, formato)
+    return escritos
@@ -0,0 +1,176 @@
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from usuarios import eventos
+
+
+class ConexionSimulada:
+    """Cliente SSE que habla ASGI directamente con la aplicación, sin servidor ni sockets"""
+
+    def __init__(self, aplicacion, ruta, cookie, numero):
+        self.aplicacion = aplicacion
+        self.scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': ruta,
+            'raw_path': ruta.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'accept', b'text/event-stream'),
+                (b'cookie', cookie.encode()),
+            ],
+            'client': ('127.0.0.1', 10000 + numero),
+            'server': ('testserver', 80),
+        }
+        self.estado = None
+        self.abierta = asyncio.Event()
+        self.eventos = asyncio.Queue()
+        self.latidos = 0
+        self._desconectar = asyncio.Event()
+        self._cuerpo_enviado = False
+        self._tarea = None
+
+    def abrir(self):
+        self._tarea = asyncio.create_task(self.aplicacion(self.scope, self._recibir, self._enviar))
+
+    async def cerrar(self):
+        self._desconectar.set()
+        if self._tarea is not None:
+            await asyncio.wait([self._tarea], timeout=5)
+
+    async def _recibir(self):
+        if not self._cuerpo_enviado:
+            self._cuerpo_enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self._desconectar.wait()
+        return {'type': 'http.disconnect'}
+
+    async def _enviar(self, mensaje):
+        if mensaje['type'] == 'http.response.start':
+            self.estado = mensaje['status']
+        elif mensaje['type'] == 'http.response.body':
+            cuerpo = mensaje.get('body', b'')
+            if cuerpo.startswith(b'retry:') or self.estado != 200:
+                self.abierta.set()
+            elif cuerpo.startswith(b':'):
+                self.latidos += 1
+            elif cuerpo:
+                self.eventos.put_nowait(time.perf_counter())
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga del flujo SSE de notificaciones: abre conexiones simultáneas contra la '
+        'aplicación ASGI en este proceso, las mantiene inactivas y mide memoria, latidos y la '
+        'latencia de entrega de eventos a todas ellas. Inicia una sesión del usuario indicado '
+        'y la cierra al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conexiones', type=int, default=1000, help='Conexiones simultáneas')
+        parser.add_argument('--segundos', type=float, default=5.0, help='Tiempo que se mantienen inactivas')
+        parser.add_argument('--latido', type=float, default=1.0, help='Segundos entre latidos durante la prueba')
+        parser.add_argument('--eventos', type=int, default=20, help='Eventos repartidos a todas las conexiones')
+        parser.add_argument('--usuario', help='Usuario con el que se conecta (por defecto el primer superusuario)')
+
+    def handle(self, *args, **options):
+        if options['conexiones'] < 1:
+            raise CommandError('Se necesita al menos una conexión.')
+        usuario = self._usuario(options['usuario'])
+        conexiones = options['conexiones']
+        # Todas las conexiones son del mismo usuario: se levantan los límites durante la prueba
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            NOTIFICACIONES_SSE_ACTIVO=True,
+            NOTIFICACIONES_SSE_BACKEND='usuarios.eventos.BackendMemoria',
+            NOTIFICACIONES_SSE_MAX_POR_USUARIO=conexiones,
+            NOTIFICACIONES_SSE_MAX_CONEXIONES=conexiones,
+            NOTIFICACIONES_SSE_LATIDO=options['latido'],
+            NOTIFICACIONES_SSE_COLA=max(options['eventos'], 1),
+        ):
+            cliente = Client()
+            cliente.force_login(usuario)
+            cookie = f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+            try:
+                asyncio.run(self._probar(usuario.pk, cookie, options))
+            finally:
+                cliente.logout()
+
+    @staticmethod
+    def _usuario(username):
+        usuarios = User.objects.filter(is_active=True)
+        if username:
+            usuario = usuarios.filter(username=username).first()
+        else:
+            usuario = usuarios.order_by('-is_superuser', 'id').first()
+        if usuario is None:
+            raise CommandError('No hay un usuario activo con el que conectarse.')
+        return usuario
+
+    async def _probar(self, usuario_id, cookie, options):
+        aplicacion = get_asgi_application()
+        ruta = reverse('usuarios:flujo_notificaciones')
+        backend = eventos.obtener_backend()
+
+        tracemalloc.start()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        conexiones = [ConexionSimulada(aplicacion, ruta, cookie, i) for i in range(options['conexiones'])]
+        for conexion in conexiones:
+            conexion.abrir()
+        await asyncio.wait_for(asyncio.gather(*(c.abierta.wait() for c in conexiones)), timeout=120)
+        apertura = time.perf_counter() - inicio
+        rechazadas = sum(1 for c in conexiones if c.estado != 200)
+        if rechazadas:
+            raise CommandError(f'{rechazadas} conexiones rechazadas (estado {conexiones[0].estado}).')
+        memoria_abiertas = tracemalloc.get_traced_memory()[0]
+
+        await asyncio.sleep(options['segundos'])
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        latidos = sum(c.latidos for c in conexiones)
+
+        latencias = []
+        for numero in range(options['eventos']):
+            enviado = time.perf_counter()
+            # ids por encima de cualquier notificación real para que ninguna conexión los descarte
+            evento = dict.fromkeys(eventos.CAMPOS_EVENTO, None)
+            evento.update(id=10 ** 12 + numero, titulo='Carga', tipo='sistema')
+            backend.publicar(usuario_id, evento)
+            recibidos = await asyncio.gather(*(c.eventos.get() for c in conexiones))
+            latencias.append(max(recibidos) - enviado)
+
+        for conexion in conexiones:
+            await conexion.cerrar()
+        abiertas_al_final = backend.conexiones()
+
+        total = len(conexiones)
+        self.stdout.write(f'conexiones abiertas:      {total} en {apertura:.2f} s ({total / apertura:.0f}/s)')
+        self.stdout.write(
+            f'memoria por conexión:     {(memoria_abiertas - memoria_inicial) / total / 1024:.1f} KiB '
+            f'(tras {options["segundos"]:.0f} s inactivas: {(memoria - memoria_inicial) / total / 1024:.1f} KiB)'
+        )
+        self.stdout.write(f'latidos enviados:         {latidos} ({latidos / total:.1f} por conexión)')
+        if latencias:
+            latencias.sort()
+            p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+            self.stdout.write(
+                f'entrega a {total} conexiones: p50 {statistics.median(latencias) * 1000:.1f} ms  '
+                f'p95 {p95 * 1000:.1f} ms'
+            )
+        self.stdout.write(f'suscripciones tras cerrar: {abiertas_al_final}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from usuarios import imagenes, miniaturas
+
+
+class Command(BaseCommand):
+    help = 'Genera en paralelo las miniaturas de las fotos de perfil que aún no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=None,
+            help='Procesos en paralelo (por defecto MINIATURAS_PROCESOS; 0 para no usar pool)',
+        )
+        parser.add_argument('--forzar', action='store_true', help='Regenera también las que ya existen')
+
+    def handle(self, *args, **options):
+        resultado = miniaturas.generar_pendientes(trabajadores=options['procesos'], forzar=options['forzar'])
+        variantes = len(imagenes.TAMANOS) * len(imagenes.FORMATOS)
+        tamano = filesizeformat(resultado.bytes_escritos).replace('\xa0', ' ')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.generados} de {resultado.perfiles} perfiles con miniaturas '
+            f'({variantes} variantes cada uno, {tamano}) en {resultado.duracion:.2f} s'
+        ))
+        if resultado.errores:
+            self.stdout.write(self.style.WARNING(f'{resultado.errores} fotos no se pudieron procesar'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.notificaciones import notificar_vencimientos, umbrales_configurados
+
+
+class Command(BaseCommand):
+    help = 'Crea las notificaciones de convenios por vencer para sus supervisores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Convenios procesados por lote')
+
+    def handle(self, *args, **options):
+        resultado = notificar_vencimientos(lote=options['lote'])
+        umbrales = ', '.join(str(umbral) for umbral in umbrales_configurados())
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creadas} notificaciones creadas para {resultado.convenios} convenios '
+            f'(umbrales: {umbrales} días) en {resultado.duracion:.2f} s'
+        ))
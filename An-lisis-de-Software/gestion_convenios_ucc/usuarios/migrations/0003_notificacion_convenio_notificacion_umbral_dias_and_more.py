@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('convenios', '0003_indice_busqueda'),
+        ('usuarios', '0002_notificacion_notif_usuario_creacion_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='convenio',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to='convenios.convenio', verbose_name='Convenio'),
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='umbral_dias',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Umbral de Días'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificacion',
+            constraint=models.UniqueConstraint(condition=models.Q(('tipo', 'convenio_vencimiento')), fields=('usuario', 'convenio', 'umbral_dias'), name='notif_vencimiento_unica'),
+        ),
+    ]
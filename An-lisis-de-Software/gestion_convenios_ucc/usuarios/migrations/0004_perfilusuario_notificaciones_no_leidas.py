@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:59
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def contar_no_leidas(apps, schema_editor):
+    PerfilUsuario = apps.get_model('usuarios', 'PerfilUsuario')
+    Notificacion = apps.get_model('usuarios', 'Notificacion')
+    no_leidas = Notificacion.objects.filter(
+        usuario_id=OuterRef('user_id'), leida=False,
+    ).order_by().values('usuario_id').annotate(total=Count('id')).values('total')
+    PerfilUsuario.objects.using(schema_editor.connection.alias).update(
+        notificaciones_no_leidas=Coalesce(Subquery(no_leidas, output_field=IntegerField()), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_notificacion_convenio_notificacion_umbral_dias_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='notificaciones_no_leidas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Notificaciones no Leídas'),
+        ),
+        migrations.RunPython(contar_no_leidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_perfilusuario_notificaciones_no_leidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='miniaturas_de',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Miniaturas de'),
+        ),
+    ]
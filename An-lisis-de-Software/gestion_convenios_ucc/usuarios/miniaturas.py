@@ -0,0 +1,167 @@
+"""
+Miniaturas de las fotos de perfil.
+
+Al subir una foto (señales de ``usuarios.signals``) se encarga a un pool de
+procesos la generación de cada tamaño de ``imagenes.TAMANOS`` en WebP y JPEG;
+la petición no espera. Cuando terminan, ``PerfilUsuario.miniaturas_de`` pasa
+a ser el nombre de la foto y la etiqueta ``{% avatar %}`` empieza a usarlas;
+mientras tanto las plantillas muestran las iniciales.
+
+Los nombres de las variantes incluyen un resumen del nombre de la foto, de
+modo que sus URL cambian con ella y se pueden cachear como inmutables. Se
+sirven con ``usuarios.views.foto_miniatura``, ya que ``MEDIA_ROOT`` no se
+publica.
+"""
+import functools
+import hashlib
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.urls import reverse
+
+from gestion_convenios_ucc.segundo_plano import PoolProcesos, ejecutar_todos
+
+from . import imagenes
+from .models import PerfilUsuario
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = 'perfiles/miniaturas'
+ARCHIVO_VARIANTE = re.compile(r'^(?P<clave>[0-9a-f]{12})-(?P<tamano>\d+)\.(?P<formato>webp|jpg)$')
+
+
+def procesos():
+    return getattr(settings, 'MINIATURAS_PROCESOS', 2)
+
+
+pool = PoolProcesos(procesos)
+
+
+def clave(nombre_foto):
+    return hashlib.sha1(nombre_foto.encode()).hexdigest()[:12]
+
+
+def nombre_variante(perfil_id, nombre_foto, tamano, formato):
+    return f'{DIRECTORIO}/{perfil_id}/{clave(nombre_foto)}-{tamano}.{formato}'
+
+
+def tareas(perfil_id, nombre_foto):
+    """Argumentos de ``imagenes.generar_variantes`` para una foto"""
+    destinos = [
+        (tamano, formato, default_storage.path(nombre_variante(perfil_id, nombre_foto, tamano, formato)))
+        for tamano in imagenes.TAMANOS for formato in imagenes.FORMATOS
+    ]
+    return default_storage.path(nombre_foto), destinos
+
+
+def marcar_generadas(perfil_id, nombre_foto):
+    """Activa las miniaturas si el perfil sigue teniendo esa foto y borra las de fotos anteriores"""
+    actualizados = PerfilUsuario.objects.filter(pk=perfil_id, foto_perfil=nombre_foto).update(
+        miniaturas_de=nombre_foto,
+    )
+    if actualizados:
+        eliminar_anteriores(perfil_id, nombre_foto)
+    return actualizados
+
+
+def eliminar_anteriores(perfil_id, nombre_foto):
+    directorio = f'{DIRECTORIO}/{perfil_id}'
+    vigente = clave(nombre_foto)
+    try:
+        _, archivos = default_storage.listdir(directorio)
+    except FileNotFoundError:
+        return 0
+    anteriores = [archivo for archivo in archivos if not archivo.startswith(f'{vigente}-')]
+    for archivo in anteriores:
+        default_storage.delete(f'{directorio}/{archivo}')
+    return len(anteriores)
+
+
+def _fallo(perfil_id):
+    logger.exception('No se pudieron generar las miniaturas del perfil %s', perfil_id)
+
+
+def programar(perfil_id, nombre_foto):
+    """Genera las miniaturas en segundo plano (o aquí mismo con ``MINIATURAS_PROCESOS = 0``)"""
+    return pool.programar(
+        imagenes.generar_variantes, tareas(perfil_id, nombre_foto),
+        lambda _: marcar_generadas(perfil_id, nombre_foto),
+        functools.partial(_fallo, perfil_id),
+    )
+
+
+@dataclass
+class ResultadoGeneracion:
+    perfiles: int = 0
+    generados: int = 0
+    errores: int = 0
+    bytes_escritos: int = 0
+    duracion: float = 0.0
+
+
+def generar_pendientes(trabajadores=None, forzar=False):
+    """
+    Genera en paralelo las miniaturas de los perfiles con foto que aún no las
+    tienen (o de todos con ``forzar``), para las fotos subidas antes.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoGeneracion()
+    perfiles = PerfilUsuario.objects.exclude(foto_perfil='').exclude(foto_perfil__isnull=True)
+    if not forzar:
+        perfiles = perfiles.exclude(miniaturas_de=F('foto_perfil'))
+    pendientes = list(perfiles.values_list('pk', 'foto_perfil'))
+    resultado.perfiles = len(pendientes)
+    trabajadores = procesos() if trabajadores is None else trabajadores
+
+    def terminado(perfil, escritos):
+        resultado.generados += 1
+        resultado.bytes_escritos += escritos
+        marcar_generadas(*perfil)
+
+    def fallido(perfil):
+        _fallo(perfil[0])
+        resultado.errores += 1
+
+    ejecutar_todos(
+        imagenes.generar_variantes,
+        [(perfil, tareas(*perfil)) for perfil in pendientes],
+        trabajadores, terminado, fallido,
+    )
+    resultado.duracion = time.perf_counter() - inicio
+    return resultado
+
+
+def _mas_cercano(minimo):
+    return next((tamano for tamano in imagenes.TAMANOS if tamano >= minimo), imagenes.TAMANOS[-1])
+
+
+@functools.lru_cache(maxsize=4096)
+def fuentes(perfil_id, nombre_foto, pixeles):
+    """
+    ``src`` y ``srcset`` (1x y 2x) por formato para mostrar la foto a
+    ``pixeles`` CSS. Se memoriza: las URL sólo dependen de los argumentos.
+    """
+    tamanos = dict.fromkeys((_mas_cercano(pixeles), _mas_cercano(pixeles * 2)))
+    srcset = {
+        formato: ', '.join(
+            f'{url(perfil_id, nombre_foto, tamano, formato)} {densidad}x'
+            for densidad, tamano in enumerate(tamanos, start=1)
+        )
+        for formato in imagenes.FORMATOS
+    }
+    return url(perfil_id, nombre_foto, _mas_cercano(pixeles), 'jpg'), srcset
+
+
+def url(perfil_id, nombre_foto, tamano, formato):
+    archivo = nombre_variante(perfil_id, nombre_foto, tamano, formato).rsplit('/', 1)[1]
+    return reverse('usuarios:foto_miniatura', args=[perfil_id, archivo])
+
+
+def disponibles(perfil):
+    """Si las miniaturas de la foto actual del perfil ya están generadas"""
+    return bool(perfil and perfil.foto_perfil and perfil.miniaturas_de == perfil.foto_perfil.name)
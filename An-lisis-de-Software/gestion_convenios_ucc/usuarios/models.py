@@ -23,17 +23,38 @@ class PerfilUsuario(models.Model):
     fecha_nacimiento = models.DateField(null=True, blank=True, verbose_name="Fecha de Nacimiento")
     foto_perfil = models.ImageField(upload_to='perfiles/', blank=True, null=True, verbose_name="Foto de Perfil")
     ultimo_acceso = models.DateTimeField(null=True, blank=True, verbose_name="Último Acceso")
+    # Se mantiene con incrementos atómicos (ver usuarios/notificaciones.py); nunca se asigna a mano
+    notificaciones_no_leidas = models.PositiveIntegerField(default=0, editable=False, verbose_name="Notificaciones no Leídas")
+    # Foto cuyas miniaturas ya están generadas (ver usuarios/miniaturas.py)
+    miniaturas_de = models.CharField(max_length=255, blank=True, editable=False, verbose_name="Miniaturas de")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
     
+    # Campos que se actualizan en segundo plano: un save() completo no debe
+    # reescribirlos con un valor leído antes
+    CAMPOS_EN_SEGUNDO_PLANO = ('notificaciones_no_leidas', 'miniaturas_de')
+    
     class Meta:
         verbose_name = "Perfil de Usuario"
         verbose_name_plural = "Perfiles de Usuarios"
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['rol', 'estado'], name='perfil_rol_estado_idx'),
+            models.Index(fields=['estado'], name='perfil_estado_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.get_rol_display()}"
     
+    def save(self, *args, **kwargs):
+        """Al actualizar un perfil existente no se pisan los campos en segundo plano"""
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_EN_SEGUNDO_PLANO
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def nombre_completo(self):
         return self.user.get_full_name() or self.user.username
@@ -68,11 +89,30 @@ class Notificacion(models.Model):
     leida = models.BooleanField(default=False, verbose_name="Leída")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
     fecha_lectura = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Lectura")
+    convenio = models.ForeignKey('convenios.Convenio', on_delete=models.CASCADE, null=True, blank=True, related_name='notificaciones', verbose_name="Convenio")
+    umbral_dias = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Umbral de Días")
     
     class Meta:
         verbose_name = "Notificación"
         verbose_name_plural = "Notificaciones"
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['usuario', '-fecha_creacion'], name='notif_usuario_creacion_idx'),
+            # Índice parcial (usuario, leida=False, -fecha_creacion) para las no leídas
+            models.Index(
+                fields=['usuario', '-fecha_creacion'],
+                condition=models.Q(leida=False),
+                name='notif_no_leidas_idx',
+            ),
+        ]
+        constraints = [
+            # Un aviso de vencimiento por usuario, convenio y umbral
+            models.UniqueConstraint(
+                fields=['usuario', 'convenio', 'umbral_dias'],
+                condition=models.Q(tipo='convenio_vencimiento'),
+                name='notif_vencimiento_unica',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.titulo} - {self.usuario.username}"
\ No newline at end of file
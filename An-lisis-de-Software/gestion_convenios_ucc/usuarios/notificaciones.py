@@ -0,0 +1,174 @@
+"""
+Generación masiva de notificaciones y contador de no leídas.
+
+``notificar_vencimientos`` recorre por lotes los convenios que vencen dentro
+del mayor umbral configurado y avisa a su supervisor y a los supervisores
+asignados. Cada aviso se identifica por (usuario, convenio, umbral), de modo
+que un convenio que vence en 45 días avisa una vez por el umbral de 60 y
+otra vez cuando cruza el de 30, nunca dos veces por el mismo.
+
+``PerfilUsuario.notificaciones_no_leidas`` evita el ``COUNT`` de cada página:
+las señales de ``usuarios.signals`` lo ajustan con ``F()`` al crear, leer o
+borrar notificaciones una a una, ``marcar_leidas`` lo descuenta tras su único
+``UPDATE`` y las inserciones masivas lo recalculan con ``recalcular_no_leidas``.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import eventos
+from .models import Notificacion, PerfilUsuario
+from convenios.models import Convenio
+
+UMBRALES_VENCIMIENTO = (60, 30, 7)
+
+
+@dataclass
+class ResultadoNotificacion:
+    convenios: int = 0
+    creadas: int = 0
+    duracion: float = 0.0
+
+
+def umbrales_configurados():
+    return tuple(sorted(getattr(settings, 'NOTIFICACIONES_UMBRALES_VENCIMIENTO', UMBRALES_VENCIMIENTO)))
+
+
+def umbral_para(dias, umbrales):
+    """Menor umbral que cubre los días restantes (``umbrales`` ordenados de menor a mayor)"""
+    for umbral in umbrales:
+        if dias <= umbral:
+            return umbral
+    return None
+
+
+def ajustar_no_leidas(usuario_id, delta):
+    """Suma ``delta`` (positivo o negativo) al contador con un UPDATE atómico"""
+    if delta:
+        PerfilUsuario.objects.filter(user_id=usuario_id).update(
+            notificaciones_no_leidas=Greatest(F('notificaciones_no_leidas') + delta, Value(0)),
+        )
+
+
+def recalcular_no_leidas(usuario_ids=None):
+    """Vuelve a contar las no leídas de los usuarios indicados (o de todos)"""
+    no_leidas = Notificacion.objects.filter(
+        usuario_id=OuterRef('user_id'), leida=False,
+    ).order_by().values('usuario_id').annotate(total=Count('id')).values('total')
+    perfiles = PerfilUsuario.objects.all()
+    if usuario_ids is not None:
+        perfiles = perfiles.filter(user_id__in=usuario_ids)
+    return perfiles.update(
+        notificaciones_no_leidas=Coalesce(Subquery(no_leidas, output_field=IntegerField()), Value(0)),
+    )
+
+
+def marcar_leidas(usuario_id, ids=None):
+    """Marca como leídas todas las notificaciones del usuario o sólo ``ids``; devuelve cuántas"""
+    pendientes = Notificacion.objects.filter(usuario_id=usuario_id, leida=False)
+    if ids is not None:
+        pendientes = pendientes.filter(id__in=ids)
+    with transaction.atomic():
+        marcadas = pendientes.update(leida=True, fecha_lectura=timezone.now())
+        ajustar_no_leidas(usuario_id, -marcadas)
+    return marcadas
+
+
+def _destinatarios(convenios):
+    """Usuarios a avisar por convenio: el supervisor y los supervisores asignados"""
+    from supervisores.models import Supervisor
+
+    destinatarios = defaultdict(set)
+    for convenio_id, _, _, supervisor_id in convenios:
+        if supervisor_id:
+            destinatarios[convenio_id].add(supervisor_id)
+
+    asignaciones = Supervisor.convenios_asignados.through.objects.filter(
+        convenio_id__in=[convenio[0] for convenio in convenios],
+    ).values_list('convenio_id', 'supervisor__user_id')
+    for convenio_id, usuario_id in asignaciones:
+        destinatarios[convenio_id].add(usuario_id)
+    return destinatarios
+
+
+def notificar_vencimientos(hoy=None, lote=1000, umbrales=None):
+    """Crea con ``bulk_create`` los avisos de vencimiento que aún no se enviaron"""
+    inicio = time.perf_counter()
+    hoy = hoy or timezone.now().date()
+    umbrales = tuple(sorted(umbrales or umbrales_configurados()))
+    resultado = ResultadoNotificacion()
+
+    por_vencer = Convenio.objects.filter(
+        fecha_vencimiento__gte=hoy,
+        fecha_vencimiento__lte=hoy + timedelta(days=umbrales[-1]),
+    ).exclude(estado='rechazado')
+
+    ultimo_id = 0
+    while True:
+        convenios = list(
+            por_vencer.filter(id__gt=ultimo_id).order_by('id')
+            .values_list('id', 'empresa_entidad', 'fecha_vencimiento', 'supervisor_id')[:lote]
+        )
+        if not convenios:
+            break
+        ultimo_id = convenios[-1][0]
+        resultado.convenios += len(convenios)
+
+        destinatarios = _destinatarios(convenios)
+        enviadas = set(
+            Notificacion.objects.filter(
+                tipo='convenio_vencimiento',
+                convenio_id__in=destinatarios,
+            ).order_by().values_list('convenio_id', 'usuario_id', 'umbral_dias')
+        )
+
+        nuevas = []
+        for convenio_id, empresa, fecha_vencimiento, _ in convenios:
+            dias = (fecha_vencimiento - hoy).days
+            umbral = umbral_para(dias, umbrales)
+            for usuario_id in destinatarios[convenio_id]:
+                if (convenio_id, usuario_id, umbral) in enviadas:
+                    continue
+                nuevas.append(Notificacion(
+                    usuario_id=usuario_id,
+                    convenio_id=convenio_id,
+                    umbral_dias=umbral,
+                    tipo='convenio_vencimiento',
+                    titulo='Convenio por vencer',
+                    mensaje=(
+                        f'El convenio con {empresa} vence el {fecha_vencimiento:%d/%m/%Y} '
+                        f'(faltan {dias} días).'
+                    ),
+                ))
+
+        if nuevas:
+            # La restricción única descarta los avisos que otra ejecución
+            # concurrente haya insertado entre la lectura y la escritura
+            del_lote = Notificacion.objects.filter(
+                tipo='convenio_vencimiento', convenio_id__in=destinatarios,
+            ).order_by()
+            with transaction.atomic():
+                antes = del_lote.count()
+                Notificacion.objects.bulk_create(nuevas, batch_size=lote, ignore_conflicts=True)
+                # Con ignore_conflicts los objetos no dicen qué filas entraron:
+                # se cuentan las del lote antes y después de insertar
+                creadas = del_lote.count() - antes
+                # bulk_create no emite señales: se recuentan los destinatarios del lote
+                usuario_ids = {notificacion.usuario_id for notificacion in nuevas}
+                recalcular_no_leidas(usuario_ids)
+                transaction.on_commit(partial(eventos.avisar, usuario_ids))
+            resultado.creadas += creadas
+
+        if len(convenios) < lote:
+            break
+
+    resultado.duracion = time.perf_counter() - inicio
+    return resultado
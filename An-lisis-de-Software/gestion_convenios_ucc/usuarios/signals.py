@@ -0,0 +1,66 @@
+"""
+Mantiene ``PerfilUsuario.notificaciones_no_leidas`` al guardar o borrar
+notificaciones una a una y reparte las nuevas a las conexiones en vivo.
+También encarga las miniaturas de las fotos de perfil nuevas.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import miniaturas
+from .models import Notificacion, PerfilUsuario
+from .eventos import publicar_notificacion
+from .notificaciones import ajustar_no_leidas
+
+
+@receiver(pre_save, sender=Notificacion)
+def recordar_estado_lectura(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._leida_anterior = None
+        return
+    instance._leida_anterior = (
+        Notificacion.objects.filter(pk=instance.pk).values_list('leida', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Notificacion)
+def contar_notificacion(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        transaction.on_commit(partial(publicar_notificacion, instance))
+        anterior = True  # una notificación nueva no leída suma uno
+    else:
+        anterior = getattr(instance, '_leida_anterior', None)
+        if anterior is None:
+            return
+    if anterior != instance.leida:
+        ajustar_no_leidas(instance.usuario_id, -1 if instance.leida else 1)
+
+
+@receiver(post_delete, sender=Notificacion)
+def descontar_notificacion(sender, instance, **kwargs):
+    if not instance.leida:
+        ajustar_no_leidas(instance.usuario_id, -1)
+
+
+@receiver(pre_save, sender=PerfilUsuario)
+def recordar_foto(sender, instance, raw=False, **kwargs):
+    instance._foto_anterior = None
+    if raw or instance._state.adding or not instance.foto_perfil:
+        return
+    instance._foto_anterior = (
+        PerfilUsuario.objects.filter(pk=instance.pk).values_list('foto_perfil', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=PerfilUsuario)
+def generar_miniaturas(sender, instance, raw=False, **kwargs):
+    if raw or not instance.foto_perfil:
+        return
+    nombre = instance.foto_perfil.name
+    if nombre in (getattr(instance, '_foto_anterior', None), instance.miniaturas_de):
+        return
+    transaction.on_commit(partial(miniaturas.programar, instance.pk, nombre))
@@ -0,0 +1,27 @@
+from django import template
+from django.utils.html import format_html
+
+from usuarios import miniaturas
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(perfil, pixeles=40):
+    """
+    ``<picture>`` con las miniaturas WebP/JPEG de la foto del perfil para
+    mostrarla a ``pixeles`` CSS, o cadena vacía si aún no hay miniaturas::
+
+        {% avatar usuario.perfilusuario 40 as foto %}
+        {% if foto %}{{ foto }}{% else %}{{ usuario.perfilusuario.iniciales }}{% endif %}
+    """
+    if not miniaturas.disponibles(perfil):
+        return ''
+    pixeles = int(pixeles)
+    src, srcset = miniaturas.fuentes(perfil.pk, perfil.miniaturas_de, pixeles)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" width="{}" height="{}" alt="" loading="lazy" decoding="async" '
+        'style="width: 100%; height: 100%; border-radius: 50%; object-fit: cover; display: block;"></picture>',
+        srcset['webp'], src, srcset['jpg'], pixeles, pixeles,
+    )
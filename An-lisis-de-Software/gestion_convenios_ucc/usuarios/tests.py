@@ -1,3 +1,607 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import actividad, eventos, imagenes, miniaturas
+from .models import Notificacion, PerfilUsuario
+from .notificaciones import notificar_vencimientos, umbral_para
+from convenios.tests import PlanDeConsultaTestCase, crear_convenio
+from gestion_convenios_ucc import segundo_plano
+
+
+class IndicesUsuariosTests(PlanDeConsultaTestCase):
+    def test_listado_de_usuarios(self):
+        self.assertUsaIndice(User.objects.order_by('-date_joined', '-id')[:26], 'auth_user_date_joined_idx')
+
+    def test_perfiles_por_rol_y_estado(self):
+        self.assertUsaIndice(PerfilUsuario.objects.filter(rol='supervisor', estado='activo').values('id'), 'perfil_rol_estado_idx')
+        self.assertUsaIndice(PerfilUsuario.objects.filter(estado='inactivo').values('id'), 'perfil_estado_idx')
+
+    def test_notificaciones(self):
+        self.assertUsaIndice(
+            Notificacion.objects.filter(usuario_id=1, leida=False).order_by('-fecha_creacion')[:10],
+            'notif_no_leidas_idx',
+        )
+        self.assertUsaIndice(
+            Notificacion.objects.filter(usuario_id=1).order_by('-fecha_creacion')[:10],
+            'notif_usuario_creacion_idx',
+        )
+
+
+class NotificarVencimientosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from supervisores.tests import crear_supervisor
+
+        cls.hoy = timezone.now().date()
+        cls.responsable = User.objects.create_user('responsable')
+        cls.asignado = crear_supervisor('asignado')
+        cls.convenio = crear_convenio(supervisor=cls.responsable, fecha_vencimiento=cls.hoy + timedelta(days=45))
+        cls.asignado.convenios_asignados.add(cls.convenio)
+        cls.lejano = crear_convenio(supervisor=cls.responsable, fecha_vencimiento=cls.hoy + timedelta(days=200))
+        cls.vencido = crear_convenio(supervisor=cls.responsable, fecha_vencimiento=cls.hoy - timedelta(days=1))
+        for i in range(5):
+            crear_convenio(supervisor=cls.responsable, fecha_vencimiento=cls.hoy + timedelta(days=i))
+
+    def test_umbral_para(self):
+        umbrales = (7, 30, 60)
+        self.assertEqual([umbral_para(d, umbrales) for d in (0, 7, 8, 45, 60, 61)], [7, 7, 30, 60, 60, None])
+
+    def test_avisa_al_supervisor_y_a_los_asignados(self):
+        resultado = notificar_vencimientos(hoy=self.hoy, lote=2)
+        self.assertEqual(resultado.convenios, 6)
+        self.assertEqual(resultado.creadas, 7)
+        destinatarios = set(
+            Notificacion.objects.filter(convenio=self.convenio).values_list('usuario_id', 'umbral_dias')
+        )
+        self.assertEqual(destinatarios, {(self.responsable.pk, 60), (self.asignado.user_id, 60)})
+        self.assertFalse(Notificacion.objects.filter(convenio__in=[self.lejano, self.vencido]).exists())
+
+    def test_no_duplica_el_mismo_umbral(self):
+        notificar_vencimientos(hoy=self.hoy)
+        self.assertEqual(notificar_vencimientos(hoy=self.hoy).creadas, 0)
+        self.assertEqual(Notificacion.objects.filter(convenio=self.convenio).count(), 2)
+
+    def test_nuevo_umbral_genera_nuevo_aviso(self):
+        notificar_vencimientos(hoy=self.hoy)
+        resultado = notificar_vencimientos(hoy=self.hoy + timedelta(days=20))
+        self.assertEqual(
+            set(Notificacion.objects.filter(convenio=self.convenio).values_list('umbral_dias', flat=True)),
+            {60, 30},
+        )
+        self.assertGreaterEqual(resultado.creadas, 2)
+
+    def test_inserciones_por_lotes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            notificar_vencimientos(hoy=self.hoy, lote=1000)
+        sentencias = [q['sql'].split()[0] for q in consultas if 'SAVEPOINT' not in q['sql']]
+        # convenios, asignaciones y avisos previos del lote, un único INSERT entre
+        # los dos conteos de lo insertado y el recálculo de contadores
+        self.assertEqual(sentencias, ['SELECT', 'SELECT', 'SELECT', 'SELECT', 'INSERT', 'SELECT', 'UPDATE'])
+
+    def test_no_cuenta_los_avisos_descartados_por_conflicto(self):
+        original = Notificacion.objects.bulk_create
+
+        def descarta_uno(nuevas, **opciones):
+            # Como si otra ejecución ya hubiera insertado el primero: la restricción lo ignora
+            return original(nuevas[1:], **opciones)
+
+        with mock.patch.object(Notificacion.objects, 'bulk_create', side_effect=descarta_uno):
+            resultado = notificar_vencimientos(hoy=self.hoy)
+        self.assertEqual(resultado.creadas, 6)
+        self.assertEqual(Notificacion.objects.count(), 6)
+
+    def test_recalcula_contadores_de_no_leidas(self):
+        PerfilUsuario.objects.create(user=self.responsable)
+        PerfilUsuario.objects.create(user=self.asignado.user)
+        notificar_vencimientos(hoy=self.hoy)
+        self.assertEqual(PerfilUsuario.objects.get(user=self.responsable).notificaciones_no_leidas, 6)
+        self.assertEqual(PerfilUsuario.objects.get(user=self.asignado.user).notificaciones_no_leidas, 1)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('notificar_vencimientos', stdout=salida)
+        self.assertIn('7 notificaciones creadas', salida.getvalue())
+
+
+class ContadorNoLeidasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('lector', password='clave-segura-123')
+        cls.perfil = PerfilUsuario.objects.create(user=cls.usuario)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def crear(self, cantidad=1, **kwargs):
+        return [
+            Notificacion.objects.create(usuario=self.usuario, titulo=f'Aviso {i}', mensaje='...', tipo='sistema', **kwargs)
+            for i in range(cantidad)
+        ]
+
+    def no_leidas(self):
+        return PerfilUsuario.objects.get(pk=self.perfil.pk).notificaciones_no_leidas
+
+    def test_crear_leer_y_borrar_una_a_una(self):
+        primera, segunda, tercera = self.crear(3)
+        self.crear(leida=True)
+        self.assertEqual(self.no_leidas(), 3)
+
+        primera.leida = True
+        primera.save()
+        self.assertEqual(self.no_leidas(), 2)
+        primera.save()
+        self.assertEqual(self.no_leidas(), 2)
+
+        segunda.delete()
+        primera.delete()
+        self.assertEqual(self.no_leidas(), 1)
+
+        tercera.leida = True
+        tercera.save()
+        tercera.leida = False
+        tercera.save()
+        self.assertEqual(self.no_leidas(), 1)
+
+    def test_guardar_el_perfil_no_pisa_el_contador(self):
+        perfil = PerfilUsuario.objects.get(pk=self.perfil.pk)
+        self.crear(2)
+        perfil.telefono = '3001234567'
+        perfil.save()
+        self.assertEqual(self.no_leidas(), 2)
+
+    def test_alerta_de_supervisor_suma_al_contador(self):
+        from supervisores.tests import crear_supervisor
+
+        supervisor = crear_supervisor('alertado')
+        PerfilUsuario.objects.create(user=supervisor.user)
+        self.client.post(reverse('supervisores:enviar_alerta', args=[supervisor.pk]), {'mensaje': 'Revisar informe'})
+        self.assertEqual(PerfilUsuario.objects.get(user=supervisor.user).notificaciones_no_leidas, 1)
+
+    def test_marcar_todas_con_un_solo_update(self):
+        self.crear(4)
+        otro = User.objects.create_user('otro')
+        Notificacion.objects.create(usuario=otro, titulo='Ajena', mensaje='...', tipo='sistema')
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.post(reverse('usuarios:marcar_todas_leidas'), {'next': reverse('convenios:dashboard')})
+        self.assertRedirects(respuesta, reverse('convenios:dashboard'), fetch_redirect_response=False)
+        updates = [q['sql'] for q in consultas if q['sql'].startswith('UPDATE "usuarios_notificacion"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.no_leidas(), 0)
+        self.assertFalse(Notificacion.objects.filter(usuario=self.usuario, leida=False).exists())
+        self.assertTrue(Notificacion.objects.filter(usuario=otro, leida=False).exists())
+
+    def test_marcar_seleccionadas(self):
+        notificaciones = self.crear(3)
+        ajena = Notificacion.objects.create(usuario=User.objects.create_user('otro'), titulo='Ajena', mensaje='...', tipo='sistema')
+        seleccion = [notificaciones[0].pk, notificaciones[1].pk, ajena.pk, 'x']
+
+        respuesta = self.client.post(
+            reverse('usuarios:marcar_seleccionadas_leidas'),
+            {'notificaciones': seleccion, 'next': 'https://externo.example/'},
+        )
+        self.assertRedirects(
+            respuesta, reverse('usuarios:perfil_usuario', args=[self.usuario.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(self.no_leidas(), 1)
+        self.assertFalse(Notificacion.objects.get(pk=ajena.pk).leida)
+
+    def test_marcar_solo_por_post(self):
+        self.assertEqual(self.client.get(reverse('usuarios:marcar_todas_leidas')).status_code, 405)
+        notificacion, = self.crear()
+        url = reverse('usuarios:marcar_notificacion_leida', args=[notificacion.pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.no_leidas(), 1)
+
+    @override_settings(REPLICAS_LECTURA=['replica'])
+    def test_marcar_una_fija_la_primaria(self):
+        from gestion_convenios_ucc.routers import COOKIE_PRIMARIA
+
+        notificacion, = self.crear()
+        respuesta = self.client.post(reverse('usuarios:marcar_notificacion_leida', args=[notificacion.pk]))
+        self.assertRedirects(
+            respuesta, reverse('usuarios:perfil_usuario', args=[self.usuario.pk]), fetch_redirect_response=False,
+        )
+        self.assertIn(COOKIE_PRIMARIA, respuesta.cookies)
+        self.assertEqual(self.no_leidas(), 0)
+
+    @override_settings(ACTIVIDAD_INTERVALO_VOLCADO=3600)
+    def test_distintivo_del_encabezado(self):
+        respuesta = self.client.get(reverse('convenios:dashboard'))
+        self.assertNotContains(respuesta, '<span class="badge">')
+
+        self.crear(3)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('convenios:dashboard'))
+        self.assertContains(respuesta, '<span class="badge">3</span>', html=True)
+        # El contador viaja con el perfil que el encabezado ya carga
+        self.assertFalse([q for q in consultas if 'usuarios_notificacion' in q['sql']])
+
+
+@override_settings(ACTIVIDAD_INTERVALO_VOLCADO=3600)
+class UltimoAccesoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [User.objects.create_user(f'activo{i}', password='clave-segura-123') for i in range(3)]
+        for usuario in cls.usuarios:
+            PerfilUsuario.objects.create(user=usuario)
+
+    def setUp(self):
+        # Descarta lo anotado por otras pruebas: los ids se reutilizan tras cada rollback
+        actividad._pendientes.clear()
+
+    def test_login_no_escribe_el_perfil(self):
+        perfil = self.usuarios[0].perfilusuario
+        self.client.post(reverse('auth:login'), {'username': 'activo0', 'password': 'clave-segura-123'})
+
+        perfil.refresh_from_db()
+        self.assertIsNone(perfil.ultimo_acceso)
+        self.assertIn(self.usuarios[0].pk, actividad.pendientes())
+
+    def test_registra_todas_las_peticiones_autenticadas(self):
+        self.client.get(reverse('auth:login'))
+        self.assertEqual(actividad.pendientes(), {})
+
+        self.client.force_login(self.usuarios[1])
+        self.client.get(reverse('convenios:dashboard'))
+        self.assertEqual(list(actividad.pendientes()), [self.usuarios[1].pk])
+
+    def test_volcado_en_lote_sin_tocar_otras_columnas(self):
+        antes = {perfil.pk: perfil.fecha_actualizacion for perfil in PerfilUsuario.objects.all()}
+        momento = timezone.now()
+        for usuario in self.usuarios:
+            actividad.registrar(usuario.pk, momento)
+        actividad.registrar(999999, momento)  # usuario sin perfil
+
+        # perfiles de los usuarios y un único UPDATE
+        with self.assertNumQueries(2):
+            self.assertEqual(actividad.volcar(), 3)
+
+        for perfil in PerfilUsuario.objects.all():
+            self.assertEqual(perfil.ultimo_acceso, momento)
+            self.assertEqual(perfil.fecha_actualizacion, antes[perfil.pk])
+        self.assertEqual(actividad.pendientes(), {})
+
+    def test_la_peticion_no_vuelca(self):
+        self.client.force_login(self.usuarios[2])
+        with self.settings(ACTIVIDAD_INTERVALO_VOLCADO=0), mock.patch.object(actividad.volcado, 'asegurar') as asegurar:
+            self.client.get(reverse('convenios:dashboard'))
+            self.client.get(reverse('convenios:dashboard'))
+        self.assertIsNone(PerfilUsuario.objects.get(user=self.usuarios[2]).ultimo_acceso)
+        self.assertEqual(list(actividad.pendientes()), [self.usuarios[2].pk])
+        # Cada anotación sólo comprueba que el hilo del proceso está en marcha
+        self.assertEqual(asegurar.call_count, 2)
+
+    def test_volcado_en_segundo_plano(self):
+        volcados = []
+        hecho = threading.Event()
+
+        def volcar():
+            volcados.append(threading.current_thread().name)
+            hecho.set()
+
+        volcado = segundo_plano.VolcadoPeriodico('volcado-prueba', volcar, lambda: 0)
+        volcado.asegurar()
+        self.assertIsNone(volcado._hilo)  # las pruebas no arrancan hilos
+
+        with self.settings(VOLCADOS_EN_SEGUNDO_PLANO=True):
+            volcado.asegurar()
+            volcado.asegurar()
+        self.addCleanup(volcado.detener)
+        self.assertTrue(hecho.wait(5))
+        self.assertEqual(volcados[0], 'volcado-prueba')
+        self.assertEqual(len([hilo for hilo in threading.enumerate() if hilo.name == 'volcado-prueba']), 1)
+
+    async def test_modo_asincrono(self):
+        async def vista(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(actividad.UltimoAccesoMiddleware(vista)))
+        await self.async_client.aforce_login(self.usuarios[0])
+        await self.async_client.get(reverse('convenios:lista_convenios'))
+        self.assertEqual(list(actividad.pendientes()), [self.usuarios[0].pk])
+
+
+class BackendBaseDatosSinHilo(eventos.BackendBaseDatos):
+    # La prueba llama a revisar() dentro de su propia transacción
+    def _arrancar(self):
+        return None
+
+
+def evento_prueba(id, **kwargs):
+    evento = dict.fromkeys(eventos.CAMPOS_EVENTO, None)
+    evento.update(id=id, titulo=f'Evento {id}', tipo='sistema', **kwargs)
+    return evento
+
+
+@override_settings(NOTIFICACIONES_SSE_MAX_POR_USUARIO=2, NOTIFICACIONES_SSE_MAX_CONEXIONES=3, NOTIFICACIONES_SSE_COLA=3)
+class BackendEventosTests(TestCase):
+    async def test_reparte_solo_al_usuario(self):
+        backend = eventos.BackendMemoria()
+        primera, segunda = backend.suscribir(1), backend.suscribir(1)
+        ajena = backend.suscribir(2)
+
+        self.assertEqual(backend.publicar(1, evento_prueba(10)), 2)
+        await asyncio.sleep(0)
+        self.assertEqual(primera.cola.get_nowait()['id'], 10)
+        self.assertEqual(segunda.cola.get_nowait()['id'], 10)
+        self.assertTrue(ajena.cola.empty())
+
+    async def test_limites_de_conexiones(self):
+        backend = eventos.BackendMemoria()
+        backend.suscribir(1)
+        suscripcion = backend.suscribir(1)
+        with self.assertRaises(eventos.LimiteConexiones) as error:
+            backend.suscribir(1)
+        self.assertTrue(error.exception.por_usuario)
+
+        backend.suscribir(2)
+        with self.assertRaises(eventos.LimiteConexiones) as error:
+            backend.suscribir(3)
+        self.assertFalse(error.exception.por_usuario)
+
+        backend.cancelar(suscripcion)
+        backend.cancelar(suscripcion)
+        self.assertEqual(backend.conexiones(), 2)
+        backend.suscribir(3)
+
+    async def test_cliente_lento_se_pone_al_dia_desde_la_base(self):
+        backend = eventos.BackendMemoria()
+        suscripcion = backend.suscribir(1)
+        for id in range(1, 8):
+            backend.publicar(1, evento_prueba(id))
+        await asyncio.sleep(0)
+
+        # La cola nunca pasa de su capacidad: lo descartado se relee de la base
+        self.assertLessEqual(suscripcion.cola.qsize(), 3)
+        self.assertGreater(suscripcion.desbordes, 0)
+        self.assertIn(eventos.PONERSE_AL_DIA, [suscripcion.cola.get_nowait() for _ in range(suscripcion.cola.qsize())])
+
+
+    async def test_cerrar_el_flujo_libera_la_suscripcion(self):
+        backend = eventos.BackendMemoria()
+        flujo = eventos.flujo(backend, backend.suscribir(1), desde_id=0)
+        await anext(flujo)
+        espera = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0)
+        # Así cierra Django la respuesta cuando el cliente se desconecta
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(backend.conexiones(), 0)
+
+
+@override_settings(NOTIFICACIONES_SSE_ACTIVO=True)
+class FlujoNotificacionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('conectado')
+        cls.previa = Notificacion.objects.create(usuario=cls.usuario, titulo='Previa', mensaje='...', tipo='sistema')
+
+    async def abrir(self, **headers):
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self.async_client.get(reverse('usuarios:flujo_notificaciones'), headers=headers)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        flujo = aiter(respuesta.streaming_content)
+        self.assertEqual(await anext(flujo), b'retry: 5000\n\n')
+        return flujo
+
+    @staticmethod
+    def crear(titulo):
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            return Notificacion.objects.create(usuario=FlujoNotificacionesTests.usuario, titulo=titulo, mensaje='...', tipo='sistema')
+
+    @override_settings(NOTIFICACIONES_SSE_BACKEND='usuarios.eventos.BackendMemoria')
+    async def test_entrega_las_notificaciones_nuevas(self):
+        flujo = await self.abrir()
+        nueva = await sync_to_async(self.crear)('Alerta del supervisor')
+
+        mensaje = (await asyncio.wait_for(anext(flujo), 5)).decode()
+        self.assertTrue(mensaje.startswith(f'id: {nueva.pk}\nevent: notificacion\n'))
+        self.assertIn('"titulo": "Alerta del supervisor"', mensaje)
+        await flujo.aclose()
+
+    @override_settings(NOTIFICACIONES_SSE_BACKEND='usuarios.eventos.BackendMemoria', NOTIFICACIONES_SSE_LATIDO=0.01)
+    async def test_latido(self):
+        flujo = await self.abrir()
+        self.assertEqual(await asyncio.wait_for(anext(flujo), 5), eventos.LATIDO.encode())
+        await flujo.aclose()
+
+    @override_settings(NOTIFICACIONES_SSE_BACKEND='usuarios.eventos.BackendMemoria')
+    async def test_reanuda_desde_last_event_id(self):
+        flujo = await self.abrir(**{'Last-Event-ID': str(self.previa.pk - 1)})
+        self.assertIn(f'id: {self.previa.pk}\n', (await asyncio.wait_for(anext(flujo), 5)).decode())
+        await flujo.aclose()
+
+    @override_settings(NOTIFICACIONES_SSE_BACKEND='usuarios.eventos.BackendMemoria')
+    async def test_avisos_masivos_se_releen(self):
+        flujo = await self.abrir()
+        nueva = await sync_to_async(Notificacion.objects.create)(usuario=self.usuario, titulo='Masiva', mensaje='...', tipo='sistema')
+        eventos.avisar([self.usuario.pk])
+        self.assertIn(f'id: {nueva.pk}\n', (await asyncio.wait_for(anext(flujo), 5)).decode())
+        await flujo.aclose()
+
+    def test_bajo_wsgi_no_abre_el_flujo(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('usuarios:flujo_notificaciones'))
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertFalse(respuesta.streaming)
+
+    @override_settings(NOTIFICACIONES_SSE_ACTIVO=False)
+    async def test_desactivado(self):
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self.async_client.get(reverse('usuarios:flujo_notificaciones'))
+        self.assertEqual(respuesta.status_code, 204)
+
+    @override_settings(NOTIFICACIONES_SSE_ACTIVO=False, ACTIVIDAD_INTERVALO_VOLCADO=3600)
+    def test_las_paginas_no_abren_el_flujo_si_esta_desactivado(self):
+        self.client.force_login(self.usuario)
+        self.assertNotContains(self.client.get(reverse('convenios:dashboard')), 'EventSource')
+
+    @override_settings(NOTIFICACIONES_SSE_BACKEND='usuarios.eventos.BackendMemoria', NOTIFICACIONES_SSE_MAX_POR_USUARIO=1)
+    async def test_rechaza_conexiones_de_mas(self):
+        flujo = await self.abrir()
+        respuesta = await self.async_client.get(reverse('usuarios:flujo_notificaciones'))
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertIn('Retry-After', respuesta)
+        await flujo.aclose()
+
+    async def test_backend_de_base_de_datos_ve_otros_procesos(self):
+        backend = BackendBaseDatosSinHilo()
+        suscripcion = backend.suscribir(self.usuario.pk)
+        await sync_to_async(backend.revisar)()
+        # Creada sin señales, como si viniera de otro worker
+        await sync_to_async(Notificacion.objects.bulk_create)([
+            Notificacion(usuario=self.usuario, titulo='De otro worker', mensaje='...', tipo='sistema'),
+        ])
+        self.assertEqual(await sync_to_async(backend.revisar)(), 1)
+        await asyncio.sleep(0)
+        self.assertEqual(suscripcion.cola.get_nowait()['titulo'], 'De otro worker')
+        backend.cancelar(suscripcion)
+
+
+class CargaNotificacionesSSETests(TransactionTestCase):
+    def test_comando(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave-segura-123')
+        salida = StringIO()
+        call_command(
+            'carga_notificaciones_sse', conexiones=3, segundos=0.05, latido=0.01, eventos=2, stdout=salida,
+        )
+        self.assertIn('conexiones abiertas:      3', salida.getvalue())
+        self.assertIn('suscripciones tras cerrar: 0', salida.getvalue())
+
+
+def foto_prueba(nombre='foto.jpg', ancho=300, alto=200, color='navy'):
+    contenido = BytesIO()
+    Image.new('RGB', (ancho, alto), color).save(contenido, 'JPEG')
+    return SimpleUploadedFile(nombre, contenido.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MINIATURAS_PROCESOS=0)
+class MiniaturasTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=directorio.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        miniaturas.fuentes.cache_clear()
+        self.usuario = User.objects.create_user('ana', password='clave-segura-123', first_name='Ana', last_name='Ruiz')
+        self.perfil = PerfilUsuario.objects.create(user=self.usuario)
+
+    def subir(self, foto=None):
+        self.perfil.foto_perfil = foto or foto_prueba()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perfil.save()
+        self.perfil.refresh_from_db()
+        return self.perfil.foto_perfil.name
+
+    def variante(self, nombre_foto, tamano, formato):
+        return default_storage.path(miniaturas.nombre_variante(self.perfil.pk, nombre_foto, tamano, formato))
+
+    def test_genera_las_variantes_al_subir_la_foto(self):
+        nombre = self.subir()
+
+        self.assertEqual(self.perfil.miniaturas_de, nombre)
+        for tamano in imagenes.TAMANOS:
+            for formato, (nombre_pil, _) in imagenes.FORMATOS.items():
+                with Image.open(self.variante(nombre, tamano, formato)) as imagen:
+                    self.assertEqual(imagen.format, nombre_pil)
+                    self.assertEqual(imagen.size, (tamano, tamano))
+
+    def test_guardar_sin_cambiar_la_foto_no_regenera(self):
+        self.subir()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.perfil.telefono = '3001234567'
+            self.perfil.save()
+        self.assertNotIn(miniaturas.programar, [getattr(callback, 'func', None) for callback in callbacks])
+
+    def test_un_save_completo_no_pisa_las_miniaturas(self):
+        viejo = PerfilUsuario.objects.get(pk=self.perfil.pk)
+        nombre = self.subir()
+
+        viejo.telefono = '3001234567'
+        viejo.save()
+
+        viejo.refresh_from_db()
+        self.assertEqual(viejo.miniaturas_de, nombre)
+
+    def test_cambiar_la_foto_borra_las_miniaturas_anteriores(self):
+        anterior = self.subir()
+        nueva = self.subir(foto_prueba('otra.png', color='red'))
+
+        self.assertNotEqual(anterior, nueva)
+        self.assertEqual(self.perfil.miniaturas_de, nueva)
+        self.assertFalse(os.path.exists(self.variante(anterior, 32, 'webp')))
+        self.assertTrue(os.path.exists(self.variante(nueva, 32, 'webp')))
+
+    def test_etiqueta_avatar(self):
+        plantilla = Template('{% load avatares %}{% avatar perfil 40 as foto %}{% if foto %}{{ foto }}{% else %}AR{% endif %}')
+        self.assertEqual(plantilla.render(Context({'perfil': self.perfil})), 'AR')
+        self.assertEqual(plantilla.render(Context({'perfil': ''})), 'AR')
+
+        nombre = self.subir()
+        with self.assertNumQueries(0):
+            html = plantilla.render(Context({'perfil': self.perfil}))
+
+        webp = miniaturas.url(self.perfil.pk, nombre, 64, 'webp')
+        retina = miniaturas.url(self.perfil.pk, nombre, 128, 'webp')
+        self.assertIn(f'<source type="image/webp" srcset="{webp} 1x, {retina} 2x">', html)
+        self.assertIn(f'src="{miniaturas.url(self.perfil.pk, nombre, 64, "jpg")}"', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_vista_sirve_la_miniatura_con_cache_inmutable(self):
+        nombre = self.subir()
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get(miniaturas.url(self.perfil.pk, nombre, 32, 'webp'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'image/webp')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertIn('max-age=31536000', respuesta['Cache-Control'])
+        respuesta.close()
+
+        clave = miniaturas.clave(nombre)
+        for archivo in (f'{clave}-48.webp', f'{clave}-32.png', '..%2Fsecreto-32.jpg', f'{clave[:11]}0-32.jpg'):
+            respuesta = self.client.get(reverse('usuarios:foto_miniatura', args=[self.perfil.pk, archivo]))
+            self.assertEqual(respuesta.status_code, 404, archivo)
+
+    def test_comando_genera_las_pendientes_en_paralelo(self):
+        with override_settings(MINIATURAS_PROCESOS=2), self.captureOnCommitCallbacks(execute=False):
+            self.perfil.foto_perfil = foto_prueba()
+            self.perfil.save()
+            otro = PerfilUsuario.objects.create(
+                user=User.objects.create_user('luis'), foto_perfil=foto_prueba('luis.jpg'),
+            )
+
+        salida = StringIO()
+        call_command('generar_miniaturas', procesos=2, stdout=salida)
+
+        self.assertIn('2 de 2 perfiles con miniaturas', salida.getvalue())
+        for perfil in (self.perfil, otro):
+            perfil.refresh_from_db()
+            self.assertEqual(perfil.miniaturas_de, perfil.foto_perfil.name)
+        salida = StringIO()
+        call_command('generar_miniaturas', procesos=2, stdout=salida)
+        self.assertIn('0 de 0 perfiles', salida.getvalue())
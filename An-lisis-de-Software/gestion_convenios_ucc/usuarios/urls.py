@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'usuarios'
 
@@ -9,5 +9,9 @@ urlpatterns = [
     path('<int:usuario_id>/', views.perfil_usuario, name='perfil_usuario'),
     path('<int:usuario_id>/editar/', views.editar_usuario, name='editar_usuario'),
     path('<int:usuario_id>/eliminar/', views.eliminar_usuario, name='eliminar_usuario'),
+    path('fotos/<int:perfil_id>/<str:archivo>', views.foto_miniatura, name='foto_miniatura'),
     path('notificaciones/<int:notificacion_id>/leer/', views.marcar_notificacion_leida, name='marcar_notificacion_leida'),
+    path('notificaciones/leer-todas/', views.marcar_todas_leidas, name='marcar_todas_leidas'),
+    path('notificaciones/en-vivo/', async_views.flujo_notificaciones, name='flujo_notificaciones'),
+    path('notificaciones/leer-seleccionadas/', views.marcar_seleccionadas_leidas, name='marcar_seleccionadas_leidas'),
 ]
@@ -1,16 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.http import Http404
+from django.core.files.storage import default_storage
+from django.views.decorators.http import require_POST, require_safe
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db.models import Q
-from django.utils import timezone
 from .models import PerfilUsuario, Notificacion
+from . import imagenes, miniaturas
+from .notificaciones import marcar_leidas
+from convenios import contadores, descargas
+from convenios.paginacion import paginar_por_cursor
+from gestion_convenios_ucc.routers import solo_lectura
 
 
+@solo_lectura
 @login_required
 def lista_usuarios(request):
     """Vista para listar todos los usuarios"""
-    usuarios = User.objects.select_related('perfilusuario').all().order_by('-date_joined')
+    usuarios = User.objects.select_related('perfilusuario').all()
     
     # Filtros
     rol = request.GET.get('rol')
@@ -31,18 +40,19 @@ def lista_usuarios(request):
             Q(email__icontains=busqueda)
         )
     
+    # Paginación por cursor
+    pagina = paginar_por_cursor(usuarios, request, orden=('-date_joined', '-id'))
+    
     # Estadísticas para las tarjetas
-    total_usuarios = User.objects.count()
-    supervisores_activos = User.objects.filter(perfilusuario__rol='supervisor', perfilusuario__estado='activo').count()
-    estudiantes = User.objects.filter(perfilusuario__rol='estudiante').count()
-    cuentas_inactivas = User.objects.filter(perfilusuario__estado='inactivo').count()
+    estadisticas = contadores.obtener('usuarios')
     
     context = {
-        'usuarios': usuarios,
-        'total_usuarios': total_usuarios,
-        'supervisores_activos': supervisores_activos,
-        'estudiantes': estudiantes,
-        'cuentas_inactivas': cuentas_inactivas,
+        'usuarios': pagina,
+        'pagina': pagina,
+        'total_usuarios': estadisticas.total,
+        'supervisores_activos': estadisticas.supervisores_activos,
+        'estudiantes': estadisticas.estudiantes,
+        'cuentas_inactivas': estadisticas.cuentas_inactivas,
         'filtros': {
             'rol': rol,
             'estado': estado,
@@ -97,6 +107,7 @@ def eliminar_usuario(request, usuario_id):
     return render(request, 'usuarios/eliminar_usuario.html', context)
 
 
+@solo_lectura
 @login_required
 def perfil_usuario(request, usuario_id):
     """Vista para mostrar el perfil de un usuario"""
@@ -120,13 +131,52 @@ def perfil_usuario(request, usuario_id):
 
 
 @login_required
+@require_safe
+def foto_miniatura(request, perfil_id, archivo):
+    """Sirve una miniatura de foto de perfil; su nombre cambia con la foto, así que se cachea un año"""
+    variante = miniaturas.ARCHIVO_VARIANTE.match(archivo)
+    if variante is None or int(variante['tamano']) not in imagenes.TAMANOS:
+        raise Http404('Miniatura no válida.')
+    
+    return descargas.servir_archivo(
+        request, default_storage, f'{miniaturas.DIRECTORIO}/{perfil_id}/{archivo}', inmutable=True,
+    )
+
+
+def _volver(request):
+    """Redirige a ``next`` si es una URL local, si no al perfil del usuario"""
+    destino = request.POST.get('next')
+    if destino and url_has_allowed_host_and_scheme(destino, allowed_hosts={request.get_host()}):
+        return redirect(destino)
+    return redirect('usuarios:perfil_usuario', usuario_id=request.user.id)
+
+
+@login_required
+@require_POST
 def marcar_notificacion_leida(request, notificacion_id):
     """Marca una notificación como leída"""
-    notificacion = get_object_or_404(Notificacion, id=notificacion_id, usuario=request.user)
+    get_object_or_404(Notificacion.objects.only('id'), id=notificacion_id, usuario=request.user)
+    marcar_leidas(request.user.id, [notificacion_id])
     
-    if not notificacion.leida:
-        notificacion.leida = True
-        notificacion.fecha_lectura = timezone.now()
-        notificacion.save()
+    return _volver(request)
+
+
+@login_required
+@require_POST
+def marcar_todas_leidas(request):
+    """Marca como leídas todas las notificaciones del usuario con un solo UPDATE"""
+    marcadas = marcar_leidas(request.user.id)
+    messages.success(request, f'{marcadas} notificaciones marcadas como leídas.')
     
-    return redirect('usuarios:perfil_usuario', usuario_id=request.user.id)
\ No newline at end of file
+    return _volver(request)
+
+
+@login_required
+@require_POST
+def marcar_seleccionadas_leidas(request):
+    """Marca como leídas las notificaciones seleccionadas del usuario"""
+    ids = [valor for valor in request.POST.getlist('notificaciones') if valor.isdigit()]
+    marcadas = marcar_leidas(request.user.id, ids) if ids else 0
+    messages.success(request, f'{marcadas} notificaciones marcadas como leídas.')
+    
+    return _volver(request)